@@ -1,6 +1,6 @@
 'use client';
 
-import { useState, useEffect } from 'react';
+import { useState, useEffect, useRef } from 'react';
 import { Database, Search, Package, Users, MapPin, BarChart3, RefreshCw } from 'lucide-react';
 
 interface Stats {
@@ -37,6 +37,8 @@ interface Territory {
   GroupName: string;
 }
 
+type ListTab = 'products' | 'customers';
+
 export default function DataPage() {
   const [stats, setStats] = useState<Stats | null>(null);
   const [products, setProducts] = useState<Product[]>([]);
@@ -45,6 +47,10 @@ export default function DataPage() {
   const [activeTab, setActiveTab] = useState<'products' | 'customers' | 'territories'>('products');
   const [searchTerm, setSearchTerm] = useState('');
   const [loading, setLoading] = useState(true);
+  const [cursors, setCursors] = useState<Record<ListTab, string | null>>({ products: null, customers: null });
+  const [loadingMore, setLoadingMore] = useState(false);
+  const listParams = useRef({ tab: activeTab, search: searchTerm });
+  const latestRequest = useRef(0);
 
   useEffect(() => {
     fetchStats();
@@ -52,10 +58,9 @@ export default function DataPage() {
   }, []);
 
   useEffect(() => {
-    if (activeTab === 'products') {
-      fetchProducts();
-    } else if (activeTab === 'customers') {
-      fetchCustomers();
+    listParams.current = { tab: activeTab, search: searchTerm };
+    if (activeTab === 'products' || activeTab === 'customers') {
+      fetchList(activeTab);
     }
   }, [activeTab, searchTerm]);
 
@@ -71,39 +76,41 @@ export default function DataPage() {
     }
   };
 
-  const fetchProducts = async () => {
+  const fetchList = async (tab: ListTab, cursor?: string | null) => {
+    const search = searchTerm;
+    const request = ++latestRequest.current;
     try {
-      setLoading(true);
-      const url = new URL('http://localhost:5001/api/data/products');
-      if (searchTerm) url.searchParams.set('search', searchTerm);
-      
-      const response = await fetch(url);
-      if (response.ok) {
-        const result = await response.json();
-        setProducts(result.data.products);
+      if (cursor) {
+        setLoadingMore(true);
+      } else {
+        setLoading(true);
+        // The old cursor belongs to the previous search; it must not be followed with the new one
+        setCursors((previous) => ({ ...previous, [tab]: null }));
       }
-    } catch (error) {
-      console.error('Fetch products error:', error);
-    } finally {
-      setLoading(false);
-    }
-  };
-
-  const fetchCustomers = async () => {
-    try {
-      setLoading(true);
-      const url = new URL('http://localhost:5001/api/data/customers');
-      if (searchTerm) url.searchParams.set('search', searchTerm);
+      const url = new URL(`http://localhost:5001/api/data/${tab}`);
+      if (search) url.searchParams.set('search', search);
+      if (cursor) url.searchParams.set('cursor', cursor);
       
       const response = await fetch(url);
       if (response.ok) {
         const result = await response.json();
-        setCustomers(result.data.customers);
+        // Drop the response if the tab or search term changed while it loaded
+        if (listParams.current.tab !== tab || listParams.current.search !== search) return;
+        if (tab === 'products') {
+          setProducts((previous) => cursor ? [...previous, ...result.data.products] : result.data.products);
+        } else {
+          setCustomers((previous) => cursor ? [...previous, ...result.data.customers] : result.data.customers);
+        }
+        setCursors((previous) => ({ ...previous, [tab]: result.data.pagination.nextCursor }));
       }
     } catch (error) {
-      console.error('Fetch customers error:', error);
+      console.error(`Fetch ${tab} error:`, error);
     } finally {
-      setLoading(false);
+      // An older request finishing must not hide the spinner of a newer one
+      if (request === latestRequest.current) {
+        setLoading(false);
+        setLoadingMore(false);
+      }
     }
   };
 
@@ -318,6 +325,17 @@ export default function DataPage() {
                       ))}
                     </tbody>
                   </table>
+                  {cursors.products && (
+                    <div className="p-4 text-center">
+                      <button
+                        onClick={() => fetchList('products', cursors.products)}
+                        disabled={loadingMore}
+                        className="text-sm text-blue-600 hover:text-blue-800 disabled:opacity-50"
+                      >
+                        {loadingMore ? 'Loading...' : 'Load more'}
+                      </button>
+                    </div>
+                  )}
                 </div>
               )}
 
@@ -360,6 +378,17 @@ export default function DataPage() {
                       ))}
                     </tbody>
                   </table>
+                  {cursors.customers && (
+                    <div className="p-4 text-center">
+                      <button
+                        onClick={() => fetchList('customers', cursors.customers)}
+                        disabled={loadingMore}
+                        className="text-sm text-blue-600 hover:text-blue-800 disabled:opacity-50"
+                      >
+                        {loadingMore ? 'Loading...' : 'Load more'}
+                      </button>
+                    </div>
+                  )}
                 </div>
               )}
 
@@ -33,27 +33,38 @@ export default function HistoryPage() {
   const [detailsLoading, setDetailsLoading] = useState(false);
   const [error, setError] = useState<string>('');
   const [deleteLoading, setDeleteLoading] = useState<number | null>(null);
+  const [nextCursor, setNextCursor] = useState<string | null>(null);
+  const [loadingMore, setLoadingMore] = useState(false);
 
   useEffect(() => {
     fetchOrders();
   }, []);
 
-  const fetchOrders = async () => {
+  const fetchOrders = async (cursor?: string) => {
     try {
-      setLoading(true);
-      const response = await fetch('http://localhost:5001/api/invoices/history');
+      if (cursor) {
+        setLoadingMore(true);
+      } else {
+        setLoading(true);
+      }
+      const url = new URL('http://localhost:5001/api/invoices/history');
+      if (cursor) url.searchParams.set('cursor', cursor);
+
+      const response = await fetch(url);
       
       if (!response.ok) {
         throw new Error('Failed to fetch orders');
       }
 
       const result = await response.json();
-      setOrders(result.data.orders);
+      setOrders(cursor ? [...orders, ...result.data.orders] : result.data.orders);
+      setNextCursor(result.data.pagination.nextCursor);
     } catch (error) {
       setError('Failed to load order history');
       console.error('Fetch orders error:', error);
     } finally {
       setLoading(false);
+      setLoadingMore(false);
     }
   };
 
@@ -220,7 +231,7 @@ export default function HistoryPage() {
         <div className="mb-6 p-4 bg-red-50 border border-red-200 rounded-lg">
           <p className="text-red-700">{error}</p>
           <button
-            onClick={fetchOrders}
+            onClick={() => fetchOrders()}
             className="mt-2 text-red-600 hover:text-red-800 font-medium"
           >
             Try Again
@@ -292,6 +303,17 @@ export default function HistoryPage() {
                 </div>
               ))
             )}
+            {nextCursor && (
+              <div className="p-4 text-center">
+                <button
+                  onClick={() => fetchOrders(nextCursor)}
+                  disabled={loadingMore}
+                  className="text-sm text-blue-600 hover:text-blue-800 disabled:opacity-50"
+                >
+                  {loadingMore ? 'Loading...' : 'Load more'}
+                </button>
+              </div>
+            )}
           </div>
         </div>
 
@@ -1,27 +1,131 @@
-from flask import Flask, request, jsonify, send_from_directory
+from flask import Flask, Blueprint, Response, current_app, request, jsonify, stream_with_context
 from flask_cors import CORS
 from flask_sqlalchemy import SQLAlchemy
-from werkzeug.utils import secure_filename
-from flasgger import Swagger, swag_from
+from werkzeug.exceptions import RequestEntityTooLarge
+import click
 import os
 import uuid
-import pandas as pd
-from datetime import datetime, timedelta
+from datetime import datetime
 import json
-import random
+import time
 
-# Initialize Flask app
-app = Flask(__name__)
+from jobs import JobQueue, QueueFullError, serialize_job
+from extraction_cache import ExtractionCache
+from uploads import StreamingRequest
+from batch import BatchProcessor
+from query_counter import init_query_counter
+import metrics
+from pagination import encode_cursor, decode_cursor, fetch_rows, page_args
+from id_allocator import IdAllocator
+from catalog_index import CatalogIndex, normalize_name
+from search_index import SearchIndex
+from storage import create_read_session, init_storage, read_binds
+from stats_counters import StatsCounters
+from rollups import Rollups, GROUP_BY, PERIODS
+from exporter import OrderExporter, FORMATS as EXPORT_FORMATS
+from bulk_loader import load_csv, without_indexes
+from extraction import ExtractionPipeline, SniffStage, PreprocessStage, TextLayerStage, ModelStage
+from llm_client import LLMClient, InvoiceModel
+from blob_store import BlobStore, blob_hash
+from json_provider import FastJSONProvider
+from response_cache import ResponseCache
 
-# Configuration
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///invoice_extractor.db'
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-app.config['UPLOAD_FOLDER'] = 'uploads'
-app.config['MAX_CONTENT_LENGTH'] = 10 * 1024 * 1024  # 10MB max file size
+db = SQLAlchemy()
+read_session = create_read_session()  # history, stats and catalog reads
+api = Blueprint('api', __name__, cli_group=None)
 
-# Initialize extensions
-db = SQLAlchemy(app)
-CORS(app)
+def configure(app, overrides=None):
+    """Load the configuration from the environment, then apply ``overrides``"""
+    app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL', 'sqlite:///invoice_extractor.db')
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    
+    # SQLite storage profile, applied to every pooled connection
+    app.config['SQLITE_JOURNAL_MODE'] = os.environ.get('SQLITE_JOURNAL_MODE', 'WAL')
+    app.config['SQLITE_SYNCHRONOUS'] = os.environ.get('SQLITE_SYNCHRONOUS', 'NORMAL')
+    app.config['SQLITE_BUSY_TIMEOUT_MS'] = int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS', 30000))
+    app.config['SQLITE_MMAP_SIZE'] = int(os.environ.get('SQLITE_MMAP_SIZE', 256 * 1024 * 1024))
+    app.config['SQLITE_CACHE_SIZE_KB'] = int(os.environ.get('SQLITE_CACHE_SIZE_KB', 64 * 1024))
+    
+    # Read-only endpoints use their own connection pool
+    app.config['DATABASE_READ_URL'] = os.environ.get('DATABASE_READ_URL')  # defaults to the main database
+    app.config['READ_POOL_SIZE'] = int(os.environ.get('READ_POOL_SIZE', 10))
+    app.config['UPLOAD_FOLDER'] = 'uploads'
+    app.config['ALLOWED_FILE_TYPES'] = ALLOWED_FILE_TYPES  # sniffed types kept as uploads; others are never stored
+    app.config['MAX_CONTENT_LENGTH'] = int(os.environ.get('MAX_UPLOAD_MB', 10)) * 1024 * 1024  # 10MB max file size by default
+    
+    # Background extraction (opt-in per request with ?async=true, or globally)
+    app.config['EXTRACTION_ASYNC'] = os.environ.get('EXTRACTION_ASYNC', 'false').lower() == 'true'
+    app.config['EXTRACTION_EXECUTOR'] = os.environ.get('EXTRACTION_EXECUTOR', 'thread')  # 'thread' or 'process'
+    app.config['EXTRACTION_WORKERS'] = int(os.environ.get('EXTRACTION_WORKERS', 4))
+    app.config['EXTRACTION_QUEUE_SIZE'] = int(os.environ.get('EXTRACTION_QUEUE_SIZE', 100))
+    
+    # Batch uploads (many files or one ZIP per request, extracted across processes)
+    app.config['BATCH_WORKERS'] = int(os.environ.get('BATCH_WORKERS', os.cpu_count() or 1))
+    app.config['BATCH_MAX_FILES'] = int(os.environ.get('BATCH_MAX_FILES', 1000))
+    app.config['BATCH_MAX_CONTENT_LENGTH'] = int(os.environ.get('BATCH_MAX_UPLOAD_MB', 500)) * 1024 * 1024
+    
+    # Bulk save: invoices committed per transaction
+    app.config['BULK_SAVE_CHUNK_SIZE'] = int(os.environ.get('BULK_SAVE_CHUNK_SIZE', 500))
+    
+    # Customer/product IDs reserved per round trip to the id_sequences table
+    app.config['ID_BLOCK_SIZE'] = int(os.environ.get('ID_BLOCK_SIZE', 50))
+    
+    # Report the number of SQL statements per request in an X-Query-Count header
+    app.config['QUERY_COUNT_HEADER'] = os.environ.get('QUERY_COUNT_HEADER', 'false').lower() == 'true'
+    
+    # Prometheus metrics on /metrics; SERVER_TIMING_HEADER adds a Server-Timing breakdown to every response
+    app.config['METRICS_ENABLED'] = os.environ.get('METRICS_ENABLED', 'true').lower() == 'true'
+    app.config['SERVER_TIMING_HEADER'] = os.environ.get('SERVER_TIMING_HEADER', 'false').lower() == 'true'
+    
+    # Swagger UI on /api-docs/ (flasgger is slow to import; wsgi.py turns it off unless asked for)
+    app.config['SWAGGER_ENABLED'] = os.environ.get('SWAGGER_ENABLED', 'true').lower() == 'true'
+    
+    # Extraction result cache (in-memory LRU entries, SQLite tier byte budget)
+    app.config['EXTRACTION_CACHE_SIZE'] = int(os.environ.get('EXTRACTION_CACHE_SIZE', 256))
+    app.config['EXTRACTION_CACHE_DISK_BYTES'] = int(os.environ.get('EXTRACTION_CACHE_DISK_BYTES', 256 * 1024 * 1024))
+    
+    # Extraction pipeline: cheaper stages win when at least this confident
+    app.config['EXTRACTION_MIN_CONFIDENCE'] = float(os.environ.get('EXTRACTION_MIN_CONFIDENCE', 0.8))
+    app.config['EXTRACTION_TEXT_LAYER'] = os.environ.get('EXTRACTION_TEXT_LAYER', 'true').lower() == 'true'
+    
+    # Multi-page PDFs: pages extracted by the model at once (0 to extract documents whole)
+    app.config['EXTRACTION_PAGE_WORKERS'] = int(os.environ.get('EXTRACTION_PAGE_WORKERS', 8))
+    app.config['EXTRACTION_MIN_PAGES'] = int(os.environ.get('EXTRACTION_MIN_PAGES', 2))
+    
+    # Image preprocessing before the model: shrink photos in a bounded thread pool
+    app.config['PREPROCESS_IMAGES'] = os.environ.get('PREPROCESS_IMAGES', 'true').lower() == 'true'
+    app.config['PREPROCESS_WORKERS'] = int(os.environ.get('PREPROCESS_WORKERS', os.cpu_count() or 1))
+    app.config['PREPROCESS_MAX_SIDE'] = int(os.environ.get('PREPROCESS_MAX_SIDE', 1600))
+    app.config['PREPROCESS_DPI'] = int(os.environ.get('PREPROCESS_DPI', 150))
+    app.config['PREPROCESS_GRAYSCALE'] = os.environ.get('PREPROCESS_GRAYSCALE', 'true').lower() == 'true'
+    
+    # Extraction model: 'simulated', or 'openai' for any OpenAI-compatible API (LLM_BASE_URL)
+    app.config['EXTRACTION_MODEL'] = os.environ.get('EXTRACTION_MODEL', 'simulated')
+    app.config['LLM_MODEL'] = os.environ.get('LLM_MODEL', 'gpt-4o-mini')
+    app.config['LLM_BASE_URL'] = os.environ.get('LLM_BASE_URL')
+    app.config['LLM_MAX_TOKENS'] = int(os.environ.get('LLM_MAX_TOKENS', 1500))
+    app.config['LLM_TIMEOUT'] = float(os.environ.get('LLM_TIMEOUT', 60))
+    
+    # LLM client limits, per process: in-flight requests, provider quota, retries on 429/5xx
+    app.config['LLM_MAX_CONCURRENCY'] = int(os.environ.get('LLM_MAX_CONCURRENCY', 8))
+    app.config['LLM_REQUESTS_PER_MINUTE'] = int(os.environ.get('LLM_REQUESTS_PER_MINUTE', 500))
+    app.config['LLM_TOKENS_PER_MINUTE'] = int(os.environ.get('LLM_TOKENS_PER_MINUTE', 200000))
+    app.config['LLM_MAX_RETRIES'] = int(os.environ.get('LLM_MAX_RETRIES', 5))
+    
+    # Order exports: rows fetched per batch (also the Parquet row group size)
+    app.config['EXPORT_BATCH_SIZE'] = int(os.environ.get('EXPORT_BATCH_SIZE', 10000))
+    
+    # Stats/products/customers response cache per worker (0 entries disables it); other
+    # workers' saves and deletes are noticed within RESPONSE_CACHE_SYNC_SECONDS
+    app.config['RESPONSE_CACHE_SIZE'] = int(os.environ.get('RESPONSE_CACHE_SIZE', 1024))
+    app.config['RESPONSE_CACHE_BYTES'] = int(os.environ.get('RESPONSE_CACHE_BYTES', 64 * 1024 * 1024))
+    app.config['RESPONSE_CACHE_TTL'] = float(os.environ.get('RESPONSE_CACHE_TTL', 300))
+    app.config['RESPONSE_CACHE_SYNC_SECONDS'] = float(os.environ.get('RESPONSE_CACHE_SYNC_SECONDS', 1))
+    
+    app.config.update(overrides or {})
+    if not app.config['DATABASE_READ_URL']:
+        app.config['DATABASE_READ_URL'] = app.config['SQLALCHEMY_DATABASE_URI']
+    app.config['SQLALCHEMY_BINDS'] = read_binds(app.config)
 
 # Swagger configuration
 swagger_config = {
@@ -51,17 +155,12 @@ swagger_template = {
     "schemes": ["http"],
 }
 
-swagger = Swagger(app, config=swagger_config, template=swagger_template)
-
-# Create upload directory
-os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
-
 # Database Models
 class Product(db.Model):
     __tablename__ = 'products'
     ProductID = db.Column(db.Integer, primary_key=True)
-    Name = db.Column(db.String(255))
-    ProductNumber = db.Column(db.String(50))
+    Name = db.Column(db.String(255), index=True)
+    ProductNumber = db.Column(db.String(50), index=True)
     MakeFlag = db.Column(db.Boolean)
     FinishedGoodsFlag = db.Column(db.Boolean)
     Color = db.Column(db.String(50))
@@ -108,11 +207,14 @@ class SalesOrderHeader(db.Model):
     Freight = db.Column(db.Float)
     TotalDue = db.Column(db.Float)
     CreatedAt = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    # Keyset pagination of history walks (CreatedAt, SalesOrderID) newest first
+    __table_args__ = (db.Index('ix_sales_order_header_created', 'CreatedAt', 'SalesOrderID'),)
 
 class SalesOrderDetail(db.Model):
     __tablename__ = 'sales_order_detail'
     SalesOrderDetailID = db.Column(db.Integer, primary_key=True)
-    SalesOrderID = db.Column(db.Integer, db.ForeignKey('sales_order_header.SalesOrderID'))
+    SalesOrderID = db.Column(db.Integer, db.ForeignKey('sales_order_header.SalesOrderID'), index=True)
     CarrierTrackingNumber = db.Column(db.String(50))
     OrderQty = db.Column(db.Integer)
     ProductID = db.Column(db.Integer, db.ForeignKey('products.ProductID'))
@@ -121,10 +223,254 @@ class SalesOrderDetail(db.Model):
     UnitPriceDiscount = db.Column(db.Float, default=0.0)
     LineTotal = db.Column(db.Float)
 
+class OrderDocument(db.Model):
+    __tablename__ = 'order_documents'
+    SalesOrderID = db.Column(db.Integer, db.ForeignKey('sales_order_header.SalesOrderID'), primary_key=True)
+    ContentHash = db.Column(db.String(64), primary_key=True, index=True)  # upload blob (see blob_store.py)
+    CreatedAt = db.Column(db.DateTime, default=datetime.utcnow)
+
+class IdSequence(db.Model):
+    __tablename__ = 'id_sequences'
+    Name = db.Column(db.String(50), primary_key=True)
+    NextValue = db.Column(db.Integer, nullable=False)
+
+class Generation(db.Model):
+    """Change counters that let per-process caches detect writes made by other workers"""
+    __tablename__ = 'generations'
+    Name = db.Column(db.String(50), primary_key=True)
+    Value = db.Column(db.Integer, nullable=False, default=0)
+
+class CatalogChange(db.Model):
+    """ProductIDs added in each catalog generation, so other workers load only those (see catalog_index.py)"""
+    __tablename__ = 'catalog_changes'
+    Generation = db.Column(db.Integer, primary_key=True)
+    ProductID = db.Column(db.Integer, primary_key=True)
+
+class DatabaseStats(db.Model):
+    """Running totals for /api/data/stats (a single row, kept up to date by every write)"""
+    __tablename__ = 'database_stats'
+    StatsID = db.Column(db.Integer, primary_key=True)
+    Products = db.Column(db.Integer, nullable=False, default=0)
+    Customers = db.Column(db.Integer, nullable=False, default=0)
+    Orders = db.Column(db.Integer, nullable=False, default=0)
+    PricedOrders = db.Column(db.Integer, nullable=False, default=0)  # orders with a TotalDue
+    Revenue = db.Column(db.Float, nullable=False, default=0.0)
+
+class OrderRollup(db.Model):
+    """Orders and revenue per day or month and customer (maintained by rollups.py)"""
+    __tablename__ = 'order_rollups'
+    Period = db.Column(db.String(10), primary_key=True)  # 'day' or 'month'
+    PeriodStart = db.Column(db.Date, primary_key=True)
+    CustomerID = db.Column(db.Integer, primary_key=True)
+    Orders = db.Column(db.Integer, nullable=False, default=0)
+    Revenue = db.Column(db.Float, nullable=False, default=0.0)
+
+class ProductRollup(db.Model):
+    """Line items, quantity and revenue per day or month and product (maintained by rollups.py)"""
+    __tablename__ = 'product_rollups'
+    Period = db.Column(db.String(10), primary_key=True)  # 'day' or 'month'
+    PeriodStart = db.Column(db.Date, primary_key=True)
+    ProductID = db.Column(db.Integer, primary_key=True)
+    Lines = db.Column(db.Integer, nullable=False, default=0)
+    Quantity = db.Column(db.Integer, nullable=False, default=0)
+    Revenue = db.Column(db.Float, nullable=False, default=0.0)
+
+class ExtractionJob(db.Model):
+    __tablename__ = 'extraction_jobs'
+    JobID = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
+    Status = db.Column(db.String(20), default='queued', index=True)  # queued, running, completed, failed
+    OriginalName = db.Column(db.String(255))
+    StoredName = db.Column(db.String(255))
+    FileSize = db.Column(db.Integer)
+    ContentHash = db.Column(db.String(64))
+    WorkerPID = db.Column(db.Integer, index=True)  # process running an unfinished job; NULL once released (see jobs.py)
+    Result = db.Column(db.Text)
+    Error = db.Column(db.Text)
+    CreatedAt = db.Column(db.DateTime, default=datetime.utcnow)
+    StartedAt = db.Column(db.DateTime)
+    FinishedAt = db.Column(db.DateTime)
+
+class ExtractionCacheEntry(db.Model):
+    __tablename__ = 'extraction_cache'
+    CacheKey = db.Column(db.String(100), primary_key=True)  # "<extractor version>:<sha256>"
+    ContentHash = db.Column(db.String(64))
+    ExtractorVersion = db.Column(db.String(50))
+    Result = db.Column(db.Text)
+    Size = db.Column(db.Integer)
+    HitCount = db.Column(db.Integer, default=0)
+    CreatedAt = db.Column(db.DateTime, default=datetime.utcnow)
+    LastAccessedAt = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+
 # Helper functions
-def allowed_file(filename):
-    ALLOWED_EXTENSIONS = {'pdf', 'png', 'jpg', 'jpeg'}
-    return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
+# Upload types, as detected from the file's magic bytes rather than its extension
+ALLOWED_FILE_TYPES = {'pdf', 'png', 'jpeg'}
+
+id_allocator = IdAllocator(db, IdSequence)  # block size set from ID_BLOCK_SIZE by create_app
+id_allocator.register('customers', Customer.CustomerID)
+id_allocator.register('products', Product.ProductID)
+
+catalog_index = CatalogIndex(db, Product, Generation, CatalogChange)
+search_index = SearchIndex(db, read_session)
+stats_counters = StatsCounters(db, DatabaseStats, Product, Customer, SalesOrderHeader, read_session)
+rollups = Rollups(db, OrderRollup, ProductRollup, SalesOrderHeader, SalesOrderDetail, read_session)
+order_exporter = OrderExporter(db, SalesOrderHeader, SalesOrderDetail, Product)
+response_cache = ResponseCache(db, Generation, read_session)  # stats, products, customers; bumped by every save and delete
+
+def customer_values(customer_id):
+    """Column values for a customer created from invoice data"""
+    return {
+        'CustomerID': customer_id,
+        'PersonID': None,
+        'StoreID': None,
+        'TerritoryID': 1,  # Default territory
+        'AccountNumber': f"AC{customer_id:06d}"
+    }
+
+def product_values(product_id, name, unit_price):
+    """Column values for a product created from an invoice line item"""
+    return {
+        'ProductID': product_id,
+        'Name': name,
+        'ProductNumber': f"PN-{product_id:06d}",
+        'MakeFlag': True,
+        'FinishedGoodsFlag': True,
+        'Color': None,
+        'StandardCost': unit_price * 0.7,  # Assume 30% markup
+        'ListPrice': unit_price,
+        'Size': None,
+        'ProductLine': None,
+        'Class': None,
+        'Style': None,
+        'ProductSubcategoryID': None,
+        'ProductModelID': None
+    }
+
+def required(data, field, path=''):
+    """``data[field]``, or a ValueError naming the missing field (``path`` says where ``data`` sits)"""
+    if not isinstance(data, dict) or field not in data:
+        raise ValueError(f'Missing required field: {path}{field}')
+    return data[field]
+
+def normalize_invoice(data):
+    """Validate an invoice payload and convert it to column values (raises on bad input)"""
+    order_date = required(data, 'orderDate')
+    totals = required(data, 'totals')
+    line_items = required(data, 'lineItems')
+    if not isinstance(line_items, list):
+        raise ValueError('lineItems must be a list')
+    return {
+        'customerId': (data.get('customerInfo') or {}).get('customerId'),
+        'documentHash': data.get('documentHash'),
+        'header': {
+            'OrderDate': datetime.strptime(order_date, '%Y-%m-%d').date(),
+            'DueDate': datetime.strptime(data.get('dueDate', order_date), '%Y-%m-%d').date(),
+            'SubTotal': required(totals, 'subtotal', 'totals.'),
+            'TaxAmt': required(totals, 'taxAmount', 'totals.'),
+            'Freight': totals.get('freight', 0),
+            'TotalDue': required(totals, 'total', 'totals.')
+        },
+        'lineItems': [
+            {
+                'productId': required(item, 'productId', f'lineItems[{number}].'),
+                'description': item.get('description'),
+                'quantity': required(item, 'quantity', f'lineItems[{number}].'),
+                'unitPrice': required(item, 'unitPrice', f'lineItems[{number}].'),
+                'lineTotal': required(item, 'lineTotal', f'lineItems[{number}].')
+            }
+            for number, item in enumerate(line_items)
+        ]
+    }
+
+def save_invoice_chunk(invoices, order_number_prefix, first_position=1):
+    """Insert normalized invoices with set-based lookups and executemany inserts.
+
+    Order numbers are ``order_number_prefix`` plus the invoice's position,
+    counted from ``first_position``. Returns (SalesOrderID, SalesOrderNumber)
+    per invoice, in order. The caller owns the transaction and must not have
+    written anything in it yet, since ID blocks are reserved on a separate
+    connection.
+    """
+    # Customers: one lookup for the whole chunk
+    requested_ids = {invoice['customerId'] for invoice in invoices if invoice['customerId']}
+    existing_ids = set(db.session.scalars(
+        db.select(Customer.CustomerID).where(Customer.CustomerID.in_(requested_ids))
+    )) if requested_ids else set()
+    new_customer_ids = requested_ids - existing_ids
+    anonymous = [invoice for invoice in invoices if not invoice['customerId']]
+    
+    # Products referenced by temp (string) IDs are resolved through the catalog
+    # index by product number or normalized name, as in save_invoice
+    catalog_index.sync()
+    product_ids = {}
+    new_products = {}  # normalized name -> (description, unit price) of the first line using it
+    for invoice in invoices:
+        for item in invoice['lineItems']:
+            if isinstance(item['productId'], str):
+                product_id = catalog_index.lookup(item['description'], item['productId'])
+                if product_id is not None:
+                    product_ids[item['productId'], item['description']] = product_id
+                else:
+                    new_products.setdefault(normalize_name(item['description']), (item['description'], item['unitPrice']))
+    missing = list(new_products)
+    
+    # All IDs are settled before the first write of the chunk
+    id_allocator.observe('customers', *new_customer_ids)
+    for invoice, customer_id in zip(anonymous, id_allocator.allocate('customers', len(anonymous))):
+        invoice['customerId'] = customer_id
+        new_customer_ids.add(customer_id)
+    new_product_ids = dict(zip(missing, id_allocator.allocate('products', len(missing))))
+    
+    if new_customer_ids:
+        db.session.execute(db.insert(Customer), [customer_values(cid) for cid in sorted(new_customer_ids)])
+    if missing:
+        rows = [product_values(new_product_ids[key], *new_products[key]) for key in missing]
+        db.session.execute(db.insert(Product), rows)
+        catalog_index.stage((row['ProductID'], row['Name'], row['ProductNumber']) for row in rows)
+    
+    # Headers: one executemany, with the generated IDs returned in parameter order
+    header_rows = []
+    for position, invoice in enumerate(invoices, start=first_position):
+        header_rows.append(dict(
+            invoice['header'],
+            SalesOrderNumber=f"{order_number_prefix}-{position:04d}",
+            CustomerID=invoice['customerId']
+        ))
+    order_ids = db.session.scalars(
+        db.insert(SalesOrderHeader).returning(SalesOrderHeader.SalesOrderID, sort_by_parameter_order=True),
+        header_rows
+    ).all()
+    
+    detail_rows = []
+    for order_id, invoice in zip(order_ids, invoices):
+        for item in invoice['lineItems']:
+            product_id = item['productId']
+            if isinstance(product_id, str):
+                product_id = product_ids.get((product_id, item['description'])) \
+                    or new_product_ids[normalize_name(item['description'])]
+            detail_rows.append({
+                'SalesOrderID': order_id,
+                'OrderQty': item['quantity'],
+                'ProductID': product_id,
+                'UnitPrice': item['unitPrice'],
+                'LineTotal': item['lineTotal']
+            })
+    if detail_rows:
+        db.session.execute(db.insert(SalesOrderDetail), detail_rows)
+    blob_store.link((order_id, invoice['documentHash']) for order_id, invoice in zip(order_ids, invoices))
+    
+    stats_counters.record_save([row['TotalDue'] for row in header_rows],
+                               products=len(missing), customers=len(new_customer_ids))
+    response_cache.stage()
+    order_dates = {order_id: row['OrderDate'] for order_id, row in zip(order_ids, header_rows)}
+    rollups.record_save(
+        [(row['OrderDate'], row['CustomerID'], row['TotalDue']) for row in header_rows],
+        [(order_dates[row['SalesOrderID']], row['ProductID'], row['OrderQty'], row['LineTotal']) for row in detail_rows]
+    )
+    
+    return [(order_id, row['SalesOrderNumber']) for order_id, row in zip(order_ids, header_rows)]
+
+# Bump whenever extraction output changes so cached results are not reused
+EXTRACTOR_VERSION = 'pipeline-5'
 
 def simulate_invoice_extraction(filename):
     """Simulate LLM invoice extraction with data matching the Sales Invoice.png"""
@@ -175,8 +521,129 @@ def simulate_invoice_extraction(filename):
         'processingTime': 2.1
     }
 
+# Built from the config by init_extraction (init_extraction_worker in spawned pool workers)
+llm_client = None
+extraction_pipeline = None
+
+def init_extraction(app):
+    """Set up the extraction model and pipeline; returns the extractor version results are cached under"""
+    global llm_client, extraction_pipeline
+    if app.config['EXTRACTION_MODEL'] == 'openai':
+        llm_client = LLMClient(
+            api_key=os.environ.get('OPENAI_API_KEY'),
+            model=app.config['LLM_MODEL'],
+            base_url=app.config['LLM_BASE_URL'],
+            max_concurrency=app.config['LLM_MAX_CONCURRENCY'],
+            requests_per_minute=app.config['LLM_REQUESTS_PER_MINUTE'],
+            tokens_per_minute=app.config['LLM_TOKENS_PER_MINUTE'],
+            max_retries=app.config['LLM_MAX_RETRIES'],
+            timeout=app.config['LLM_TIMEOUT']
+        )
+        model_extractor = InvoiceModel(llm_client, app.config['UPLOAD_FOLDER'],
+                                       max_tokens=app.config['LLM_MAX_TOKENS'])
+    else:
+        llm_client = None
+        model_extractor = simulate_invoice_extraction
+    
+    extraction_pipeline = ExtractionPipeline(
+        [SniffStage()]
+        + ([PreprocessStage(
+            workers=app.config['PREPROCESS_WORKERS'],
+            max_side=app.config['PREPROCESS_MAX_SIDE'],
+            dpi=app.config['PREPROCESS_DPI'],
+            grayscale=app.config['PREPROCESS_GRAYSCALE']
+        )] if app.config['PREPROCESS_IMAGES'] else [])
+        + ([TextLayerStage()] if app.config['EXTRACTION_TEXT_LAYER'] else [])
+        + [ModelStage(
+            model_extractor,
+            page_workers=app.config['EXTRACTION_PAGE_WORKERS'],
+            min_pages=app.config['EXTRACTION_MIN_PAGES']
+        )],
+        folder=app.config['UPLOAD_FOLDER'],
+        min_confidence=app.config['EXTRACTION_MIN_CONFIDENCE']
+    )
+    
+    if llm_client is None:
+        return EXTRACTOR_VERSION
+    return f"{EXTRACTOR_VERSION}:{app.config['LLM_MODEL']}"
+
+def init_extraction_worker(config):
+    """Process pool initializer: build the pipeline in a worker process from the app's config
+    
+    Workers started with spawn or forkserver import this module afresh, so
+    create_app never ran there; forked workers already inherit the pipeline.
+    """
+    if extraction_pipeline is None:
+        app = Flask(__name__)
+        app.config.update(config)
+        init_extraction(app)
+
+def extract_invoice(filename):
+    """Extract an uploaded file with the cheapest pipeline stage that is confident enough"""
+    result = extraction_pipeline.run(filename)
+    # Sent back on save to link the order to the stored upload
+    result['documentHash'] = blob_hash(filename)
+    return result
+
+extraction_cache = ExtractionCache(db, ExtractionCacheEntry)
+blob_store = BlobStore(db, OrderDocument, ExtractionJob)
+
+def observe_extraction(result):
+    """Record the stage timings of a fresh (not cached) extraction result"""
+    pipeline = result.get('pipeline') or {}
+    for stage in pipeline.get('stages', []):
+        metrics.timing(f"extract_{stage['stage']}", stage['seconds'])
+    for page in pipeline.get('pages') or []:
+        metrics.timing('extract_page', page['seconds'])
+
+def cache_job_result(job, result):
+    observe_extraction(result)
+    if job.ContentHash:
+        extraction_cache.set(job.ContentHash, result)
+
+job_queue = JobQueue(db, ExtractionJob, extract_invoice, on_result=cache_job_result,
+                     init_worker=init_extraction_worker)
+batch_processor = BatchProcessor(extract_invoice, extraction_cache, ALLOWED_FILE_TYPES,
+                                 init_worker=init_extraction_worker)
+
+def llm_stats(keys):
+    """LLM client totals as {(label,): value} for (label, stats key) pairs; empty for the simulated model"""
+    if llm_client is None:
+        return {}
+    stats = llm_client.stats()
+    return {(label,): stats[key] for label, key in keys}
+
+upload_bytes = metrics.registry.counter('upload_bytes_total', 'Bytes received in uploaded files')
+metrics.registry.gauge('extraction_jobs_pending', 'Background extraction jobs queued or running',
+                       lambda: job_queue.pending)
+metrics.registry.gauge('extraction_jobs_capacity', 'Most background jobs accepted at once',
+                       lambda: current_app.config['EXTRACTION_QUEUE_SIZE'])
+metrics.registry.gauge('batch_extractions_in_flight', 'Batch files submitted to the process pool and not finished',
+                       lambda: batch_processor.in_flight)
+metrics.registry.gauge('db_pool_checked_out', 'Database connections in use', lambda: {
+    (name or 'default',): engine.pool.checkedout()
+    for name, engine in db.engines.items() if hasattr(engine.pool, 'checkedout')
+}, labels=('bind',))
+metrics.registry.gauge('llm_requests_total', 'LLM API requests by outcome', lambda: llm_stats([
+    ('attempt', 'attempts'), ('rate_limited', 'rateLimited'), ('server_error', 'serverErrors'), ('failed', 'failures')
+]), labels=('outcome',), kind='counter')
+metrics.registry.gauge('llm_tokens_total', 'LLM tokens used', lambda: llm_stats([
+    ('prompt', 'promptTokens'), ('completion', 'completionTokens')
+]), labels=('type',), kind='counter')
+metrics.registry.gauge('response_cache_requests_total', 'Cached read endpoint requests by result', lambda: {
+    (result,): count for result, count in response_cache.stats().items()
+}, labels=('result',), kind='counter')
+metrics.registry.gauge('response_cache_bytes', 'Response bodies held by the response cache',
+                       lambda: response_cache.size_bytes)
+
+def wants_async():
+    value = request.args.get('async', request.form.get('async'))
+    if value is None:
+        return current_app.config['EXTRACTION_ASYNC']
+    return value.lower() in ('1', 'true', 'yes')
+
 # Routes
-@app.route('/')
+@api.route('/')
 def health_check():
     """
     Health Check
@@ -208,7 +675,27 @@ def health_check():
         }
     })
 
-@app.route('/api/invoices/upload', methods=['POST'])
+@api.route('/metrics')
+def prometheus_metrics():
+    """
+    Prometheus metrics
+    ---
+    produces:
+      - text/plain
+    responses:
+      200:
+        description: >
+          Request latency histograms and counts per route, SQL statements and
+          time per route, upload and extraction stage timings, job queue and
+          pool sizes, in the Prometheus text format
+      404:
+        description: Metrics are disabled (METRICS_ENABLED=false)
+    """
+    if not current_app.config['METRICS_ENABLED']:
+        return jsonify({'success': False, 'message': 'Metrics are disabled'}), 404
+    return Response(metrics.registry.render(), content_type=metrics.CONTENT_TYPE)
+
+@api.route('/api/invoices/upload', methods=['POST'])
 def upload_invoice():
     """
     Upload and process invoice
@@ -221,6 +708,11 @@ def upload_invoice():
         type: file
         required: true
         description: Invoice file (PDF, JPG, PNG)
+      - name: async
+        in: query
+        type: boolean
+        required: false
+        description: Queue the extraction and return a job ID immediately
     responses:
       200:
         description: Invoice processed successfully
@@ -233,47 +725,226 @@ def upload_invoice():
               type: string
             data:
               type: object
+      202:
+        description: Invoice accepted for background processing
       400:
         description: Bad request
+      413:
+        description: File too large
+      503:
+        description: Extraction queue is full
     """
     try:
-        if 'invoice' not in request.files:
+        # Parsing the form streams each file to UPLOAD_FOLDER in a single pass
+        started = time.perf_counter()
+        files = request.files
+        metrics.timing('upload', time.perf_counter() - started)
+        if 'invoice' not in files:
             return jsonify({'success': False, 'message': 'No file uploaded'}), 400
         
-        file = request.files['invoice']
+        file = files['invoice']
+        upload = file.stream
+        upload_bytes.inc(amount=upload.size)
         if file.filename == '':
+            upload.discard()
             return jsonify({'success': False, 'message': 'No file selected'}), 400
         
-        if not allowed_file(file.filename):
+        if upload.kind not in ALLOWED_FILE_TYPES:
+            upload.discard()
             return jsonify({'success': False, 'message': 'Invalid file type'}), 400
         
-        # Save file
-        filename = secure_filename(file.filename)
-        unique_filename = f"{uuid.uuid4()}_{filename}"
-        file_path = os.path.join(app.config['UPLOAD_FOLDER'], unique_filename)
-        file.save(file_path)
+        filename = upload.original_name
+        unique_filename = upload.stored_name
+        file_size = upload.size
+        content_hash = upload.sha256
+        
+        file_info = {
+            'originalName': filename,
+            'filename': unique_filename,
+            'size': file_size,
+            'fileType': upload.kind,
+            'sha256': content_hash,
+            'uploadedAt': datetime.utcnow().isoformat()
+        }
+        
+        # Identical bytes were already extracted by this extractor version
+        extracted_data, cache_tier = extraction_cache.get(content_hash)
+        if extracted_data is not None:
+            return jsonify({
+                'success': True,
+                'message': 'Invoice processed successfully',
+                'data': {
+                    'fileInfo': file_info,
+                    'extractedData': extracted_data,
+                    'cache': {'hit': True, 'tier': cache_tier}
+                }
+            })
+        
+        if wants_async():
+            try:
+                job = job_queue.submit(unique_filename, filename, file_size, content_hash)
+            except QueueFullError as e:
+                return jsonify({'success': False, 'message': str(e)}), 503
+            
+            return jsonify({
+                'success': True,
+                'message': 'Invoice accepted for processing',
+                'data': {
+                    'jobId': job.JobID,
+                    'status': job.Status,
+                    'statusUrl': f"/api/invoices/jobs/{job.JobID}"
+                }
+            }), 202
         
         # Simulate processing
-        extracted_data = simulate_invoice_extraction(unique_filename)
+        extracted_data = extract_invoice(unique_filename)
+        observe_extraction(extracted_data)
+        extraction_cache.set(content_hash, extracted_data)
         
         return jsonify({
             'success': True,
             'message': 'Invoice processed successfully',
             'data': {
-                'fileInfo': {
-                    'originalName': filename,
-                    'filename': unique_filename,
-                    'size': os.path.getsize(file_path),
-                    'uploadedAt': datetime.utcnow().isoformat()
-                },
-                'extractedData': extracted_data
+                'fileInfo': file_info,
+                'extractedData': extracted_data,
+                'cache': {'hit': False, 'tier': None}
+            }
+        })
+        
+    except RequestEntityTooLarge:
+        limit_mb = current_app.config['MAX_CONTENT_LENGTH'] // (1024 * 1024)
+        return jsonify({'success': False, 'message': f'File too large (max {limit_mb}MB)'}), 413
+    except Exception as e:
+        return jsonify({'success': False, 'message': str(e)}), 500
+
+@api.route('/api/invoices/upload/batch', methods=['POST'])
+def upload_invoice_batch():
+    """
+    Upload and process a batch of invoices
+    ---
+    consumes:
+      - multipart/form-data
+    produces:
+      - application/x-ndjson
+    parameters:
+      - name: invoices
+        in: formData
+        type: file
+        required: true
+        description: Invoice files (PDF, JPG, PNG), repeated, or a single ZIP archive of them
+    responses:
+      200:
+        description: >
+          Newline-delimited JSON, one line per file in completion order
+          (each with its batch index and either data or an error message),
+          followed by a summary line
+      400:
+        description: Bad request
+      413:
+        description: Batch too large
+    """
+    try:
+        started = time.perf_counter()
+        files = request.files.getlist('invoices') + request.files.getlist('invoice')
+        metrics.timing('upload', time.perf_counter() - started)
+        uploads = [file.stream for file in files if file.filename]
+        upload_bytes.inc(amount=sum(upload.size for upload in uploads))
+        if not uploads:
+            return jsonify({'success': False, 'message': 'No files uploaded'}), 400
+        
+        entries = batch_processor.collect(uploads)
+        
+        def generate():
+            succeeded = 0
+            for result in batch_processor.run(entries):
+                succeeded += result['success']
+                if result['success'] and not result['data']['cache']['hit']:
+                    observe_extraction(result['data']['extractedData'])
+                yield json.dumps(result) + '\n'
+            yield json.dumps({'summary': {
+                'total': len(entries),
+                'succeeded': succeeded,
+                'failed': len(entries) - succeeded
+            }}) + '\n'
+        
+        return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+        
+    except RequestEntityTooLarge:
+        return jsonify({'success': False, 'message': 'Batch too large'}), 413
+    except Exception as e:
+        return jsonify({'success': False, 'message': str(e)}), 500
+
+@api.route('/api/invoices/jobs')
+def list_jobs():
+    """
+    List extraction jobs
+    ---
+    parameters:
+      - name: status
+        in: query
+        type: string
+        enum: [queued, running, completed, failed]
+      - name: limit
+        in: query
+        type: integer
+        default: 20
+    responses:
+      200:
+        description: Jobs retrieved
+    """
+    try:
+        status = request.args.get('status')
+        limit = request.args.get('limit', 20, type=int)
+        
+        query = ExtractionJob.query
+        if status:
+            query = query.filter_by(Status=status)
+        jobs = query.order_by(ExtractionJob.CreatedAt.desc()).limit(limit).all()
+        
+        return jsonify({
+            'success': True,
+            'data': {
+                'jobs': [serialize_job(job) for job in jobs],
+                'queue': {
+                    'pending': job_queue.pending,
+                    'capacity': current_app.config['EXTRACTION_QUEUE_SIZE']
+                }
             }
         })
         
     except Exception as e:
         return jsonify({'success': False, 'message': str(e)}), 500
 
-@app.route('/api/invoices/save', methods=['POST'])
+@api.route('/api/invoices/jobs/<job_id>')
+def get_job(job_id):
+    """
+    Get extraction job status and result
+    ---
+    parameters:
+      - name: job_id
+        in: path
+        type: string
+        required: true
+    responses:
+      200:
+        description: Job retrieved; includes extractedData once completed
+      404:
+        description: Job not found
+    """
+    try:
+        job = db.session.get(ExtractionJob, job_id)
+        if not job:
+            return jsonify({'success': False, 'message': 'Job not found'}), 404
+        
+        return jsonify({
+            'success': True,
+            'data': serialize_job(job)
+        })
+        
+    except Exception as e:
+        return jsonify({'success': False, 'message': str(e)}), 500
+
+@api.route('/api/invoices/save', methods=['POST'])
 def save_invoice():
     """
     Save extracted invoice data
@@ -293,6 +964,9 @@ def save_invoice():
               type: array
             totals:
               type: object
+            documentHash:
+              type: string
+              description: SHA-256 of the uploaded file (from the extraction result), linking the order to it
     responses:
       201:
         description: Invoice saved successfully
@@ -308,38 +982,43 @@ def save_invoice():
         # Generate sales order number
         sales_order_number = f"SO{datetime.now().strftime('%Y%m%d%H%M%S')}"
         
+        # Take every ID this save needs before the transaction writes anything:
+        # a block reservation commits on its own connection, which would wait
+        # on this session's write lock once it has flushed
+        catalog_index.sync()
+        line_products = []  # ProductID per line item, or the normalized name of a product to create
+        for item in data['lineItems']:
+            product_id = item['productId']
+            if isinstance(product_id, str):
+                # Check if product already exists by number or name (in memory)
+                product_id = catalog_index.lookup(item['description'], product_id) or normalize_name(item['description'])
+            line_products.append(product_id)
+        new_names = list(dict.fromkeys(name for name in line_products if isinstance(name, str)))
+        new_product_ids = dict(zip(new_names, id_allocator.allocate('products', len(new_names))))
+        
         # Handle customer creation/lookup
         customer_info = data.get('customerInfo', {})
         customer_id = customer_info.get('customerId')
         
+        customers_created = 0
         if customer_id:
             # Check if customer exists
             existing_customer = Customer.query.get(customer_id)
             if not existing_customer:
                 # Create new customer
-                new_customer = Customer(
-                    CustomerID=customer_id,
-                    PersonID=None,
-                    StoreID=None,
-                    TerritoryID=1,  # Default territory
-                    AccountNumber=f"AC{customer_id:06d}"
-                )
+                id_allocator.observe('customers', customer_id)
+                new_customer = Customer(**customer_values(customer_id))
                 db.session.add(new_customer)
                 db.session.flush()
+                customers_created = 1
         else:
-            # Create a new customer with auto-generated ID
-            max_customer_id = db.session.query(db.func.max(Customer.CustomerID)).scalar() or 0
-            customer_id = max_customer_id + 1
+            # Create a new customer with an allocated ID
+            customer_id = id_allocator.next_id('customers')
             
-            new_customer = Customer(
-                CustomerID=customer_id,
-                PersonID=None,
-                StoreID=None,
-                TerritoryID=1,  # Default territory
-                AccountNumber=f"AC{customer_id:06d}"
-            )
+            new_customer = Customer(**customer_values(customer_id))
             db.session.add(new_customer)
             db.session.flush()
+            customers_created = 1
         
         # Create order header
         order_header = SalesOrderHeader(
@@ -357,41 +1036,16 @@ def save_invoice():
         db.session.flush()  # Get the ID
         
         # Create order details
-        for item in data['lineItems']:
-            product_id = item['productId']
-            
-            # If productId is a string (temp ID), create the product
+        created_products = {}
+        rollup_lines = []
+        for item, product_id in zip(data['lineItems'], line_products):
+            # Create each new product once, with the ProductID allocated above
             if isinstance(product_id, str):
-                # Check if product already exists by name
-                existing_product = Product.query.filter_by(Name=item['description']).first()
-                
-                if existing_product:
-                    product_id = existing_product.ProductID
-                else:
-                    # Get the next available ProductID
-                    max_product_id = db.session.query(db.func.max(Product.ProductID)).scalar() or 0
-                    new_product_id = max_product_id + 1
-                    
-                    # Create new product
-                    new_product = Product(
-                        ProductID=new_product_id,
-                        Name=item['description'],
-                        ProductNumber=f"PN-{new_product_id:06d}",
-                        MakeFlag=True,
-                        FinishedGoodsFlag=True,
-                        Color=None,
-                        StandardCost=item['unitPrice'] * 0.7,  # Assume 30% markup
-                        ListPrice=item['unitPrice'],
-                        Size=None,
-                        ProductLine=None,
-                        Class=None,
-                        Style=None,
-                        ProductSubcategoryID=None,
-                        ProductModelID=None
-                    )
+                name, product_id = product_id, new_product_ids[product_id]
+                if name not in created_products:
+                    new_product = Product(**product_values(product_id, item['description'], item['unitPrice']))
                     db.session.add(new_product)
-                    db.session.flush()  # Get the ID
-                    product_id = new_product_id
+                    created_products[name] = new_product
             
             order_detail = SalesOrderDetail(
                 SalesOrderID=order_header.SalesOrderID,
@@ -401,7 +1055,16 @@ def save_invoice():
                 LineTotal=item['lineTotal']
             )
             db.session.add(order_detail)
+            rollup_lines.append((order_header.OrderDate, product_id, item['quantity'], item['lineTotal']))
         
+        if created_products:
+            catalog_index.stage(
+                (product.ProductID, product.Name, product.ProductNumber) for product in created_products.values()
+            )
+        blob_store.link([(order_header.SalesOrderID, data.get('documentHash'))])
+        stats_counters.record_save([order_header.TotalDue], products=len(created_products), customers=customers_created)
+        rollups.record_save([(order_header.OrderDate, customer_id, order_header.TotalDue)], rollup_lines)
+        response_cache.stage()
         db.session.commit()
         
         return jsonify({
@@ -418,7 +1081,103 @@ def save_invoice():
         db.session.rollback()
         return jsonify({'success': False, 'message': str(e)}), 500
 
-@app.route('/api/invoices/history')
+@api.route('/api/invoices/save/batch', methods=['POST'])
+def save_invoice_batch():
+    """
+    Save many extracted invoices
+    ---
+    parameters:
+      - name: body
+        in: body
+        required: true
+        schema:
+          type: object
+          properties:
+            invoices:
+              type: array
+              description: Invoice payloads in the same shape as /api/invoices/save
+            chunkSize:
+              type: integer
+              description: Invoices per transaction (defaults to BULK_SAVE_CHUNK_SIZE)
+    responses:
+      200:
+        description: Per-invoice results
+      400:
+        description: Invalid data
+    """
+    try:
+        data = request.get_json()
+        invoices = data.get('invoices') if isinstance(data, dict) else data
+        if not isinstance(invoices, list) or not invoices:
+            return jsonify({'success': False, 'message': 'Expected a non-empty list of invoices'}), 400
+        
+        chunk_size = current_app.config['BULK_SAVE_CHUNK_SIZE']
+        if isinstance(data, dict) and data.get('chunkSize'):
+            chunk_size = max(1, int(data['chunkSize']))
+        
+        results = [None] * len(invoices)
+        valid = []
+        for index, invoice in enumerate(invoices):
+            try:
+                valid.append((index, normalize_invoice(invoice)))
+            except (KeyError, TypeError, ValueError) as e:
+                results[index] = {'index': index, 'success': False, 'message': str(e)}
+        
+        prefix = f"SO{datetime.now().strftime('%Y%m%d%H%M%S')}"
+        for start in range(0, len(valid), chunk_size):
+            chunk = valid[start:start + chunk_size]
+            order_number_prefix = f"{prefix}-{start // chunk_size + 1}"
+            try:
+                saved = save_invoice_chunk([invoice for _, invoice in chunk], order_number_prefix)
+                db.session.commit()
+            except Exception as e:
+                db.session.rollback()
+                if len(chunk) == 1:
+                    saved = [e]
+                else:
+                    # Save the failed chunk again one invoice per transaction,
+                    # so only the invoices that cause the failure are rejected
+                    saved = []
+                    for position, (_, invoice) in enumerate(chunk, start=1):
+                        try:
+                            saved.extend(save_invoice_chunk([invoice], order_number_prefix, first_position=position))
+                            db.session.commit()
+                        except Exception as error:
+                            db.session.rollback()
+                            saved.append(error)
+            
+            for (index, invoice), order in zip(chunk, saved):
+                if isinstance(order, Exception):
+                    results[index] = {'index': index, 'success': False, 'message': str(order)}
+                    continue
+                order_id, order_number = order
+                results[index] = {
+                    'index': index,
+                    'success': True,
+                    'salesOrderId': order_id,
+                    'salesOrderNumber': order_number,
+                    'itemCount': len(invoice['lineItems'])
+                }
+        
+        saved_count = sum(1 for result in results if result['success'])
+        return jsonify({
+            'success': saved_count == len(invoices),
+            'message': f'Saved {saved_count} of {len(invoices)} invoices',
+            'data': {
+                'results': results,
+                'summary': {
+                    'total': len(invoices),
+                    'succeeded': saved_count,
+                    'failed': len(invoices) - saved_count
+                }
+            }
+        })
+        
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'message': str(e)}), 500
+
+@api.route('/api/invoices/history')
 def get_invoice_history():
     """
     Get invoice processing history
@@ -432,47 +1191,86 @@ def get_invoice_history():
         in: query
         type: integer
         default: 20
+        minimum: 1
+        maximum: 1000
+      - name: cursor
+        in: query
+        type: string
+        description: nextCursor from the previous page (takes precedence over page)
     responses:
       200:
         description: Invoice history retrieved
+      400:
+        description: Invalid cursor
     """
     try:
-        page = request.args.get('page', 1, type=int)
-        limit = request.args.get('limit', 20, type=int)
+        page, limit = page_args(request.args, 20)
+        cursor = request.args.get('cursor')
         offset = (page - 1) * limit
         
-        orders = db.session.query(SalesOrderHeader).order_by(
-            SalesOrderHeader.CreatedAt.desc()
-        ).offset(offset).limit(limit).all()
+        # Item counts are a correlated subquery, so only the orders on this
+        # page are counted and the whole page is a single statement
+        item_count = db.select(db.func.count(SalesOrderDetail.SalesOrderDetailID)).where(
+            SalesOrderDetail.SalesOrderID == SalesOrderHeader.SalesOrderID
+        ).correlate(SalesOrderHeader).scalar_subquery()
         
-        result = []
-        for order in orders:
-            # Get item count
-            item_count = db.session.query(SalesOrderDetail).filter_by(
-                SalesOrderID=order.SalesOrderID
-            ).count()
-            
-            result.append({
-                'SalesOrderID': order.SalesOrderID,
-                'OrderDate': order.OrderDate.isoformat() if order.OrderDate else None,
-                'SalesOrderNumber': order.SalesOrderNumber,
-                'CustomerName': 'Sample Customer',  # Would join with customer table
-                'SubTotal': order.SubTotal,
-                'TaxAmt': order.TaxAmt,
-                'Freight': order.Freight,
-                'TotalDue': order.TotalDue,
-                'ItemCount': item_count,
-                'CreatedAt': order.CreatedAt.isoformat() if order.CreatedAt else None
-            })
+        # Only the columns the page shows, as tuples (no ORM objects)
+        orders = db.select(
+            SalesOrderHeader.SalesOrderID,
+            SalesOrderHeader.OrderDate,
+            SalesOrderHeader.SalesOrderNumber,
+            SalesOrderHeader.CustomerID,
+            Customer.AccountNumber,
+            SalesOrderHeader.SubTotal,
+            SalesOrderHeader.TaxAmt,
+            SalesOrderHeader.Freight,
+            SalesOrderHeader.TotalDue,
+            item_count.label('ItemCount'),
+            SalesOrderHeader.CreatedAt
+        ).outerjoin(
+            Customer, SalesOrderHeader.CustomerID == Customer.CustomerID
+        ).order_by(
+            SalesOrderHeader.CreatedAt.desc(), SalesOrderHeader.SalesOrderID.desc()
+        )
+        
+        if cursor:
+            try:
+                created_at, last_id = decode_cursor(cursor, datetime, int)
+            except ValueError as e:
+                return jsonify({'success': False, 'message': str(e)}), 400
+            orders = orders.where(
+                db.tuple_(SalesOrderHeader.CreatedAt, SalesOrderHeader.SalesOrderID) < (created_at, last_id)
+            )
+            offset = 0
+        
+        orders, has_more = fetch_rows(read_session, orders, limit, offset)
+        
+        # Dates stay date objects; the JSON provider writes them as ISO 8601
+        result = [{
+            'SalesOrderID': order_id,
+            'OrderDate': order_date,
+            'SalesOrderNumber': order_number,
+            'CustomerID': customer_id,
+            'CustomerName': f'Customer {customer_id}' if customer_id else None,
+            'AccountNumber': account_number,
+            'SubTotal': subtotal,
+            'TaxAmt': tax,
+            'Freight': freight,
+            'TotalDue': total_due,
+            'ItemCount': item_count,
+            'CreatedAt': created_at
+        } for (order_id, order_date, order_number, customer_id, account_number,
+               subtotal, tax, freight, total_due, item_count, created_at) in orders]
         
         return jsonify({
             'success': True,
             'data': {
                 'orders': result,
                 'pagination': {
-                    'page': page,
+                    'page': None if cursor else page,
                     'limit': limit,
-                    'hasMore': len(result) == limit
+                    'hasMore': has_more,
+                    'nextCursor': encode_cursor(orders[-1].CreatedAt, orders[-1].SalesOrderID) if has_more and orders else None
                 }
             }
         })
@@ -480,7 +1278,63 @@ def get_invoice_history():
     except Exception as e:
         return jsonify({'success': False, 'message': str(e)}), 500
 
-@app.route('/api/invoices/<int:order_id>/details')
+@api.route('/api/invoices/export')
+def export_orders():
+    """
+    Export orders with their line items
+    ---
+    produces:
+      - text/csv
+      - application/x-ndjson
+      - application/vnd.apache.parquet
+    parameters:
+      - name: format
+        in: query
+        type: string
+        enum: [csv, ndjson, parquet]
+        default: csv
+      - name: from
+        in: query
+        type: string
+        format: date
+        description: First OrderDate to include (YYYY-MM-DD)
+      - name: to
+        in: query
+        type: string
+        format: date
+        description: Last OrderDate to include (YYYY-MM-DD)
+    responses:
+      200:
+        description: One row per order line (header, line item and product columns), streamed
+      400:
+        description: Invalid parameters
+    """
+    try:
+        export_format = request.args.get('format', 'csv')
+        if export_format not in EXPORT_FORMATS:
+            return jsonify({'success': False, 'message': f'format must be one of {", ".join(EXPORT_FORMATS)}'}), 400
+        
+        try:
+            start = datetime.strptime(request.args['from'], '%Y-%m-%d').date() if request.args.get('from') else None
+            end = datetime.strptime(request.args['to'], '%Y-%m-%d').date() if request.args.get('to') else None
+        except ValueError:
+            return jsonify({'success': False, 'message': 'from and to must be dates (YYYY-MM-DD)'}), 400
+        
+        try:
+            chunks = order_exporter.stream(export_format, read_session.get_bind(), start, end,
+                                           current_app.config['EXPORT_BATCH_SIZE'])
+        except ImportError:
+            return jsonify({'success': False, 'message': 'Parquet export requires pyarrow'}), 400
+        
+        mimetype, extension = EXPORT_FORMATS[export_format]
+        filename = f"orders_{datetime.now().strftime('%Y%m%d%H%M%S')}.{extension}"
+        return Response(chunks, mimetype=mimetype,
+                        headers={'Content-Disposition': f'attachment; filename="{filename}"'})
+        
+    except Exception as e:
+        return jsonify({'success': False, 'message': str(e)}), 500
+
+@api.route('/api/invoices/<int:order_id>/details')
 def get_order_details(order_id):
     """
     Get order details
@@ -497,23 +1351,30 @@ def get_order_details(order_id):
         description: Order not found
     """
     try:
-        details = db.session.query(SalesOrderDetail, Product).join(
-            Product, SalesOrderDetail.ProductID == Product.ProductID
-        ).filter(SalesOrderDetail.SalesOrderID == order_id).all()
+        details = read_session.connection().execute(
+            db.select(
+                SalesOrderDetail.SalesOrderDetailID,
+                Product.Name,
+                Product.ProductNumber,
+                SalesOrderDetail.OrderQty,
+                SalesOrderDetail.UnitPrice,
+                SalesOrderDetail.LineTotal
+            ).join(
+                Product, SalesOrderDetail.ProductID == Product.ProductID
+            ).where(SalesOrderDetail.SalesOrderID == order_id)
+        ).all()
         
         if not details:
             return jsonify({'success': False, 'message': 'Order not found'}), 404
         
-        result = []
-        for detail, product in details:
-            result.append({
-                'SalesOrderDetailID': detail.SalesOrderDetailID,
-                'ProductName': product.Name,
-                'ProductNumber': product.ProductNumber,
-                'OrderQty': detail.OrderQty,
-                'UnitPrice': detail.UnitPrice,
-                'LineTotal': detail.LineTotal
-            })
+        result = [{
+            'SalesOrderDetailID': detail_id,
+            'ProductName': name,
+            'ProductNumber': product_number,
+            'OrderQty': quantity,
+            'UnitPrice': unit_price,
+            'LineTotal': line_total
+        } for detail_id, name, product_number, quantity, unit_price, line_total in details]
         
         return jsonify({
             'success': True,
@@ -526,7 +1387,8 @@ def get_order_details(order_id):
     except Exception as e:
         return jsonify({'success': False, 'message': str(e)}), 500
 
-@app.route('/api/data/stats')
+@api.route('/api/data/stats')
+@response_cache.cached
 def get_stats():
     """
     Get database statistics
@@ -536,22 +1398,18 @@ def get_stats():
         description: Statistics retrieved
     """
     try:
-        total_products = db.session.query(Product).count()
-        total_customers = db.session.query(Customer).count()
-        total_orders = db.session.query(SalesOrderHeader).count()
-        
-        # Calculate totals
-        total_revenue = db.session.query(db.func.sum(SalesOrderHeader.TotalDue)).scalar() or 0
-        avg_order = db.session.query(db.func.avg(SalesOrderHeader.TotalDue)).scalar() or 0
+        # One row of running totals instead of scanning the order and catalog tables
+        stats = stats_counters.read()
+        avg_order = stats['Revenue'] / stats['PricedOrders'] if stats['PricedOrders'] else 0
         
         return jsonify({
             'success': True,
             'data': {
-                'totalProducts': total_products,
-                'totalCustomers': total_customers,
-                'totalOrders': total_orders,
-                'recentOrders': total_orders,  # For demo purposes
-                'totalRevenue': round(total_revenue, 2),
+                'totalProducts': stats['Products'],
+                'totalCustomers': stats['Customers'],
+                'totalOrders': stats['Orders'],
+                'recentOrders': stats['Orders'],  # For demo purposes
+                'totalRevenue': round(stats['Revenue'], 2),
                 'averageOrderValue': round(avg_order, 2)
             }
         })
@@ -559,7 +1417,73 @@ def get_stats():
     except Exception as e:
         return jsonify({'success': False, 'message': str(e)}), 500
 
-@app.route('/api/data/products')
+@api.route('/api/data/analytics')
+def get_analytics():
+    """
+    Revenue and volume by period, customer or product
+    ---
+    parameters:
+      - name: granularity
+        in: query
+        type: string
+        enum: [day, month]
+        default: month
+      - name: groupBy
+        in: query
+        type: string
+        default: period
+        description: Comma-separated subset of period, customer, product (customer and product cannot be combined)
+      - name: from
+        in: query
+        type: string
+        format: date
+        description: First OrderDate to include (YYYY-MM-DD)
+      - name: to
+        in: query
+        type: string
+        format: date
+        description: Last OrderDate to include (YYYY-MM-DD)
+    responses:
+      200:
+        description: Aggregated rows
+      400:
+        description: Invalid parameters
+    """
+    try:
+        granularity = request.args.get('granularity', 'month')
+        group_by = [name.strip() for name in request.args.get('groupBy', 'period').split(',') if name.strip()]
+        if granularity not in PERIODS:
+            return jsonify({'success': False, 'message': f'granularity must be one of {", ".join(PERIODS)}'}), 400
+        if any(name not in GROUP_BY for name in group_by):
+            return jsonify({'success': False, 'message': f'groupBy must be a subset of {", ".join(GROUP_BY)}'}), 400
+        
+        try:
+            start = datetime.strptime(request.args['from'], '%Y-%m-%d').date() if request.args.get('from') else None
+            end = datetime.strptime(request.args['to'], '%Y-%m-%d').date() if request.args.get('to') else None
+        except ValueError:
+            return jsonify({'success': False, 'message': 'from and to must be dates (YYYY-MM-DD)'}), 400
+        
+        try:
+            rows = rollups.query(granularity, group_by, start, end)
+        except ValueError as e:
+            return jsonify({'success': False, 'message': str(e)}), 400
+        
+        return jsonify({
+            'success': True,
+            'data': {
+                'granularity': granularity,
+                'groupBy': group_by,
+                'from': start.isoformat() if start else None,
+                'to': end.isoformat() if end else None,
+                'rows': rows
+            }
+        })
+        
+    except Exception as e:
+        return jsonify({'success': False, 'message': str(e)}), 500
+
+@api.route('/api/data/products')
+@response_cache.cached
 def get_products():
     """
     Get products catalog
@@ -573,52 +1497,86 @@ def get_products():
         in: query
         type: integer
         default: 50
+        minimum: 1
+        maximum: 1000
       - name: search
         in: query
         type: string
+      - name: cursor
+        in: query
+        type: string
+        description: nextCursor from the previous page (takes precedence over page)
     responses:
       200:
         description: Products retrieved
+      400:
+        description: Invalid cursor
     """
     try:
-        page = request.args.get('page', 1, type=int)
-        limit = request.args.get('limit', 50, type=int)
+        page, limit = page_args(request.args, 50)
         search = request.args.get('search', '')
+        cursor = request.args.get('cursor')
         offset = (page - 1) * limit
         
-        query = db.session.query(Product)
+        query = db.select(Product.ProductID, Product.Name, Product.ProductNumber, Product.ListPrice, Product.Color)
+        order_by = [Product.ProductID]
+        
+        last_key = None
+        if cursor:
+            try:
+                # Full-text search cursors carry (rank, ProductID); everything else just ProductID
+                ranked = search_index.handles(search)
+                last_key = decode_cursor(cursor, *([float, int] if ranked else [int]))
+            except ValueError as e:
+                return jsonify({'success': False, 'message': str(e)}), 400
+            offset = 0
         
+        matches = None
         if search:
-            query = query.filter(
+            matches = search_index.matches('products_fts', search,
+                                           after=last_key[-1] if last_key else None,
+                                           limit=offset + limit + 1)
+        if matches is not None:
+            # Ranked full-text search; pages walk (rank, ProductID)
+            query = query.join(matches, Product.ProductID == matches.c.rowid).add_columns(matches.c.rank)
+            order_by = [matches.c.rank, Product.ProductID]
+        elif search:
+            query = query.where(
                 db.or_(
                     Product.Name.contains(search),
                     Product.ProductNumber.contains(search)
                 )
             )
         
-        products = query.offset(offset).limit(limit).all()
-        
-        result = []
-        for product in products:
-            result.append({
-                'ProductID': product.ProductID,
-                'Name': product.Name,
-                'ProductNumber': product.ProductNumber,
-                'ListPrice': product.ListPrice,
-                'Color': product.Color,
-                'CategoryName': 'General',  # Would join with category table
-                'SubcategoryName': 'General'
-            })
+        if last_key:
+            query = query.where(db.tuple_(*order_by) > tuple(last_key))
+        
+        rows, has_more = fetch_rows(read_session, query.order_by(*order_by), limit, offset)
+        next_key = None
+        if rows:
+            next_key = (rows[-1].rank, rows[-1].ProductID) if matches is not None else (rows[-1].ProductID,)
+        
+        # Unpacked rather than read by name: Row attribute access costs more than building the dict
+        result = [{
+            'ProductID': product_id,
+            'Name': name,
+            'ProductNumber': product_number,
+            'ListPrice': list_price,
+            'Color': color,
+            'CategoryName': 'General',  # Would join with category table
+            'SubcategoryName': 'General'
+        } for product_id, name, product_number, list_price, color, *_ in rows]  # *_: the search rank
         
         return jsonify({
             'success': True,
             'data': {
                 'products': result,
                 'pagination': {
-                    'page': page,
+                    'page': None if cursor else page,
                     'limit': limit,
                     'search': search,
-                    'hasMore': len(result) == limit
+                    'hasMore': has_more,
+                    'nextCursor': encode_cursor(*next_key) if has_more and next_key else None
                 }
             }
         })
@@ -626,7 +1584,7 @@ def get_products():
     except Exception as e:
         return jsonify({'success': False, 'message': str(e)}), 500
 
-@app.route('/api/invoices/<int:order_id>', methods=['DELETE'])
+@api.route('/api/invoices/<int:order_id>', methods=['DELETE'])
 def delete_order(order_id):
     """
     Delete an order and its details
@@ -651,11 +1609,21 @@ def delete_order(order_id):
         if not order:
             return jsonify({'success': False, 'message': 'Order not found'}), 404
         
+        lines = db.session.execute(
+            db.select(SalesOrderDetail.ProductID, SalesOrderDetail.OrderQty, SalesOrderDetail.LineTotal)
+            .where(SalesOrderDetail.SalesOrderID == order_id)
+        ).all()
+        
         # Delete order details first (foreign key constraint)
         SalesOrderDetail.query.filter_by(SalesOrderID=order_id).delete()
+        blob_store.unlink(order_id)
         
         # Delete the order header
         db.session.delete(order)
+        stats_counters.record_delete([order.TotalDue])
+        rollups.record_delete([(order.OrderDate, order.CustomerID, order.TotalDue)],
+                              [(order.OrderDate, *line) for line in lines])
+        response_cache.stage()
         db.session.commit()
         
         return jsonify({
@@ -667,7 +1635,22 @@ def delete_order(order_id):
         db.session.rollback()
         return jsonify({'success': False, 'message': str(e)}), 500
 
-@app.route('/api/data/territories')
+# Fixed until territory data is loaded, so served as one precomputed response
+TERRITORIES = [
+    {'TerritoryID': 1, 'Name': 'Northwest', 'CountryRegionCode': 'US', 'GroupName': 'North America'},
+    {'TerritoryID': 2, 'Name': 'Northeast', 'CountryRegionCode': 'US', 'GroupName': 'North America'},
+    {'TerritoryID': 3, 'Name': 'Central', 'CountryRegionCode': 'US', 'GroupName': 'North America'},
+    {'TerritoryID': 4, 'Name': 'Southwest', 'CountryRegionCode': 'US', 'GroupName': 'North America'},
+    {'TerritoryID': 5, 'Name': 'Southeast', 'CountryRegionCode': 'US', 'GroupName': 'North America'},
+    {'TerritoryID': 6, 'Name': 'Canada', 'CountryRegionCode': 'CA', 'GroupName': 'North America'},
+    {'TerritoryID': 7, 'Name': 'France', 'CountryRegionCode': 'FR', 'GroupName': 'Europe'},
+    {'TerritoryID': 8, 'Name': 'Germany', 'CountryRegionCode': 'DE', 'GroupName': 'Europe'},
+    {'TerritoryID': 9, 'Name': 'Australia', 'CountryRegionCode': 'AU', 'GroupName': 'Pacific'},
+    {'TerritoryID': 10, 'Name': 'United Kingdom', 'CountryRegionCode': 'GB', 'GroupName': 'Europe'}
+]
+
+@api.route('/api/data/territories')
+@response_cache.immutable
 def get_territories():
     """
     Get sales territories
@@ -676,32 +1659,15 @@ def get_territories():
       200:
         description: Territories retrieved successfully
     """
-    try:
-        # For now, return empty array since we don't have territory data loaded
-        territories = [
-            {'TerritoryID': 1, 'Name': 'Northwest', 'CountryRegionCode': 'US', 'GroupName': 'North America'},
-            {'TerritoryID': 2, 'Name': 'Northeast', 'CountryRegionCode': 'US', 'GroupName': 'North America'},
-            {'TerritoryID': 3, 'Name': 'Central', 'CountryRegionCode': 'US', 'GroupName': 'North America'},
-            {'TerritoryID': 4, 'Name': 'Southwest', 'CountryRegionCode': 'US', 'GroupName': 'North America'},
-            {'TerritoryID': 5, 'Name': 'Southeast', 'CountryRegionCode': 'US', 'GroupName': 'North America'},
-            {'TerritoryID': 6, 'Name': 'Canada', 'CountryRegionCode': 'CA', 'GroupName': 'North America'},
-            {'TerritoryID': 7, 'Name': 'France', 'CountryRegionCode': 'FR', 'GroupName': 'Europe'},
-            {'TerritoryID': 8, 'Name': 'Germany', 'CountryRegionCode': 'DE', 'GroupName': 'Europe'},
-            {'TerritoryID': 9, 'Name': 'Australia', 'CountryRegionCode': 'AU', 'GroupName': 'Pacific'},
-            {'TerritoryID': 10, 'Name': 'United Kingdom', 'CountryRegionCode': 'GB', 'GroupName': 'Europe'}
-        ]
-        
-        return jsonify({
-            'success': True,
-            'data': {
-                'territories': territories
-            }
-        })
-        
-    except Exception as e:
-        return jsonify({'success': False, 'message': str(e)}), 500
+    return jsonify({
+        'success': True,
+        'data': {
+            'territories': TERRITORIES
+        }
+    })
 
-@app.route('/api/data/customers')
+@api.route('/api/data/customers')
+@response_cache.cached
 def get_customers():
     """
     Get customers list
@@ -715,45 +1681,78 @@ def get_customers():
         in: query
         type: integer
         default: 50
+        minimum: 1
+        maximum: 1000
       - name: search
         in: query
         type: string
+      - name: cursor
+        in: query
+        type: string
+        description: nextCursor from the previous page (takes precedence over page)
     responses:
       200:
         description: Customers retrieved successfully
+      400:
+        description: Invalid cursor
     """
     try:
-        page = request.args.get('page', 1, type=int)
-        limit = request.args.get('limit', 50, type=int)
+        page, limit = page_args(request.args, 50)
         search = request.args.get('search', '')
+        cursor = request.args.get('cursor')
         offset = (page - 1) * limit
         
-        query = db.session.query(Customer)
+        query = db.select(Customer.CustomerID, Customer.AccountNumber)
+        order_by = [Customer.CustomerID]
+        
+        last_key = None
+        if cursor:
+            try:
+                # Full-text search cursors carry (rank, CustomerID); everything else just CustomerID
+                ranked = search_index.handles(search)
+                last_key = decode_cursor(cursor, *([float, int] if ranked else [int]))
+            except ValueError as e:
+                return jsonify({'success': False, 'message': str(e)}), 400
+            offset = 0
         
+        matches = None
         if search:
-            query = query.filter(Customer.AccountNumber.contains(search))
-        
-        customers = query.offset(offset).limit(limit).all()
-        
-        result = []
-        for customer in customers:
-            result.append({
-                'CustomerID': customer.CustomerID,
-                'CustomerName': f'Customer {customer.CustomerID}',  # Placeholder
-                'AccountNumber': customer.AccountNumber,
-                'City': 'Sample City',  # Placeholder
-                'State': 'Sample State'  # Placeholder
-            })
+            matches = search_index.matches('customers_fts', search,
+                                           after=last_key[-1] if last_key else None,
+                                           limit=offset + limit + 1)
+        if matches is not None:
+            # Ranked full-text search; pages walk (rank, CustomerID)
+            query = query.join(matches, Customer.CustomerID == matches.c.rowid).add_columns(matches.c.rank)
+            order_by = [matches.c.rank, Customer.CustomerID]
+        elif search:
+            query = query.where(Customer.AccountNumber.contains(search))
+        
+        if last_key:
+            query = query.where(db.tuple_(*order_by) > tuple(last_key))
+        
+        rows, has_more = fetch_rows(read_session, query.order_by(*order_by), limit, offset)
+        next_key = None
+        if rows:
+            next_key = (rows[-1].rank, rows[-1].CustomerID) if matches is not None else (rows[-1].CustomerID,)
+        
+        result = [{
+            'CustomerID': customer_id,
+            'CustomerName': f'Customer {customer_id}',  # Placeholder
+            'AccountNumber': account_number,
+            'City': 'Sample City',  # Placeholder
+            'State': 'Sample State'  # Placeholder
+        } for customer_id, account_number, *_ in rows]  # *_: the search rank
         
         return jsonify({
             'success': True,
             'data': {
                 'customers': result,
                 'pagination': {
-                    'page': page,
+                    'page': None if cursor else page,
                     'limit': limit,
                     'search': search,
-                    'hasMore': len(result) == limit
+                    'hasMore': has_more,
+                    'nextCursor': encode_cursor(*next_key) if has_more and next_key else None
                 }
             }
         })
@@ -763,15 +1762,142 @@ def get_customers():
 
 # Database initialization
 def init_db():
-    """Initialize database with CSV data"""
+    """Create the schema (load master data with `flask --app app load-csv`)"""
     db.create_all()
+    stats_counters.ensure()
+    rollups.ensure()
+    job_queue.ensure()
+    if not search_index.install():
+        print("⚠️  SQLite FTS5 not available; product/customer search will use LIKE")
     
     # Database initialized with empty tables
     # All data (products, customers, orders) will be created dynamically when invoices are processed
     print("✅ Database initialized with empty tables")
     print("📦 Products and customers will be created dynamically when invoices are processed")
 
+@api.cli.command('init-db')
+def init_db_command():
+    """Create the schema, stats row, rollups and search index (once per deployment, not per worker)"""
+    init_db()
+
+@api.cli.command('reconcile-stats')
+def reconcile_stats_command():
+    """Recompute the dashboard totals from the order and catalog tables"""
+    stats_counters.reconcile()
+    with db.engine.begin() as conn:
+        response_cache.invalidate(conn)
+    stats = stats_counters.read()
+    print(f"✅ Stats reconciled: {stats['Products']} products, {stats['Customers']} customers, "
+          f"{stats['Orders']} orders, revenue {stats['Revenue']:.2f}")
+
+@api.cli.command('rebuild-rollups')
+def rebuild_rollups_command():
+    """Recompute the daily/monthly analytics rollups from all orders"""
+    order_rows, product_rows = rollups.rebuild()
+    print(f"✅ Rollups rebuilt: {order_rows} customer rows, {product_rows} product rows")
+
+@api.cli.command('load-csv')
+@click.argument('kind', type=click.Choice(['products', 'customers']))
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--sep', default=',', help='Field separator (AdventureWorks exports use tabs: --sep $\'\\t\')')
+@click.option('--chunk-size', default=50000, show_default=True, help='Rows read and inserted per batch')
+def load_csv_command(kind, path, sep, chunk_size):
+    """Bulk-load a products or customers CSV in one transaction"""
+    table = {'products': Product, 'customers': Customer}[kind].__table__
+    started = time.perf_counter()
+    
+    def report(rows):
+        print(f"  {rows} rows ({rows / (time.perf_counter() - started):,.0f} rows/s)")
+    
+    with db.engine.begin() as conn:
+        # Take the write lock up front so index and trigger changes are part of the load's transaction
+        conn.exec_driver_sql('BEGIN IMMEDIATE')
+        with search_index.suspended(conn, table.name), without_indexes(conn, table):
+            rows, highest = load_csv(conn, table, path, sep=sep, chunk_size=chunk_size,
+                                     first_id=id_allocator.first_free(conn, kind), on_chunk=report)
+        if kind == 'products':
+            catalog_index.invalidate(conn)
+        response_cache.invalidate(conn)
+    if rows:
+        id_allocator.observe(kind, highest)
+    stats_counters.reconcile()
+    
+    elapsed = time.perf_counter() - started
+    print(f"✅ Loaded {rows} {kind} in {elapsed:.1f}s ({rows / elapsed:,.0f} rows/s, indexes included)")
+
+@api.cli.command('export-orders')
+@click.option('--format', 'export_format', type=click.Choice(list(EXPORT_FORMATS)), default='csv')
+@click.option('--from', 'start', type=click.DateTime(['%Y-%m-%d']), help='First OrderDate to include')
+@click.option('--to', 'end', type=click.DateTime(['%Y-%m-%d']), help='Last OrderDate to include')
+@click.option('--output', '-o', type=click.Path(dir_okay=False), required=True)
+def export_orders_command(export_format, start, end, output):
+    """Write every order line (optionally within a date range) to a file"""
+    size = 0
+    with open(output, 'wb') as f:
+        for chunk in order_exporter.stream(export_format, db.engine, start.date() if start else None,
+                                           end.date() if end else None, current_app.config['EXPORT_BATCH_SIZE']):
+            f.write(chunk)
+            size += len(chunk)
+    print(f"✅ Exported orders to {output} ({size / (1024 * 1024):.1f} MB)")
+
+@api.cli.command('gc-uploads')
+@click.option('--days', default=30, show_default=True, help='Keep anything uploaded more recently than this')
+@click.option('--dry-run', is_flag=True, help='Only report what would be deleted')
+def gc_uploads_command(days, dry_run):
+    """Delete stored uploads no order or pending job references"""
+    report = blob_store.collect_garbage(days, dry_run=dry_run)
+    action = 'Would delete' if dry_run else 'Deleted'
+    print(f"✅ {action} {report['removed']} unreferenced files ({report['removedBytes'] / (1024 * 1024):.1f} MB), "
+          f"kept {report['kept']} referenced ({report['keptBytes'] / (1024 * 1024):.1f} MB)")
+
+@api.cli.command('rebuild-search-index')
+def rebuild_search_index_command():
+    """Re-index all products and customers for full-text search"""
+    search_index.install()
+    search_index.rebuild()
+    print("✅ Search index rebuilt")
+
+def create_app(overrides=None):
+    """Build the app from the environment (plus ``overrides``); see wsgi.py for production servers.
+    
+    Only configures: the schema is created by `flask --app app init-db`, once per
+    deployment, and pools, caches and connections are set up on first use.
+    """
+    app = Flask(__name__)
+    app.request_class = StreamingRequest  # uploads stream straight into UPLOAD_FOLDER
+    app.json = FastJSONProvider(app)  # orjson when installed, the stdlib encoder otherwise
+    configure(app, overrides)
+    
+    # Initialize extensions
+    db.init_app(app)
+    init_storage(app, db, read_session)
+    CORS(app)
+    init_query_counter(app)
+    if app.config['METRICS_ENABLED']:
+        metrics.init_metrics(app)
+    if app.config['SWAGGER_ENABLED']:
+        from flasgger import Swagger
+        Swagger(app, config=swagger_config, template=swagger_template)
+    
+    id_allocator.block_size = app.config['ID_BLOCK_SIZE']
+    blob_store.folder = app.config['UPLOAD_FOLDER']
+    extraction_cache.init_app(app, init_extraction(app))
+    response_cache.init_app(app)
+    job_queue.init_app(app)
+    batch_processor.init_app(app)
+    
+    app.register_blueprint(api)
+    os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+    return app
+
 if __name__ == '__main__':
+    app = create_app()
     with app.app_context():
         init_db()
+        # The debug reloader also runs this block in its watcher process;
+        # only the serving process should pick up unfinished jobs, and it
+        # is the only one that could have been running them
+        if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+            job_queue.release()
+            job_queue.recover()
     app.run(debug=True, host='0.0.0.0', port=5001)
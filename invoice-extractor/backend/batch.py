@@ -0,0 +1,209 @@
+"""Batch extraction for many invoices in one request.
+
+A batch is either several files in one multipart request or a single ZIP
+archive. Each file is expanded into an ``UploadWriter`` (ZIP members are
+streamed out of the archive the same way uploads are streamed off the wire),
+extraction is fanned out across a process pool, and results are yielded in
+completion order so the route can stream them back as NDJSON.
+"""
+import os
+import threading
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+
+from flask import current_app
+from werkzeug.exceptions import RequestEntityTooLarge
+
+from uploads import CHUNK_SIZE, UploadWriter
+
+
+def file_info(upload):
+    return {
+        'originalName': upload.original_name,
+        'filename': upload.stored_name,
+        'size': upload.size,
+        'fileType': upload.kind,
+        'sha256': upload.sha256,
+        'uploadedAt': datetime.utcnow().isoformat()
+    }
+
+
+def expand_zip(archive_upload, folder, max_size, allowed_types=None, max_files=None):
+    """Yield ``(name, upload, error)`` for each file inside a ZIP upload, at most ``max_files``.
+
+    A member is only stored once it has passed the ``allowed_types`` and
+    ``max_size`` checks. Past ``max_files`` entries the rest of the archive is
+    not read; a last entry says how many files were skipped.
+    """
+    try:
+        archive = zipfile.ZipFile(archive_upload.path)
+    except zipfile.BadZipFile:
+        yield archive_upload.original_name, None, 'Invalid ZIP archive'
+        return
+
+    with archive:
+        # Skip folders and the resource-fork entries macOS adds to archives
+        members = [info for info in archive.infolist()
+                   if not info.is_dir() and not info.filename.startswith('__MACOSX/')]
+        for position, info in enumerate(members):
+            if max_files is not None and position >= max_files:
+                yield (archive_upload.original_name, None,
+                       f'Batch file limit reached; {len(members) - position} more files in the archive were skipped')
+                break
+            name = os.path.basename(info.filename)
+            # Reject on the declared size first, then enforce it while inflating
+            if max_size is not None and info.file_size > max_size:
+                yield name, None, 'File too large'
+                continue
+
+            writer = UploadWriter(folder, name, max_size)
+            try:
+                with archive.open(info) as member:
+                    for chunk in iter(lambda: member.read(CHUNK_SIZE), b''):
+                        writer.write(chunk)
+                        # The first chunk holds the magic bytes; inflate no more of a wrong type
+                        if allowed_types is not None and writer.kind not in allowed_types:
+                            break
+                if allowed_types is not None and writer.kind not in allowed_types:
+                    writer.discard()
+                    yield name, None, 'Invalid file type'
+                    continue
+                writer.finish()
+            except RequestEntityTooLarge:
+                yield name, None, 'File too large'
+            except (zipfile.BadZipFile, RuntimeError, OSError) as e:
+                writer.discard()
+                yield name, None, str(e)
+            else:
+                yield name, writer, None
+
+    # The archive itself is not an invoice; only its members are kept
+    archive_upload.discard()
+
+
+class BatchProcessor:
+    def __init__(self, extract_fn, cache, allowed_types, init_worker=None, app=None):
+        self.extract_fn = extract_fn
+        # Called as init_worker(config) in each pool process, which may not
+        # have inherited the parent's state (spawn or forkserver start methods)
+        self.init_worker = init_worker
+        self.cache = cache
+        self.allowed_types = allowed_types
+        self._lock = threading.Lock()
+        self._states = []  # every app's pool state, for shutdown()
+        self.in_flight = 0  # files submitted to the pool and not finished yet
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        # Each app gets its own pool, sized by its own BATCH_WORKERS
+        state = {'executor': None}
+        app.extensions['batch_processor'] = state
+        with self._lock:
+            self._states.append(state)
+
+    def _pool(self):
+        state = current_app.extensions['batch_processor']
+        with self._lock:
+            if state['executor'] is None:
+                state['executor'] = ProcessPoolExecutor(
+                    max_workers=current_app.config['BATCH_WORKERS'],
+                    initializer=self.init_worker,
+                    initargs=(dict(current_app.config),)
+                )
+            return state['executor']
+
+    def collect(self, uploads):
+        """Expand ZIP archives and validate files. Returns a list of batch entries."""
+        folder = current_app.config['UPLOAD_FOLDER']
+        max_size = current_app.config['MAX_CONTENT_LENGTH']
+        max_files = current_app.config['BATCH_MAX_FILES']
+
+        candidates = []
+        for upload in uploads:
+            if upload.too_large:
+                candidates.append((upload.original_name, None, 'File too large'))
+            elif upload.kind == 'zip':
+                candidates.extend(expand_zip(upload, folder, max_size, self.allowed_types,
+                                             max(max_files - len(candidates), 0)))
+            else:
+                candidates.append((upload.original_name, upload, None))
+
+        entries = []
+        for index, (name, upload, error) in enumerate(candidates):
+            if error is None and index >= max_files:
+                upload.discard()
+                error = f'Batch limit of {max_files} files exceeded'
+            elif error is None and upload.kind not in self.allowed_types:
+                upload.discard()
+                error = 'Invalid file type'
+            entries.append({
+                'index': index,
+                'originalName': name,
+                'upload': None if error else upload,
+                'error': error
+            })
+        return entries
+
+    def run(self, entries):
+        """Yield one result dict per entry as soon as it is available."""
+        futures = {}
+        for entry in entries:
+            if entry['error']:
+                yield self._failure(entry, entry['error'])
+                continue
+
+            upload = entry['upload']
+            cached, tier = self.cache.get(upload.sha256)
+            if cached is not None:
+                yield self._success(entry, cached, {'hit': True, 'tier': tier})
+                continue
+
+            future = self._pool().submit(self.extract_fn, upload.stored_name)
+            with self._lock:
+                self.in_flight += 1
+            # Counted down even if the client stops reading the stream
+            future.add_done_callback(self._finished)
+            futures[future] = entry
+
+        for future in as_completed(futures):
+            entry = futures[future]
+            try:
+                extracted_data = future.result()
+            except Exception as e:
+                yield self._failure(entry, str(e))
+                continue
+            self.cache.set(entry['upload'].sha256, extracted_data)
+            yield self._success(entry, extracted_data, {'hit': False, 'tier': None})
+
+    def _finished(self, future):
+        with self._lock:
+            self.in_flight -= 1
+
+    def _success(self, entry, extracted_data, cache):
+        return {
+            'index': entry['index'],
+            'success': True,
+            'data': {
+                'fileInfo': file_info(entry['upload']),
+                'extractedData': extracted_data,
+                'cache': cache
+            }
+        }
+
+    def _failure(self, entry, message):
+        return {
+            'index': entry['index'],
+            'success': False,
+            'originalName': entry['originalName'],
+            'message': message
+        }
+
+    def shutdown(self, wait=True):
+        with self._lock:
+            executors = [state['executor'] for state in self._states if state['executor'] is not None]
+            for state in self._states:
+                state['executor'] = None
+        for executor in executors:
+            executor.shutdown(wait=wait)
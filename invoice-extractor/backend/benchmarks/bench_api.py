@@ -0,0 +1,417 @@
+"""Benchmark the API's main endpoints and compare against a stored baseline.
+
+Seeds a scratch database with synthetic_data.py (or reuses --database) and
+runs --requests requests per scenario (upload, save, history, details,
+stats, search, delete), --rounds times over:
+
+* ``client``: one at a time through the Flask test client, in process, so
+  the numbers are the app's own cost without HTTP or scheduling noise
+* ``http``: --concurrency threads with keep-alive connections against a
+  threaded server started in a child process (or an already running one at
+  --url, e.g. the production server)
+
+Writes p50/p95/p99/mean latency (ms) and throughput (requests/s), each the
+median over the rounds, and errors per mode and scenario as JSON to
+--output. Then compares them against --baseline (benchmarks/baseline.json by
+default) and exits 1 if a latency grew or throughput dropped by more than
+--tolerance (latencies within --min-delta-ms of the baseline never count).
+Baselines only compare on the machine and data volumes they were recorded
+with, so none is committed: without one, or with one from another machine
+or setup, the run exits 2 instead of passing. --save-baseline records one;
+--no-baseline only measures.
+
+    python benchmarks/bench_api.py --orders 1000000 --products 100000 --save-baseline benchmarks/baseline.json
+    python benchmarks/bench_api.py --orders 1000000 --products 100000
+"""
+import argparse
+import copy
+import http.client
+import io
+import json
+import math
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.parse
+import uuid
+
+from synthetic_data import product_name, seed
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_BASELINE = os.path.join(BACKEND_DIR, 'benchmarks', 'baseline.json')
+SCENARIOS = ['upload', 'save', 'history', 'details', 'stats', 'search', 'delete']
+SEARCH_TERMS = ['steel', 'wheel', 'road frame', 'pro', 'helmet', 'carbon fork', 'bolt', 'PN-0001']
+# Keys compared against the baseline: latencies must not grow, throughput must not drop
+LATENCY_KEYS = ['p50', 'p95', 'p99']
+
+
+def percentile(ordered, fraction):
+    """Nearest-rank percentile of an already sorted list."""
+    if not ordered:
+        return None
+    return ordered[max(0, math.ceil(fraction * len(ordered)) - 1)]
+
+
+def summarize(latencies, errors, seconds):
+    ordered = sorted(latencies)
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'seconds': round(seconds, 3),
+        'throughput': round(len(latencies) / seconds, 1) if seconds else None,
+        'mean': round(sum(ordered) / len(ordered) * 1000, 3) if ordered else None,
+        **{key: round(percentile(ordered, int(key[1:]) / 100) * 1000, 3) if ordered else None
+           for key in LATENCY_KEYS},
+    }
+
+
+def combine(rounds):
+    """Median of each statistic over repeated runs (errors are summed)."""
+    combined = {key: statistics.median(summary[key] for summary in rounds)
+                if all(summary[key] is not None for summary in rounds) else None
+                for key in rounds[0] if key != 'errors'}
+    combined['errors'] = sum(summary['errors'] for summary in rounds)
+    return combined
+
+
+def tiny_png(number):
+    """A small PNG unique to ``number``, so uploads miss the extraction cache."""
+    from PIL import Image
+
+    image = Image.new('L', (64, 64), 255)
+    for bit in range(32):
+        if number >> bit & 1:
+            image.putpixel((bit * 2, 10), 0)
+    buffer = io.BytesIO()
+    image.save(buffer, 'PNG')
+    return buffer.getvalue()
+
+
+class Workload:
+    """Builds each scenario's requests as ``(method, path, body, content type)``.
+
+    Deletes take the newest orders, which saves in the same run added (as
+    long as there are at least as many saves as deletes), so repeated runs
+    on one database never delete the seeded orders details reads from.
+    """
+
+    def __init__(self, orders, products, customers, random_seed=7):
+        from app import simulate_invoice_extraction
+
+        self.invoice = simulate_invoice_extraction('invoice.png')
+        self.orders = orders  # (first, last) seeded SalesOrderID
+        self.products = products
+        self.customers = customers
+        self.rng = random.Random(random_seed)
+        self.uploads = 0
+        self.lock = threading.Lock()
+
+    def upload(self):
+        with self.lock:
+            self.uploads += 1
+            number = self.uploads
+        boundary = uuid.uuid4().hex
+        body = (f'--{boundary}\r\nContent-Disposition: form-data; name="invoice"; filename="invoice{number}.png"\r\n'
+                f'Content-Type: image/png\r\n\r\n').encode() + tiny_png(number + os.getpid() * 1000000) \
+            + f'\r\n--{boundary}--\r\n'.encode()
+        return 'POST', '/api/invoices/upload', body, f'multipart/form-data; boundary={boundary}'
+
+    def save(self):
+        invoice = copy.deepcopy(self.invoice)
+        with self.lock:
+            invoice['customerInfo']['customerId'] = self.rng.randint(*self.customers)
+            product_id = self.rng.randint(*self.products)
+        # One line matches the seeded catalog, the other is created on first use
+        invoice['lineItems'][0]['description'] = product_name(product_id)
+        return 'POST', '/api/invoices/save', json.dumps(invoice).encode(), 'application/json'
+
+    def history(self):
+        with self.lock:
+            page = 1 if self.rng.random() < 0.5 else self.rng.randint(2, 50)
+        return 'GET', f'/api/invoices/history?limit=20&page={page}', None, None
+
+    def details(self):
+        with self.lock:
+            order_id = self.rng.randint(*self.orders)
+        return 'GET', f'/api/invoices/{order_id}/details', None, None
+
+    def stats(self):
+        return 'GET', '/api/data/stats', None, None
+
+    def search(self):
+        with self.lock:
+            term = self.rng.choice(SEARCH_TERMS)
+        return 'GET', f'/api/data/products?limit=20&search={urllib.parse.quote(term)}', None, None
+
+    def delete(self, order_ids):
+        return 'DELETE', f'/api/invoices/{order_ids.pop()}', None, None
+
+
+def newest_orders(app, count):
+    """IDs of the newest ``count`` orders, oldest first (``pop()`` yields the newest)."""
+    from app import db, SalesOrderHeader
+
+    with app.app_context():
+        ids = db.session.scalars(
+            db.select(SalesOrderHeader.SalesOrderID).order_by(SalesOrderHeader.SalesOrderID.desc()).limit(count)
+        ).all()
+    return list(reversed(ids))
+
+
+def run_client(app, workload, scenario, requests):
+    client = app.test_client()
+    order_ids = newest_orders(app, requests) if scenario == 'delete' else None
+    latencies = []
+    errors = 0
+    started = time.perf_counter()
+    for _ in range(requests):
+        method, path, body, content_type = workload.delete(order_ids) if order_ids is not None \
+            else getattr(workload, scenario)()
+        request_started = time.perf_counter()
+        response = client.open(path, method=method, data=body, content_type=content_type)
+        response.get_data()
+        latencies.append(time.perf_counter() - request_started)
+        errors += response.status_code >= 400
+    return summarize(latencies, errors, time.perf_counter() - started)
+
+
+def run_http(app, workload, scenario, requests, concurrency, url):
+    target = urllib.parse.urlsplit(url)
+    order_ids = newest_orders(app, requests) if scenario == 'delete' else None
+    remaining = [requests]
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+
+    def worker():
+        connection = http.client.HTTPConnection(target.hostname, target.port, timeout=120)
+        while True:
+            with lock:
+                if not remaining[0]:
+                    break
+                remaining[0] -= 1
+                request = workload.delete(order_ids) if order_ids is not None else None
+            method, path, body, content_type = request or getattr(workload, scenario)()
+            headers = {'Content-Type': content_type} if content_type else {}
+            request_started = time.perf_counter()
+            try:
+                connection.request(method, path, body=body, headers=headers)
+                response = connection.getresponse()
+                response.read()
+                failed = response.status >= 400
+            except (OSError, http.client.HTTPException):
+                connection.close()  # reconnects on the next request
+                failed = True
+            elapsed = time.perf_counter() - request_started
+            with lock:
+                latencies.append(elapsed)
+                errors[0] += failed
+        connection.close()
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return summarize(latencies, errors[0], time.perf_counter() - started)
+
+
+def serve(port):
+    """Run the app on a threaded HTTP/1.1 server (keep-alive) until killed."""
+    from werkzeug.serving import WSGIRequestHandler, make_server
+    from app import create_app
+
+    WSGIRequestHandler.protocol_version = 'HTTP/1.1'
+    make_server('127.0.0.1', port, create_app(), threaded=True).serve_forever()
+
+
+def start_server(workdir):
+    import socket
+
+    with socket.socket() as probe:
+        probe.bind(('127.0.0.1', 0))
+        port = probe.getsockname()[1]
+    process = subprocess.Popen([sys.executable, os.path.abspath(__file__), '--serve', str(port)], cwd=workdir,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    url = f'http://127.0.0.1:{port}'
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        try:
+            connection = http.client.HTTPConnection('127.0.0.1', port, timeout=5)
+            connection.request('GET', '/')
+            connection.getresponse().read()
+            return process, url
+        except OSError:
+            if process.poll() is not None:
+                break
+            time.sleep(0.2)
+    process.kill()
+    raise RuntimeError('benchmark server did not start')
+
+
+def same_setup(baseline, current):
+    """Same request counts and data volumes within 1% (reused databases drift a little per run)."""
+    return all(
+        baseline.get(key) == current.get(key) if key in ('requests', 'rounds', 'concurrency')
+        else abs(current.get(key, 0) - baseline.get(key, 0)) <= 0.01 * max(baseline.get(key, 0), 1)
+        for key in set(baseline) | set(current)
+    )
+
+
+def compare(results, baseline, tolerance, min_delta_ms):
+    """Regressions of ``results`` against ``baseline`` as human-readable lines."""
+    regressions = []
+    for mode, scenarios in results['results'].items():
+        for scenario, current in scenarios.items():
+            previous = baseline['results'].get(mode, {}).get(scenario)
+            if not previous:
+                continue
+            for key in LATENCY_KEYS:
+                if current[key] is None or previous[key] is None:
+                    continue
+                if current[key] > previous[key] * (1 + tolerance) and current[key] - previous[key] > min_delta_ms:
+                    regressions.append(f'{mode} {scenario} {key}: {previous[key]:.2f} -> {current[key]:.2f} ms')
+            if previous['throughput'] and current['throughput'] is not None \
+                    and current['throughput'] < previous['throughput'] * (1 - tolerance):
+                regressions.append(f"{mode} {scenario} throughput: {previous['throughput']:.1f} -> "
+                                   f"{current['throughput']:.1f} req/s")
+            if current['errors'] > previous['errors']:
+                regressions.append(f"{mode} {scenario} errors: {previous['errors']} -> {current['errors']}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--products', type=int, default=1000)
+    parser.add_argument('--customers', type=int, default=1000)
+    parser.add_argument('--orders', type=int, default=10000)
+    parser.add_argument('--lines', type=int, default=3, help='average lines per seeded order')
+    parser.add_argument('--database', help='SQLite file to use; seeded only if it has no orders yet')
+    parser.add_argument('--requests', type=int, default=200, help='requests per scenario and mode')
+    parser.add_argument('--rounds', type=int, default=3, help='runs per scenario; each statistic is their median')
+    parser.add_argument('--concurrency', type=int, default=8, help='HTTP client threads')
+    parser.add_argument('--modes', default='client,http')
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS))
+    parser.add_argument('--url', help='benchmark a running server instead of starting one (same database)')
+    parser.add_argument('--output', default='benchmark_results.json')
+    parser.add_argument('--baseline', help='fail if results regress against this file '
+                        '(default: benchmarks/baseline.json unless saving one or --no-baseline)')
+    parser.add_argument('--save-baseline', metavar='PATH', help='write the results as the new baseline')
+    parser.add_argument('--no-baseline', action='store_true', help='only measure, compare against nothing')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='allowed relative change')
+    parser.add_argument('--min-delta-ms', type=float, default=1.0, help='latency changes always allowed')
+    parser.add_argument('--serve', type=int, metavar='PORT', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    sys.path.insert(0, BACKEND_DIR)
+    if args.serve:
+        serve(args.serve)
+        return
+
+    modes = args.modes.split(',')
+    scenarios = args.scenarios.split(',')
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+    if 'delete' in scenarios and 'save' not in scenarios and not args.database:
+        parser.error('delete needs save in the same run (it deletes the orders saves created)')
+    if args.baseline is None and not (args.save_baseline or args.no_baseline):
+        args.baseline = DEFAULT_BASELINE
+    # Checked before the run: a missing baseline fails rather than skipping the comparison
+    if args.baseline and not os.path.exists(args.baseline):
+        parser.error(f'no baseline at {args.baseline}; record one on this machine with '
+                     f'--save-baseline {args.baseline}, or pass --no-baseline to only measure')
+
+    workdir = tempfile.mkdtemp(prefix='bench_api_')
+    database = os.path.abspath(args.database or os.path.join(workdir, 'bench.db'))
+    os.environ['DATABASE_URL'] = f'sqlite:///{database}'
+    output, baseline_path, save_path = (os.path.abspath(path) if path else None
+                                        for path in (args.output, args.baseline, args.save_baseline))
+    # Uploads land in the scratch directory, for this process and the server
+    os.chdir(workdir)
+
+    from app import create_app, db, SalesOrderHeader, Product, Customer
+
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+        seeded = db.session.scalar(db.select(db.func.count()).select_from(SalesOrderHeader))
+    if not seeded:
+        started = time.perf_counter()
+        seed(args.products, args.customers, args.orders, args.lines, log=lambda line: None, app=app)
+        print(f"seeded {args.orders} orders, {args.products} products, {args.customers} customers "
+              f"in {time.perf_counter() - started:.1f}s")
+    with app.app_context():
+        ranges = {model.__tablename__: db.session.execute(db.select(db.func.min(column), db.func.max(column))).one()
+                  for model, column in [(SalesOrderHeader, SalesOrderHeader.SalesOrderID),
+                                        (Product, Product.ProductID), (Customer, Customer.CustomerID)]}
+        volumes = {name: db.session.scalar(db.select(db.func.count()).select_from(model))
+                   for name, model in [('orders', SalesOrderHeader), ('products', Product), ('customers', Customer)]}
+        for engine in db.engines.values():
+            engine.dispose()  # the server child must not share this process's connections
+    workload = Workload(tuple(ranges['sales_order_header']), tuple(ranges['products']), tuple(ranges['customers']))
+
+    results = {
+        'config': {'requests': args.requests, 'rounds': args.rounds, 'concurrency': args.concurrency, **volumes},
+        'environment': {'python': platform.python_version(), 'platform': platform.platform(),
+                        'cpus': os.cpu_count()},
+        'results': {},
+    }
+    server = None
+    try:
+        for mode in modes:
+            if mode == 'http' and not args.url and server is None:
+                server, url = start_server(workdir)
+            rounds = {scenario: [] for scenario in scenarios}
+            for _ in range(args.rounds):
+                for scenario in scenarios:
+                    if mode == 'client':
+                        rounds[scenario].append(run_client(app, workload, scenario, args.requests))
+                    else:
+                        rounds[scenario].append(
+                            run_http(app, workload, scenario, args.requests, args.concurrency, args.url or url))
+            mode_results = results['results'][mode] = {}
+            for scenario in scenarios:
+                summary = mode_results[scenario] = combine(rounds[scenario])
+                print(f"{mode:6} {scenario:8} p50 {summary['p50']:8.2f}  p95 {summary['p95']:8.2f}  "
+                      f"p99 {summary['p99']:8.2f} ms  {summary['throughput']:8.1f} req/s  "
+                      f"{summary['errors']} errors")
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+    with open(output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"results written to {output}")
+    if save_path:
+        with open(save_path, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"baseline written to {save_path}")
+    if baseline_path:
+        with open(baseline_path) as f:
+            baseline = json.load(f)
+        if not same_setup(baseline['config'], results['config']):
+            print(f"baseline was recorded with {baseline['config']}, not {results['config']}; not comparing")
+            sys.exit(2)
+        if baseline.get('environment') != results['environment']:
+            print(f"baseline was recorded on {baseline.get('environment')}, not {results['environment']}; "
+                  f"record one on this machine with --save-baseline")
+            sys.exit(2)
+        regressions = compare(results, baseline, args.tolerance, args.min_delta_ms)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        if regressions:
+            sys.exit(1)
+        print(f"no regressions against {baseline_path} (tolerance {args.tolerance:.0%})")
+
+
+if __name__ == '__main__':
+    main()
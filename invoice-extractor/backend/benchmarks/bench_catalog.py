@@ -0,0 +1,77 @@
+"""Benchmark line-item resolution against a large product catalog.
+
+Compares the per-line ``Product.query.filter_by(Name=...)`` lookup that
+save_invoice used to run with the in-memory CatalogIndex, on a throwaway
+SQLite database seeded with --products rows.
+
+    python benchmarks/bench_catalog.py --products 100000 --lines 50
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--products', type=int, default=100000)
+    parser.add_argument('--lines', type=int, default=50, help='line items per invoice')
+    parser.add_argument('--invoices', type=int, default=200, help='invoices to resolve per method')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='bench_catalog_')
+    os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+    sys.path.insert(0, BACKEND_DIR)
+    from app import create_app, db, Product, catalog_index, product_values
+    from query_counter import query_count
+
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+        started = time.perf_counter()
+        db.session.execute(db.insert(Product), [
+            product_values(product_id, f'Catalog Product {product_id}', 10.0)
+            for product_id in range(1, args.products + 1)
+        ])
+        db.session.commit()
+        print(f"seeded {args.products} products in {time.perf_counter() - started:.2f}s")
+
+        rng = random.Random(42)
+        invoices = [
+            [f'Catalog Product {rng.randint(1, args.products)}' for _ in range(args.lines)]
+            for _ in range(args.invoices)
+        ]
+
+        started = time.perf_counter()
+        queries_before = query_count()
+        for names in invoices:
+            for name in names:
+                Product.query.filter_by(Name=name).first()
+        per_query = (time.perf_counter() - started) / args.invoices
+        query_lookups = (query_count() - queries_before) / args.invoices
+
+        started = time.perf_counter()
+        catalog_index.sync()
+        cold_load = time.perf_counter() - started
+
+        started = time.perf_counter()
+        queries_before = query_count()
+        for names in invoices:
+            catalog_index.sync()
+            for name in names:
+                catalog_index.lookup(name)
+        per_index = (time.perf_counter() - started) / args.invoices
+        index_queries = (query_count() - queries_before) / args.invoices
+
+    print(f"per-line queries: {per_query * 1000:8.3f} ms/invoice, {query_lookups:.0f} queries/invoice")
+    print(f"catalog index:    {per_index * 1000:8.3f} ms/invoice, {index_queries:.0f} queries/invoice "
+          f"(generation check only; cold load {cold_load * 1000:.0f} ms)")
+    print(f"speedup:          {per_query / per_index:8.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,141 @@
+"""Measure how long a new worker takes from start to its first served request.
+
+* fresh process: a new interpreter imports the app, builds it with
+  create_app() and serves /api/data/stats through the test client, as
+  every worker does without preloading (with the Swagger docs on and off)
+* forked worker: the app is built once and forked children serve the first
+  request, as workers of gunicorn with preload_app do
+* gunicorn (--gunicorn): launching ``gunicorn -c gunicorn.conf.py
+  wsgi:app`` until the first HTTP response
+
+Each is run --runs times on a scratch database; medians are reported.
+
+    python benchmarks/bench_cold_start.py --runs 5 --gunicorn
+"""
+import argparse
+import http.client
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PATH = '/api/data/stats'
+
+
+def child():
+    """Import, build and serve one request; prints the phase timings as JSON."""
+    started = time.perf_counter()
+    sys.path.insert(0, BACKEND_DIR)
+    from app import create_app
+    imported = time.perf_counter()
+    app = create_app()
+    built = time.perf_counter()
+    response = app.test_client().get(PATH)
+    assert response.status_code == 200, response.status_code
+    print(json.dumps({'import': imported - started, 'create': built - imported,
+                      'request': time.perf_counter() - built}))
+
+
+def fresh_process(env, runs):
+    totals, phases = [], []
+    for _ in range(runs):
+        started = time.perf_counter()
+        output = subprocess.run([sys.executable, os.path.abspath(__file__), '--child'], env=env, cwd=env['WORKDIR'],
+                                capture_output=True, text=True, check=True).stdout
+        totals.append(time.perf_counter() - started)
+        phases.append(json.loads(output.strip().splitlines()[-1]))
+    return statistics.median(totals), {key: statistics.median(phase[key] for phase in phases) for key in phases[0]}
+
+
+def forked_worker(runs):
+    sys.path.insert(0, BACKEND_DIR)
+    from app import create_app, db
+
+    app = create_app()
+    times = []
+    for _ in range(runs):
+        read_end, write_end = os.pipe()
+        started = time.perf_counter()
+        pid = os.fork()
+        if pid == 0:
+            os.close(read_end)
+            with app.app_context():  # what gunicorn.conf.py's post_fork does
+                for engine in db.engines.values():
+                    engine.dispose(close=False)
+            status = app.test_client().get(PATH).status_code
+            os.write(write_end, json.dumps({'status': status, 'seconds': time.perf_counter() - started}).encode())
+            os._exit(0)
+        os.close(write_end)
+        with os.fdopen(read_end) as pipe:
+            result = json.loads(pipe.read())
+        os.waitpid(pid, 0)
+        assert result['status'] == 200, result
+        times.append(result['seconds'])
+    return statistics.median(times)
+
+
+def gunicorn(env, runs):
+    times = []
+    for _ in range(runs):
+        with socket.socket() as probe:
+            probe.bind(('127.0.0.1', 0))
+            port = probe.getsockname()[1]
+        started = time.perf_counter()
+        process = subprocess.Popen(
+            [sys.executable, '-m', 'gunicorn', '-c', os.path.join(BACKEND_DIR, 'gunicorn.conf.py'),
+             '--workers', '1', '--bind', f'127.0.0.1:{port}', 'wsgi:app'],
+            env=dict(env, PYTHONPATH=BACKEND_DIR), cwd=env['WORKDIR'],
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+        try:
+            while True:
+                try:
+                    connection = http.client.HTTPConnection('127.0.0.1', port, timeout=5)
+                    connection.request('GET', PATH)
+                    if connection.getresponse().status == 200:
+                        break
+                except OSError:
+                    if process.poll() is not None:
+                        raise RuntimeError('gunicorn exited; is it installed?')
+                    time.sleep(0.01)
+            times.append(time.perf_counter() - started)
+        finally:
+            process.terminate()
+            process.wait()
+    return statistics.median(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--gunicorn', action='store_true', help='also time a gunicorn start')
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        child()
+        return
+
+    workdir = tempfile.mkdtemp(prefix='bench_cold_start_')
+    env = dict(os.environ, DATABASE_URL=f"sqlite:///{os.path.join(workdir, 'bench.db')}", WORKDIR=workdir)
+    os.environ.update(env)
+    os.chdir(workdir)
+    subprocess.run([sys.executable, '-m', 'flask', '--app', os.path.join(BACKEND_DIR, 'app.py'), 'init-db'],
+                   env=env, check=True, capture_output=True)
+
+    for swagger in ('true', 'false'):
+        total, phases = fresh_process(dict(env, SWAGGER_ENABLED=swagger), args.runs)
+        print(f"fresh process (swagger {swagger:5}): {total * 1000:6.0f} ms to first request "
+              f"(import {phases['import'] * 1000:.0f} ms, create_app {phases['create'] * 1000:.0f} ms, "
+              f"first request {phases['request'] * 1000:.0f} ms, the rest is interpreter start)")
+    print(f"forked worker (preload_app):   {forked_worker(args.runs) * 1000:6.1f} ms to first request")
+    if args.gunicorn:
+        print(f"gunicorn start, 1 worker:      {gunicorn(env, args.runs) * 1000:6.0f} ms to first response")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,181 @@
+"""Drive LLMClient against a local stub of the chat completions API.
+
+The stub enforces a quota of --quota requests per second (a 429 with
+Retry-After beyond it), fails --error-rate of the remaining requests with a
+503 and answers the rest after --latency seconds with a canned invoice.
+--calls completions are made from --threads threads, once with the
+client's limits and once as a naive client (no rate limit, immediate
+retries), and each run reports completed calls, requests the server saw,
+throughput and latency percentiles.
+
+    python benchmarks/bench_llm_client.py --quota 50 --calls 500 --threads 32
+
+With --serve the stub just runs on --port, e.g. for the app with
+EXTRACTION_MODEL=openai LLM_BASE_URL=http://127.0.0.1:8099/v1.
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+INVOICE = {
+    'orderDate': '2014-05-01', 'dueDate': '2014-05-31', 'invoiceNumber': '12345',
+    'customerInfo': {'name': 'Stub Customer', 'address': '1 Stub Street', 'customerId': None},
+    'lineItems': [{'description': 'Product XYZ', 'quantity': 15, 'unitPrice': 150.0, 'lineTotal': 2250.0}],
+    'totals': {'subtotal': 2250.0, 'taxRate': 0.0, 'taxAmount': 0.0, 'freight': 0.0, 'total': 2250.0},
+    'confidence': 0.95,
+}
+
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, port, quota, error_rate, latency):
+        super().__init__(('127.0.0.1', port), StubHandler)
+        self.quota = quota
+        self.error_rate = error_rate
+        self.latency = latency
+        self.lock = threading.Lock()
+        self.window = int(time.time())
+        self.window_count = 0
+        self.counts = {200: 0, 429: 0, 503: 0}
+
+    def admit(self):
+        """Fixed one-second window quota, like most providers' per-second limits."""
+        with self.lock:
+            now = int(time.time())
+            if now != self.window:
+                self.window, self.window_count = now, 0
+            self.window_count += 1
+            if self.window_count > self.quota:
+                self.counts[429] += 1
+                return 429
+            if random.random() < self.error_rate:
+                self.counts[503] += 1
+                return 503
+            self.counts[200] += 1
+            return 200
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    def _reply(self, status, body, headers=()):
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        for name, value in headers:
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_POST(self):
+        request = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        status = self.server.admit()
+        if status == 429:
+            self._reply(429, {'error': {'message': 'Rate limit reached', 'type': 'requests'}},
+                        [('Retry-After', '1')])
+            return
+        time.sleep(self.server.latency)
+        if status == 503:
+            self._reply(503, {'error': {'message': 'Overloaded', 'type': 'server_error'}})
+            return
+        prompt_tokens = len(json.dumps(request['messages'])) // 4
+        self._reply(200, {
+            'id': 'chatcmpl-stub', 'object': 'chat.completion', 'created': int(time.time()),
+            'model': request['model'],
+            'choices': [{'index': 0, 'finish_reason': 'stop',
+                         'message': {'role': 'assistant', 'content': json.dumps(INVOICE)}}],
+            'usage': {'prompt_tokens': prompt_tokens, 'completion_tokens': 120,
+                      'total_tokens': prompt_tokens + 120},
+        })
+
+
+def run(client, server, calls, threads):
+    from llm_client import LLMError
+
+    messages = [{'role': 'user', 'content': 'Extract this invoice.'}]
+    latencies = []
+    failures = 0
+    server.counts = {200: 0, 429: 0, 503: 0}
+
+    def call(_):
+        try:
+            return client.complete(messages, max_tokens=200)
+        except LLMError:
+            return None
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        for reply in executor.map(call, range(calls)):
+            if reply is None:
+                failures += 1
+            else:
+                latencies.append(reply['latency'])
+    elapsed = time.perf_counter() - started
+    completed = calls - failures
+    quantiles = statistics.quantiles(latencies, n=100) if len(latencies) > 1 else [0.0] * 99
+    return {
+        'completed': completed,
+        'failed': failures,
+        'requestsSent': sum(server.counts.values()),
+        'rateLimited': server.counts[429],
+        'serverErrors': server.counts[503],
+        'seconds': round(elapsed, 2),
+        'callsPerSecond': round(completed / elapsed, 1),
+        'latencyP50': round(quantiles[49], 4),
+        'latencyP95': round(quantiles[94], 4),
+        'tokens': client.stats()['promptTokens'] + client.stats()['completionTokens'],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--port', type=int, default=8099)
+    parser.add_argument('--quota', type=int, default=50, help='requests per second the stub accepts')
+    parser.add_argument('--error-rate', type=float, default=0.02, help='share of admitted requests failing with 503')
+    parser.add_argument('--latency', type=float, default=0.2, help='seconds per completion')
+    parser.add_argument('--calls', type=int, default=500)
+    parser.add_argument('--threads', type=int, default=32)
+    parser.add_argument('--serve', action='store_true', help='only run the stub server')
+    args = parser.parse_args()
+
+    server = StubServer(args.port, args.quota, args.error_rate, args.latency)
+    if args.serve:
+        print(f'stub listening on http://127.0.0.1:{args.port}/v1 (quota {args.quota}/s)')
+        server.serve_forever()
+        return
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    sys.path.insert(0, BACKEND_DIR)
+    from llm_client import LLMClient
+
+    base_url = f'http://127.0.0.1:{args.port}/v1'
+    configs = {
+        # Slightly under the quota, as the limits would be set in production
+        'limited': dict(max_concurrency=args.threads, requests_per_minute=int(args.quota * 60 * 0.95),
+                        max_retries=8),
+        'naive': dict(max_concurrency=args.threads, requests_per_minute=None, max_retries=8,
+                      backoff_base=0.0, backoff_max=0.0),
+    }
+    for name, options in configs.items():
+        client = LLMClient(api_key='stub', model='stub-model', base_url=base_url, **options)
+        time.sleep(1.0)  # start each run on a fresh quota window
+        print(name, json.dumps(run(client, server, args.calls, args.threads)))
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,108 @@
+"""Benchmark page-parallel extraction of long PDF invoices.
+
+Builds a --pages page PDF invoice (header on every page, --lines line items
+per page, totals on the last page) and runs it through the model stage with
+a stand-in model that parses the text and takes --page-latency seconds per
+page, like a model behind an API. Compares extracting the document whole
+with splitting it across --workers threads, and checks the merged result
+has every line item and consistent totals.
+
+    python benchmarks/bench_pages.py --pages 40 --workers 8
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def page_stream(lines):
+    text = ' '.join('(%s) Tj T*' % line.replace('(', r'\(').replace(')', r'\)') for line in lines)
+    return f'BT /F1 10 Tf 12 TL 40 760 Td {text} ET'
+
+
+def make_pdf(path, pages, lines_per_page):
+    """A text PDF with one content stream per page; returns the expected grand total."""
+    streams = []
+    subtotal = 0.0
+    item = 0
+    for number in range(1, pages + 1):
+        lines = ['ACME Supplies', 'Invoice No: INV-2024-0042', 'Invoice Date: 2024-03-05',
+                 'Due Date: 2024-04-04', f'Page {number} of {pages}', '']
+        for _ in range(lines_per_page):
+            item += 1
+            quantity = item % 7 + 1
+            price = 10 + item % 13 * 2.5
+            lines.append(f'Widget {item} {quantity} {price:.2f} {quantity * price:.2f}')
+            subtotal += quantity * price
+        if number == pages:
+            tax = round(subtotal * 0.08, 2)
+            lines += ['', f'Subtotal {subtotal:.2f}', f'Tax {tax:.2f}', f'Total {subtotal + tax:.2f}']
+        streams.append(page_stream(lines))
+
+    objects = ['<< /Type /Catalog /Pages 2 0 R >>',
+               '<< /Type /Pages /Kids [%s] /Count %d >>' % (
+                   ' '.join(f'{4 + 2 * index} 0 R' for index in range(pages)), pages),
+               '<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>']
+    for index, stream in enumerate(streams):
+        objects.append(f'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Contents {5 + 2 * index} 0 R '
+                       f'/Resources << /Font << /F1 3 0 R >> >> >>')
+        objects.append(f'<< /Length {len(stream)} >>\nstream\n{stream}\nendstream')
+    out = b'%PDF-1.4\n'
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b'%d 0 obj\n%s\nendobj\n' % (number, body.encode('latin-1'))
+    xref = len(out)
+    out += b'xref\n0 %d\n0000000000 65535 f \n' % (len(objects) + 1)
+    out += b''.join(b'%010d 00000 n \n' % offset for offset in offsets)
+    out += b'trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n' % (len(objects) + 1, xref)
+    with open(path, 'wb') as f:
+        f.write(out)
+    return round(subtotal + round(subtotal * 0.08, 2), 2), item
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--pages', type=int, default=40)
+    parser.add_argument('--lines', type=int, default=25, help='line items per page')
+    parser.add_argument('--page-latency', type=float, default=0.25, help='stand-in model seconds per page')
+    parser.add_argument('--workers', type=int, default=8)
+    args = parser.parse_args()
+
+    sys.path.insert(0, BACKEND_DIR)
+    from pypdf import PdfReader
+    from extraction import ExtractionPipeline, SniffStage, ModelStage, parse_invoice_text
+
+    workdir = tempfile.mkdtemp(prefix='bench_pages_')
+
+    def model(filename):
+        reader = PdfReader(os.path.join(workdir, filename))
+        time.sleep(args.page_latency * len(reader.pages))
+        data, confidence = parse_invoice_text('\n'.join(page.extract_text() for page in reader.pages))
+        return dict(data, confidence=confidence)
+
+    model.per_page = True  # reads only the pages it is given
+
+    try:
+        expected_total, expected_items = make_pdf(os.path.join(workdir, 'long.pdf'), args.pages, args.lines)
+        for label, workers in (('whole', 0), (f'{args.workers} page workers', args.workers)):
+            pipeline = ExtractionPipeline([SniffStage(), ModelStage(model, page_workers=workers)], workdir)
+            started = time.perf_counter()
+            result = pipeline.run('long.pdf')
+            elapsed = time.perf_counter() - started
+            pages = result['pipeline'].get('pages') or []
+            slowest = max((page['seconds'] for page in pages), default=elapsed)
+            print(f"{label}: {elapsed:.2f}s (slowest page {slowest:.2f}s), "
+                  f"{len(result['lineItems'])}/{expected_items} line items, "
+                  f"total {result['totals']['total']} (expected {expected_total}), "
+                  f"leftover page files {sum(len(files) for _, _, files in os.walk(workdir)) - 1}")
+    finally:
+        shutil.rmtree(workdir)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+"""Benchmark image preprocessing on synthetic phone photos of invoices.
+
+Generates --images 4000x3000 JPEGs (an invoice-like page of text on an
+uneven, noisy background, tagged with EXIF orientation 6 like a phone held
+upright) and preprocesses them with ``preprocess_image``: first with a full
+decode for comparison, then with draft decoding, serially and in a
+--workers thread pool. Reports bytes before/after and the time per image.
+
+    python benchmarks/bench_preprocess.py --images 16 --workers 4
+"""
+import argparse
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def make_photo(path, seed):
+    from PIL import Image, ImageDraw, ImageFilter, ImageFont
+
+    rng = random.Random(seed)
+    width, height = 4000, 3000
+    image = Image.linear_gradient('L').resize((width, height)).convert('RGB')
+    image = Image.blend(image, Image.new('RGB', (width, height), (235, 225, 205)), 0.7)
+    draw = ImageDraw.Draw(image)
+    font = ImageFont.load_default()
+    draw.rectangle([400, 200, 3600, 2800], fill=(250, 250, 245))
+    for row in range(60):
+        y = 260 + row * 42
+        text = f'Item {rng.randint(1000, 9999)}  Product {rng.choice("ABCDEFGH")}{row}  {rng.randint(1, 40)}  ' \
+               f'{rng.uniform(1, 500):8.2f}  {rng.uniform(1, 5000):10.2f}'
+        draw.text((480, y), text, fill=(30, 30, 30), font=font)
+    noise = Image.effect_noise((width, height), 24).convert('RGB')
+    image = Image.blend(image, noise, 0.08).filter(ImageFilter.GaussianBlur(0.8))
+    exif = Image.Exif()
+    exif[0x0112] = 6  # rotated 90° clockwise
+    image.save(path, 'JPEG', quality=92, exif=exif)
+
+
+def full_decode(source, target, max_side=1600, dpi=150, quality=80):
+    """preprocess_image without draft mode, for comparison."""
+    from PIL import Image, ImageOps
+
+    with Image.open(source) as image:
+        image = ImageOps.exif_transpose(image).convert('L')
+        image.thumbnail((max_side, max_side), Image.LANCZOS)
+        image.save(target, 'JPEG', quality=quality, optimize=True, dpi=(dpi, dpi))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--images', type=int, default=16)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    sys.path.insert(0, BACKEND_DIR)
+    from images import preprocess_image
+
+    workdir = tempfile.mkdtemp(prefix='bench_preprocess_')
+    try:
+        sources = []
+        for number in range(args.images):
+            path = os.path.join(workdir, f'photo{number}.jpg')
+            make_photo(path, number)
+            sources.append(path)
+
+        def target(source):
+            return source.replace('.jpg', '.small.jpg')
+
+        started = time.perf_counter()
+        for source in sources:
+            full_decode(source, target(source))
+        full_seconds = time.perf_counter() - started
+
+        started = time.perf_counter()
+        reports = [preprocess_image(source, target(source)) for source in sources]
+        serial_seconds = time.perf_counter() - started
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.workers) as executor:
+            list(executor.map(lambda source: preprocess_image(source, target(source)), sources))
+        pool_seconds = time.perf_counter() - started
+
+        original = sum(report['originalBytes'] for report in reports)
+        shrunk = sum(report['bytes'] for report in reports)
+        print(f"{args.images} photos, {original / args.images / 1024:.0f} KiB -> "
+              f"{shrunk / args.images / 1024:.0f} KiB each ({original / shrunk:.1f}x smaller), "
+              f"{reports[0]['originalSize']} -> {reports[0]['size']}")
+        print(f"full decode: {full_seconds / args.images * 1000:.0f} ms/image")
+        print(f"draft:       {serial_seconds / args.images * 1000:.0f} ms/image")
+        print(f"draft, {args.workers} workers: {pool_seconds / args.images * 1000:.0f} ms/image")
+    finally:
+        shutil.rmtree(workdir)
+
+
+if __name__ == '__main__':
+    main()
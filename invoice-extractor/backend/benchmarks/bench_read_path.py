@@ -0,0 +1,188 @@
+"""Benchmark the lean read path of the list endpoints against the ORM path it replaced.
+
+History, products and customers used to load rows through the ORM (full
+Product and Customer objects with every column and identity-map bookkeeping),
+copy them field by field into dicts and serialize them with the stdlib
+encoder. Each endpoint is timed three ways on --limit row pages of a seeded
+scratch database (or --database):
+
+* orm + stdlib: the previous queries, rebuilt here, with Flask's stdlib provider
+* core + stdlib: the current view, FastJSONProvider without orjson
+* core + orjson: the current view as served
+
+The three take turns call by call, so drift on a busy host hits them alike.
+Rows per second are the median of --repeat calls; peak memory per row is
+traced over one more call. All three must return the same JSON.
+
+    python benchmarks/bench_read_path.py --orders 200000 --limit 1000
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from synthetic_data import seed
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def orm_views(limit):
+    """The ORM versions of the history, products and customers views (first page, no search)."""
+    from flask import jsonify
+    from app import db, read_session, SalesOrderHeader, SalesOrderDetail, Customer, Product
+    from pagination import encode_cursor, fetch_page
+
+    def history():
+        item_count = db.select(db.func.count(SalesOrderDetail.SalesOrderDetailID)).where(
+            SalesOrderDetail.SalesOrderID == SalesOrderHeader.SalesOrderID
+        ).correlate(SalesOrderHeader).scalar_subquery()
+        query = read_session.query(
+            SalesOrderHeader.SalesOrderID, SalesOrderHeader.OrderDate, SalesOrderHeader.SalesOrderNumber,
+            SalesOrderHeader.CustomerID, Customer.AccountNumber, SalesOrderHeader.SubTotal, SalesOrderHeader.TaxAmt,
+            SalesOrderHeader.Freight, SalesOrderHeader.TotalDue, item_count.label('ItemCount'), SalesOrderHeader.CreatedAt
+        ).outerjoin(Customer, SalesOrderHeader.CustomerID == Customer.CustomerID).order_by(
+            SalesOrderHeader.CreatedAt.desc(), SalesOrderHeader.SalesOrderID.desc()
+        )
+        orders, has_more = fetch_page(query, limit)
+        result = []
+        for order in orders:
+            result.append({
+                'SalesOrderID': order.SalesOrderID,
+                'OrderDate': order.OrderDate.isoformat() if order.OrderDate else None,
+                'SalesOrderNumber': order.SalesOrderNumber,
+                'CustomerID': order.CustomerID,
+                'CustomerName': f'Customer {order.CustomerID}' if order.CustomerID else None,
+                'AccountNumber': order.AccountNumber,
+                'SubTotal': order.SubTotal,
+                'TaxAmt': order.TaxAmt,
+                'Freight': order.Freight,
+                'TotalDue': order.TotalDue,
+                'ItemCount': order.ItemCount,
+                'CreatedAt': order.CreatedAt.isoformat() if order.CreatedAt else None
+            })
+        next_cursor = encode_cursor(orders[-1].CreatedAt, orders[-1].SalesOrderID) if has_more else None
+        return jsonify({'success': True, 'data': {'orders': result, 'pagination': {
+            'page': 1, 'limit': limit, 'hasMore': has_more, 'nextCursor': next_cursor}}})
+
+    def products():
+        rows, has_more = fetch_page(read_session.query(Product).order_by(Product.ProductID), limit)
+        result = []
+        for product in rows:
+            result.append({
+                'ProductID': product.ProductID,
+                'Name': product.Name,
+                'ProductNumber': product.ProductNumber,
+                'ListPrice': product.ListPrice,
+                'Color': product.Color,
+                'CategoryName': 'General',
+                'SubcategoryName': 'General'
+            })
+        next_cursor = encode_cursor(rows[-1].ProductID) if has_more else None
+        return jsonify({'success': True, 'data': {'products': result, 'pagination': {
+            'page': 1, 'limit': limit, 'search': '', 'hasMore': has_more, 'nextCursor': next_cursor}}})
+
+    def customers():
+        rows, has_more = fetch_page(read_session.query(Customer).order_by(Customer.CustomerID), limit)
+        result = []
+        for customer in rows:
+            result.append({
+                'CustomerID': customer.CustomerID,
+                'CustomerName': f'Customer {customer.CustomerID}',
+                'AccountNumber': customer.AccountNumber,
+                'City': 'Sample City',
+                'State': 'Sample State'
+            })
+        next_cursor = encode_cursor(rows[-1].CustomerID) if has_more else None
+        return jsonify({'success': True, 'data': {'customers': result, 'pagination': {
+            'page': 1, 'limit': limit, 'search': '', 'hasMore': has_more, 'nextCursor': next_cursor}}})
+
+    return {'history': history, 'products': products, 'customers': customers}
+
+
+def call(app, path, view):
+    """(seconds, response body) for one call of ``view`` serving ``path``."""
+    with app.test_request_context(path):
+        started = time.perf_counter()
+        body = view().get_data()
+        return time.perf_counter() - started, body
+
+
+def peak_memory(app, path, view):
+    with app.test_request_context(path):
+        tracemalloc.start()
+        view()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--products', type=int, default=20000)
+    parser.add_argument('--customers', type=int, default=20000)
+    parser.add_argument('--orders', type=int, default=50000)
+    parser.add_argument('--database', help='SQLite file to use; seeded only if it has no orders yet')
+    parser.add_argument('--limit', type=int, default=1000, help='rows per page')
+    parser.add_argument('--repeat', type=int, default=20, help='calls per endpoint and path')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='bench_read_path_')
+    database = os.path.abspath(args.database or os.path.join(workdir, 'bench.db'))
+    os.environ['DATABASE_URL'] = f'sqlite:///{database}'
+    os.chdir(workdir)
+    sys.path.insert(0, BACKEND_DIR)
+    from flask import json
+    from flask.json.provider import DefaultJSONProvider
+    from app import create_app, db, SalesOrderHeader
+    from json_provider import FastJSONProvider, orjson
+
+    app = create_app({'RESPONSE_CACHE_SIZE': 0})  # time the views, not cache hits
+    with app.app_context():
+        db.create_all()
+        seeded = db.session.scalar(db.select(db.func.count()).select_from(SalesOrderHeader))
+    if not seeded:
+        started = time.perf_counter()
+        seed(args.products, args.customers, args.orders, 3, log=lambda line: None, app=app)
+        print(f"seeded {args.orders} orders, {args.products} products, {args.customers} customers "
+              f"in {time.perf_counter() - started:.1f}s")
+    if orjson is None:
+        print('orjson is not installed: FastJSONProvider falls back to the stdlib encoder')
+
+    endpoints = {
+        'history': ('/api/invoices/history', 'api.get_invoice_history'),
+        'products': ('/api/data/products', 'api.get_products'),
+        'customers': ('/api/data/customers', 'api.get_customers'),
+    }
+    stdlib, fallback, fast = DefaultJSONProvider(app), FastJSONProvider(app), FastJSONProvider(app)
+    fallback.fast = False
+    print(f"{'endpoint':10} {'path':14} {'rows/s':>10} {'ms/page':>8} {'peak B/row':>10} {'speedup':>8}")
+    for name, view in orm_views(args.limit).items():
+        path, endpoint = endpoints[name]
+        path = f'{path}?limit={args.limit}'
+        current = app.view_functions[endpoint]
+        variants = [('orm + stdlib', view, stdlib), ('core + stdlib', current, fallback),
+                    ('core + orjson', current, fast)]
+        times, bodies = {label: [] for label, _, _ in variants}, {}
+        for attempt in range(args.repeat + 1):
+            for label, function, provider in variants:
+                app.json = provider
+                seconds, body = call(app, path, function)
+                if attempt:  # the first round warms caches
+                    times[label].append(seconds)
+                bodies[label] = json.loads(body)
+        assert all(body == bodies['orm + stdlib'] for body in bodies.values()), f'{name}: responses differ'
+
+        before = statistics.median(times['orm + stdlib'])
+        for label, function, provider in variants:
+            app.json = provider
+            seconds = statistics.median(times[label])
+            peak = peak_memory(app, path, function)
+            print(f"{name:10} {label:14} {args.limit / seconds:10.0f} {seconds * 1000:8.1f} "
+                  f"{peak / args.limit:10.0f} {before / seconds:7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
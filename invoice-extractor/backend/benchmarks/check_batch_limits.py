@@ -0,0 +1,147 @@
+"""Check the size and file count limits of single and batch uploads.
+
+With MAX_CONTENT_LENGTH at 1 MB, BATCH_MAX_CONTENT_LENGTH at 4 MB and
+BATCH_MAX_FILES at 5, checks that:
+
+* a ZIP over the per-file limit is accepted in a batch, up to the batch limit
+* a file or ZIP member over the per-file limit fails on its own line of the
+  batch result while the other files are extracted
+* a batch body over the batch limit and a single upload over the per-file
+  limit get 413
+* a ZIP of many files is read no further than BATCH_MAX_FILES members, and
+  only the members that pass are stored as blobs
+* rejected uploads (wrong type, over the file limit, the ZIP archive itself)
+  leave no blob behind, unless the blob was already there from an earlier
+  upload
+
+Prints each check and exits non-zero if any failed.
+
+    python benchmarks/check_batch_limits.py
+"""
+import argparse
+import hashlib
+import io
+import json
+import os
+import sys
+import tempfile
+import zipfile
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MB = 1024 * 1024
+
+
+def noise_png(size):
+    """A PNG of random pixels, which barely compresses, of about ``size`` bytes."""
+    from PIL import Image
+
+    side = int((size / 3) ** 0.5)
+    buffer = io.BytesIO()
+    Image.frombytes('RGB', (side, side), os.urandom(side * side * 3)).save(buffer, 'PNG')
+    return buffer.getvalue()
+
+
+def make_zip(members):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_STORED) as archive:
+        for name, data in members.items():
+            archive.writestr(name, data)
+    return buffer.getvalue()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='check_batch_limits_')
+    os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(workdir, 'check.db')}"
+    os.chdir(workdir)
+    sys.path.insert(0, BACKEND_DIR)
+    from app import create_app, init_db, batch_processor
+
+    app = create_app({'MAX_CONTENT_LENGTH': MB, 'BATCH_MAX_CONTENT_LENGTH': 4 * MB, 'BATCH_MAX_FILES': 5,
+                      'BATCH_WORKERS': 1})
+    with app.app_context():
+        init_db()
+    client = app.test_client()
+    failures = []
+
+    def check(name, passed, detail=''):
+        print(f"{'ok  ' if passed else 'FAIL'} {name}{f' ({detail})' if detail else ''}")
+        if not passed:
+            failures.append(name)
+
+    def batch(files):
+        response = client.post('/api/invoices/upload/batch', content_type='multipart/form-data', data={
+            'invoices': [(io.BytesIO(data), name) for name, data in files.items()]
+        })
+        if response.status_code != 200:
+            return response.status_code, {}
+        lines = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+        return 200, {line['index']: line for line in lines if 'index' in line}
+
+    small = [noise_png(MB * 3 // 4) for _ in range(4)]
+    big = noise_png(3 * MB // 2)
+
+    archive = make_zip({f'invoice-{number}.png': data for number, data in enumerate(small[:3])})
+    status, results = batch({'invoices.zip': archive})
+    check(f'a {len(archive) / MB:.1f} MB ZIP is accepted', status == 200 and len(results) == 3
+          and all(result['success'] for result in results.values()), f'status {status}')
+
+    status, results = batch({'small-0.png': small[0], 'big.png': big, 'small-1.png': small[1]})
+    check('an oversized file fails alone', status == 200 and [results[index]['success'] for index in range(3)]
+          == [True, False, True] and results[1]['message'] == 'File too large', f'status {status}')
+
+    status, results = batch({'invoices.zip': make_zip({'small.png': small[0], 'big.png': big})})
+    check('an oversized ZIP member fails alone', status == 200 and [results[index]['success'] for index in range(2)]
+          == [True, False], f'status {status}')
+
+    status, _ = batch({f'small-{number}.png': data for number, data in enumerate(small + [big])})
+    check('a batch over BATCH_MAX_CONTENT_LENGTH gets 413', status == 413, f'status {status}')
+
+    response = client.post('/api/invoices/upload', content_type='multipart/form-data',
+                           data={'invoice': (io.BytesIO(big), 'big.png')})
+    check('a single upload over MAX_CONTENT_LENGTH gets 413', response.status_code == 413,
+          f'status {response.status_code}')
+
+    def blobs():
+        return {name for _, _, names in os.walk(os.path.join(app.config['UPLOAD_FOLDER'], 'blobs')) for name in names}
+
+    before = blobs()
+    members = {'notes.txt': b'not an invoice'}
+    members.update((f'tiny-{number}.png', noise_png(300 + number * 3)) for number in range(50))
+    archive = make_zip(members)
+    status, results = batch({'many.zip': archive})
+    stored = blobs() - before
+    succeeded = sum(result['success'] for result in results.values())
+    check('a ZIP of 51 files is read no further than BATCH_MAX_FILES', status == 200 and len(results) == 6
+          and succeeded == 4 and 'skipped' in results[5]['message'], f'{len(results)} entries, {succeeded} extracted')
+    check('only members that pass are stored', len(stored) == succeeded
+          and hashlib.sha256(archive).hexdigest() not in stored, f'{len(stored)} new blobs')
+
+    before = blobs()
+    response = client.post('/api/invoices/upload', content_type='multipart/form-data',
+                           data={'invoice': (io.BytesIO(b'not an invoice'), 'notes.txt')})
+    check('a single upload of the wrong type is not stored', response.status_code == 400 and blobs() == before,
+          f'status {response.status_code}')
+
+    kept = noise_png(5000)
+    client.post('/api/invoices/upload', content_type='multipart/form-data',
+                data={'invoice': (io.BytesIO(kept), 'kept.png')})
+    before = blobs()
+    overflow = {f'extra-{number}.png': noise_png(400 + number * 3) for number in range(5)}
+    overflow.update({'notes.txt': b'not an invoice', 'kept.png': kept})
+    status, results = batch(overflow)
+    failed = sorted(index for index, result in results.items() if not result['success'])
+    stored = blobs() - before
+    check('files rejected from a batch are not stored, an earlier blob is kept', status == 200
+          and failed == [5, 6] and len(stored) == 5 and hashlib.sha256(kept).hexdigest() in blobs(),
+          f'failed {failed}, {len(stored)} new blobs')
+
+    batch_processor.shutdown()
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
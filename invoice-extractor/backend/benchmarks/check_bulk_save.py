@@ -0,0 +1,69 @@
+"""Check that a bulk save rejects only the invoices that are wrong.
+
+Saves --invoices invoices through ``/api/invoices/save/batch`` in chunks of
+--chunk-size on a throwaway database. One invoice lacks ``totals.total`` and
+one has a line quantity SQLite cannot store, which fails its whole chunk at
+insert time. Checks that exactly those two fail, the first with a message
+naming the missing field, and that every other invoice is saved once with
+its own order number. Prints each check and exits non-zero if any failed.
+
+    python benchmarks/check_bulk_save.py
+"""
+import argparse
+import copy
+import os
+import sys
+import tempfile
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--invoices', type=int, default=10)
+    parser.add_argument('--chunk-size', type=int, default=5)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='check_bulk_save_')
+    os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(workdir, 'check.db')}"
+    os.chdir(workdir)
+    sys.path.insert(0, BACKEND_DIR)
+    from app import create_app, db, init_db, simulate_invoice_extraction, SalesOrderHeader
+
+    app = create_app()
+    with app.app_context():
+        init_db()
+    failures = []
+
+    def check(name, passed, detail=''):
+        print(f"{'ok  ' if passed else 'FAIL'} {name}{f' ({detail})' if detail else ''}")
+        if not passed:
+            failures.append(name)
+
+    template = simulate_invoice_extraction('invoice.png')
+    invoices = [copy.deepcopy(template) for _ in range(args.invoices)]
+    missing_field, unstorable = 1, args.invoices // 2
+    del invoices[missing_field]['totals']['total']
+    invoices[unstorable]['lineItems'][0]['quantity'] = {'boxes': 3}
+
+    response = app.test_client().post('/api/invoices/save/batch',
+                                      json={'invoices': invoices, 'chunkSize': args.chunk_size})
+    results = response.get_json()['data']['results']
+    failed = [result['index'] for result in results if not result['success']]
+    check('only the two bad invoices fail', response.status_code == 200 and failed == [missing_field, unstorable],
+          f'failed {failed}')
+    check('the missing field is named', results[missing_field]['message'] == 'Missing required field: totals.total',
+          results[missing_field]['message'])
+
+    with app.app_context():
+        numbers = list(db.session.scalars(db.select(SalesOrderHeader.SalesOrderNumber)))
+    saved = [result['salesOrderNumber'] for result in results if result['success']]
+    check(f'{args.invoices - 2} invoices saved once each, with their own order numbers',
+          sorted(numbers) == sorted(saved) and len(set(saved)) == args.invoices - 2, f'{len(numbers)} orders')
+
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
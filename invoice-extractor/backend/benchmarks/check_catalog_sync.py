@@ -0,0 +1,118 @@
+"""Check that workers pick up each other's new products without reloading the catalog.
+
+On a seeded throwaway database, two other worker processes save invoices
+with new products while this one keeps its catalog index, and checks that:
+
+* a sync after their saves loads only the new products
+* a product with a lower ID, from a block a worker reserved before the other
+  worker's save but committed after it, is still found
+* after a bulk load (``invalidate()``) the next sync reloads the whole catalog
+
+Prints each check and exits non-zero if any failed.
+
+    python benchmarks/check_catalog_sync.py
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+
+from synthetic_data import seed
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def other_worker():
+    """Save one invoice per product name read from stdin, with its own app, like another server worker."""
+    sys.path.insert(0, BACKEND_DIR)
+    from app import create_app, simulate_invoice_extraction
+
+    client = create_app().test_client()
+    for line in sys.stdin:
+        name = line.strip()
+        invoice = simulate_invoice_extraction('other.png')
+        invoice['lineItems'] = [dict(invoice['lineItems'][0], productId=f'TEMP_{name}', description=name)]
+        response = client.post('/api/invoices/save', json=invoice)
+        print(response.status_code, flush=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--products', type=int, default=2000)
+    parser.add_argument('--other-worker', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.other_worker:
+        other_worker()
+        return
+
+    workdir = tempfile.mkdtemp(prefix='check_catalog_sync_')
+    os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(workdir, 'check.db')}"
+    os.chdir(workdir)
+    sys.path.insert(0, BACKEND_DIR)
+    from sqlalchemy import event
+    from sqlalchemy.engine import Engine
+    from app import create_app, db, catalog_index, Product
+
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+    seed(args.products, 10, 10, 1, log=lambda line: None, app=app)
+    failures = []
+
+    def check(name, passed, detail=''):
+        print(f"{'ok  ' if passed else 'FAIL'} {name}{f' ({detail})' if detail else ''}")
+        if not passed:
+            failures.append(name)
+
+    workers = [subprocess.Popen([sys.executable, os.path.abspath(__file__), '--other-worker'], text=True,
+                                stdin=subprocess.PIPE, stdout=subprocess.PIPE) for _ in range(2)]
+
+    def save(worker, name):
+        worker.stdin.write(name + '\n')
+        worker.stdin.flush()
+        return worker.stdout.readline().strip() == '201'
+
+    statements = []
+    event.listen(Engine, 'before_cursor_execute', lambda *args: statements.append(args[2]))
+
+    def sync():
+        statements.clear()
+        with app.app_context():
+            catalog_index.sync()
+            executed = list(statements)
+            ids = dict(db.session.execute(db.select(Product.Name, Product.ProductID)).all())
+        return executed, ids
+
+    def found(ids, *names):
+        return all(name in ids and catalog_index.lookup(name) == ids[name] for name in names)
+
+    sync()
+    saved = save(workers[0], 'Alpha One') and save(workers[1], 'Beta One')
+    executed, ids = sync()
+    check('a sync after other workers\' saves loads only their products', saved and len(executed) == 2
+          and 'catalog_changes' in executed[1] and found(ids, 'Alpha One', 'Beta One'),
+          f'{len(executed)} statements')
+
+    saved = save(workers[0], 'Alpha Two')
+    executed, ids = sync()
+    check('a product committed after a higher ID is still found', saved and found(ids, 'Alpha Two')
+          and ids['Alpha Two'] < ids['Beta One'], f"ID {ids.get('Alpha Two')} after {ids['Beta One']}")
+
+    for worker in workers:
+        worker.stdin.close()
+        worker.wait()
+
+    with app.app_context(), db.engine.begin() as conn:
+        catalog_index.invalidate(conn)
+    executed, ids = sync()
+    check('a sync after invalidate() reloads the whole catalog', len(executed) == 2
+          and 'catalog_changes' not in executed[1] and found(ids, 'Alpha One', 'Alpha Two', 'Beta One'),
+          f'{len(executed)} statements')
+
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
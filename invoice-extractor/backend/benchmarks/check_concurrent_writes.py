@@ -0,0 +1,120 @@
+"""Check that concurrent writers do not hit "database is locked".
+
+Starts --writers processes (separate engines and pools, like preforked
+server workers) that each save --invoices invoices through
+``/api/invoices/save`` from --threads threads (like gunicorn's threaded
+workers) while --readers threads in this process page through history and
+search products, all against one throwaway SQLite database using the app's
+storage profile. Every invoice creates a customer and two products, and
+ID_BLOCK_SIZE is --block-size, so saves keep running past the end of their
+worker's ID blocks. Exits non-zero if any request failed.
+
+    python benchmarks/check_concurrent_writes.py --writers 16 --invoices 50
+    python benchmarks/check_concurrent_writes.py --writers 4 --threads 4 --block-size 2
+"""
+import argparse
+import copy
+import multiprocessing
+import os
+import sys
+import tempfile
+import threading
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def write_invoices(writer, count, threads):
+    """Save ``count`` invoices from each of ``threads`` threads, each creating a customer and two products.
+
+    Returns error messages.
+    """
+    sys.path.insert(0, BACKEND_DIR)
+    from app import create_app, simulate_invoice_extraction
+
+    app = create_app()
+    template = simulate_invoice_extraction('invoice.png')
+    errors = []
+
+    def save_all(thread):
+        client = app.test_client()
+        for number in range(count):
+            invoice = copy.deepcopy(template)
+            invoice['customerInfo']['customerId'] = None
+            for line, item in enumerate(invoice['lineItems'][:2]):
+                item['productId'] = f'TEMP_{writer}_{thread}_{number}_{line}'
+                item['description'] = f'Writer {writer} Thread {thread} Product {number}.{line}'
+            response = client.post('/api/invoices/save', json=invoice)
+            if response.status_code != 201:
+                errors.append(f'{response.status_code}: {response.get_json()["message"]}')
+
+    workers = [threading.Thread(target=save_all, args=(thread,)) for thread in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return errors
+
+
+def read_until(client, stop, errors):
+    while not stop.is_set():
+        for url in ('/api/invoices/history?limit=20', '/api/data/products?search=Writer&limit=20'):
+            response = client.get(url)
+            if response.status_code != 200:
+                errors.append(f'{url} {response.status_code}: {response.get_json()["message"]}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--writers', type=int, default=16)
+    parser.add_argument('--invoices', type=int, default=50, help='invoices saved per writer thread')
+    parser.add_argument('--threads', type=int, default=1, help='threads per writer')
+    parser.add_argument('--block-size', type=int, default=50, help='ID_BLOCK_SIZE of the writers')
+    parser.add_argument('--readers', type=int, default=4)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='check_writes_')
+    os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(workdir, 'check.db')}"
+    os.environ['ID_BLOCK_SIZE'] = str(args.block_size)
+    sys.path.insert(0, BACKEND_DIR)
+    from app import create_app, db, init_db, SalesOrderHeader
+
+    app = create_app()
+    with app.app_context():
+        init_db()
+    # Writers must not inherit this process's pooled connections
+    with app.app_context():
+        for engine in db.engines.values():
+            engine.dispose()
+
+    stop = threading.Event()
+    read_errors = []
+    readers = [threading.Thread(target=read_until, args=(app.test_client(), stop, read_errors))
+               for _ in range(args.readers)]
+    for reader in readers:
+        reader.start()
+
+    started = time.perf_counter()
+    with multiprocessing.get_context('spawn').Pool(args.writers) as pool:
+        results = pool.starmap(write_invoices, [(writer, args.invoices, args.threads) for writer in range(args.writers)])
+    elapsed = time.perf_counter() - started
+    stop.set()
+    for reader in readers:
+        reader.join()
+
+    write_errors = [error for errors in results for error in errors]
+    with app.app_context():
+        saved = db.session.query(SalesOrderHeader).count()
+
+    expected = args.writers * args.threads * args.invoices
+    print(f"{args.writers} writers x {args.threads} threads saved {saved}/{expected} invoices in {elapsed:.2f}s "
+          f"({saved / elapsed:.0f}/s) with {args.readers} concurrent readers")
+    print(f"write errors: {len(write_errors)}, read errors: {len(read_errors)}")
+    for error in (write_errors + read_errors)[:10]:
+        print(f"  {error}")
+    if write_errors or read_errors or saved != expected:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,125 @@
+"""Check that gunicorn picks up background jobs left unfinished by a restart or a crashed worker.
+
+Records --jobs extraction jobs as queued or running, as a server that went
+down mid-work leaves them, then starts ``gunicorn -c gunicorn.conf.py`` with
+--workers workers and an EXTRACTION_QUEUE_SIZE smaller than the number of
+jobs. Checks that exactly one worker recovers them and that every job
+completes, including those beyond the queue's capacity.
+
+Then records --crash-jobs more jobs as owned by one of the running workers,
+kills that worker with SIGKILL and checks that its replacement recovers and
+completes them. Exits non-zero if any check failed.
+
+    python benchmarks/check_job_recovery.py --jobs 10 --workers 3
+"""
+import argparse
+import io
+import os
+import re
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--jobs', type=int, default=10)
+    parser.add_argument('--crash-jobs', type=int, default=4, help='jobs owned by the worker that is killed')
+    parser.add_argument('--workers', type=int, default=3, help='gunicorn workers')
+    parser.add_argument('--queue-size', type=int, default=2, help='EXTRACTION_QUEUE_SIZE of each worker')
+    parser.add_argument('--timeout', type=float, default=120, help='seconds to wait for the jobs')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='check_job_recovery_')
+    env = dict(os.environ, DATABASE_URL=f"sqlite:///{os.path.join(workdir, 'check.db')}",
+               EXTRACTION_QUEUE_SIZE=str(args.queue_size), EXTRACTION_WORKERS='1')
+    os.environ.update(env)
+    os.chdir(workdir)
+    sys.path.insert(0, BACKEND_DIR)
+    from PIL import Image
+    from app import create_app, db, init_db, ExtractionJob
+
+    app = create_app()
+
+    def add_jobs(numbers, worker_pid=None):
+        with app.app_context():
+            for number in numbers:
+                name = f'invoice-{number}.png'
+                buffer = io.BytesIO()
+                Image.new('RGB', (200 + number, 100), 'white').save(buffer, 'PNG')
+                with open(os.path.join(app.config['UPLOAD_FOLDER'], name), 'wb') as f:
+                    f.write(buffer.getvalue())
+                db.session.add(ExtractionJob(OriginalName=name, StoredName=name, FileSize=len(buffer.getvalue()),
+                                             Status='running' if number % 2 else 'queued', WorkerPID=worker_pid))
+            db.session.commit()
+            for engine in db.engines.values():
+                engine.dispose()
+
+    def wait_for_jobs():
+        deadline = time.monotonic() + args.timeout
+        while True:
+            with app.app_context():
+                statuses = [status for status, in db.session.query(ExtractionJob.Status)]
+            if all(status in ('completed', 'failed') for status in statuses) or time.monotonic() > deadline:
+                return statuses
+            if server.poll() is not None:
+                sys.exit(f'gunicorn exited; is it installed? See {log_path}')
+            time.sleep(0.2)
+
+    def log_lines(pattern):
+        with open(log_path) as log:
+            return [line.strip() for line in log if re.search(pattern, line)]
+
+    with app.app_context():
+        init_db()
+    add_jobs(range(args.jobs), worker_pid=12345)  # a worker of the server that went down
+
+    log_path = os.path.join(workdir, 'gunicorn.log')
+    with open(log_path, 'w') as log:
+        server = subprocess.Popen(
+            [sys.executable, '-m', 'gunicorn', '-c', os.path.join(BACKEND_DIR, 'gunicorn.conf.py'),
+             '--workers', str(args.workers), '--bind', '127.0.0.1:0', 'wsgi:app'],
+            env=dict(env, PYTHONPATH=BACKEND_DIR), cwd=workdir, stdout=log, stderr=log
+        )
+    try:
+        statuses = wait_for_jobs()
+        # Give any other worker time to (wrongly) recover as well
+        time.sleep(1)
+        recoveries = log_lines('Recovered')
+
+        booted = [int(pid) for pid in re.findall(r'Booting worker with pid: (\d+)', '\n'.join(log_lines('Booting')))]
+        crashed = booted[-1]
+        add_jobs(range(args.jobs, args.jobs + args.crash_jobs), worker_pid=crashed)
+        os.kill(crashed, signal.SIGKILL)
+        crash_statuses = wait_for_jobs()
+        crash_recoveries = log_lines('Recovered')[len(recoveries):]
+    finally:
+        server.terminate()
+        server.wait()
+
+    failures = []
+
+    def check(name, passed, detail=''):
+        print(f"{'ok  ' if passed else 'FAIL'} {name}{f' ({detail})' if detail else ''}")
+        if not passed:
+            failures.append(name)
+
+    completed = statuses.count('completed')
+    check(f'one of {args.workers} workers recovered the jobs', len(recoveries) == 1, '; '.join(recoveries))
+    check(f'{args.jobs} jobs completed with a queue of {args.queue_size}', completed == args.jobs,
+          f'{completed} completed')
+    completed = crash_statuses.count('completed') - args.jobs
+    check('the jobs of a killed worker are recovered once', len(crash_recoveries) == 1,
+          '; '.join(crash_recoveries))
+    check(f'{args.crash_jobs} jobs of a killed worker completed', completed == args.crash_jobs,
+          f'{completed} completed')
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+"""Check that multi-page PDFs are split into pages only for per-page extractors.
+
+Uploads a --pages page PDF invoice (see bench_pages.py) with the text layer
+stage off, so it reaches the heavy extractor, and checks that:
+
+* the simulated model, which returns the same whole invoice for any file,
+  extracts the document once rather than once per page
+* an extractor with ``per_page = True`` is still given single pages, whose
+  results merge into every line item and the right total
+
+Prints each check and exits non-zero if any failed.
+
+    python benchmarks/check_page_split.py
+"""
+import argparse
+import io
+import os
+import sys
+import tempfile
+
+from bench_pages import make_pdf
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--pages', type=int, default=3)
+    parser.add_argument('--lines', type=int, default=5, help='line items per page')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='check_page_split_')
+    os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(workdir, 'check.db')}"
+    os.chdir(workdir)
+    sys.path.insert(0, BACKEND_DIR)
+    from pypdf import PdfReader
+    from app import create_app, init_db, simulate_invoice_extraction
+    from extraction import ExtractionPipeline, SniffStage, ModelStage, parse_invoice_text
+
+    app = create_app({'EXTRACTION_TEXT_LAYER': False, 'EXTRACTION_PAGE_WORKERS': 8})
+    with app.app_context():
+        init_db()
+    failures = []
+
+    def check(name, passed, detail=''):
+        print(f"{'ok  ' if passed else 'FAIL'} {name}{f' ({detail})' if detail else ''}")
+        if not passed:
+            failures.append(name)
+
+    expected_total, expected_items = make_pdf(os.path.join(workdir, 'long.pdf'), args.pages, args.lines)
+    with open(os.path.join(workdir, 'long.pdf'), 'rb') as f:
+        document = f.read()
+
+    simulated = simulate_invoice_extraction('long.pdf')
+    response = app.test_client().post('/api/invoices/upload', content_type='multipart/form-data',
+                                      data={'invoice': (io.BytesIO(document), 'long.pdf')})
+    extracted = response.get_json()['data']['extractedData']
+    check(f'simulated model: {args.pages} pages extracted once',
+          len(extracted['lineItems']) == len(simulated['lineItems'])
+          and extracted['totals']['total'] == simulated['totals']['total'],
+          f"{len(extracted['lineItems'])} line items, total {extracted['totals']['total']}")
+
+    def model(filename):
+        reader = PdfReader(os.path.join(workdir, filename))
+        data, confidence = parse_invoice_text('\n'.join(page.extract_text() for page in reader.pages))
+        return dict(data, confidence=confidence)
+
+    model.per_page = True
+    result = ExtractionPipeline([SniffStage(), ModelStage(model, page_workers=8)], workdir).run('long.pdf')
+    check(f'per-page model: {args.pages} pages extracted apart and merged',
+          len(result['pipeline'].get('pages') or []) == args.pages and len(result['lineItems']) == expected_items
+          and result['totals']['total'] == expected_total,
+          f"{len(result['lineItems'])}/{expected_items} line items, total {result['totals']['total']}")
+
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
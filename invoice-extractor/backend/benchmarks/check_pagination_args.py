@@ -0,0 +1,68 @@
+"""Check that the history and list endpoints handle odd paging arguments.
+
+On an empty and then a seeded throwaway database, loads history, products
+and customers with limit=0, a negative limit, a limit over the maximum,
+page=0 and a malformed cursor, and checks that each returns a page (limit
+clamped to 1..MAX_LIMIT) or 400 for the cursor, never 500. Prints each
+check and exits non-zero if any failed.
+
+    python benchmarks/check_pagination_args.py
+"""
+import argparse
+import os
+import sys
+import tempfile
+
+from synthetic_data import seed
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ENDPOINTS = {'history': ('/api/invoices/history', 'orders'), 'products': ('/api/data/products', 'products'),
+             'customers': ('/api/data/customers', 'customers')}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--orders', type=int, default=1200)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='check_pagination_args_')
+    os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(workdir, 'check.db')}"
+    os.chdir(workdir)
+    sys.path.insert(0, BACKEND_DIR)
+    from app import create_app, db
+    from pagination import MAX_LIMIT
+
+    app = create_app({'RESPONSE_CACHE_SIZE': 0})
+    with app.app_context():
+        db.create_all()
+    client = app.test_client()
+    failures = []
+
+    def check(name, passed, detail=''):
+        print(f"{'ok  ' if passed else 'FAIL'} {name}{f' ({detail})' if detail else ''}")
+        if not passed:
+            failures.append(name)
+
+    def run(label, rows):
+        for name, (path, key) in ENDPOINTS.items():
+            for query, expected in [('limit=0', min(rows, 1)), ('limit=-1', min(rows, 1)),
+                                    (f'limit={MAX_LIMIT + 1}', min(rows, MAX_LIMIT)), ('page=0&limit=5', min(rows, 5)),
+                                    ('search=Product&limit=0', None)]:
+                response = client.get(f'{path}?{query}')
+                body = response.get_json()
+                returned = len(body['data'][key]) if response.status_code == 200 else None
+                passed = response.status_code == 200 and (expected is None or returned == expected)
+                check(f'{label}: {name}?{query}', passed, f'{response.status_code}, {returned} rows')
+            response = client.get(f'{path}?cursor=not-a-cursor')
+            check(f'{label}: {name} with a malformed cursor gets 400', response.status_code == 400,
+                  str(response.status_code))
+
+    run('empty', 0)
+    seed(1200, 1200, args.orders, 3, log=lambda line: None, app=app)
+    run('seeded', 1200)
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
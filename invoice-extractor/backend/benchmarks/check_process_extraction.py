@@ -0,0 +1,88 @@
+"""Check that extraction works in worker processes started with spawn.
+
+Batch uploads always extract in a process pool, and background jobs do with
+EXTRACTION_EXECUTOR=process. Under the spawn start method (the default on
+macOS and Windows) those workers import the app afresh instead of inheriting
+its pipeline. On a throwaway database this uploads a batch of --files images
+and queues as many background jobs, all with spawned workers, and checks
+every one is extracted. Exits non-zero if any failed.
+
+    python benchmarks/check_process_extraction.py
+"""
+import argparse
+import io
+import json
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def invoice_png(number):
+    from PIL import Image
+
+    buffer = io.BytesIO()
+    Image.new('RGB', (200 + number, 100), 'white').save(buffer, 'PNG')
+    return buffer.getvalue()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--files', type=int, default=4)
+    parser.add_argument('--timeout', type=float, default=120, help='seconds to wait for background jobs')
+    args = parser.parse_args()
+
+    multiprocessing.set_start_method('spawn')
+    workdir = tempfile.mkdtemp(prefix='check_process_extraction_')
+    os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(workdir, 'check.db')}"
+    os.chdir(workdir)
+    sys.path.insert(0, BACKEND_DIR)
+    from app import create_app, init_db, batch_processor, job_queue
+
+    app = create_app({'EXTRACTION_EXECUTOR': 'process', 'EXTRACTION_WORKERS': 2, 'BATCH_WORKERS': 2})
+    with app.app_context():
+        init_db()
+    client = app.test_client()
+    failures = []
+
+    def check(name, passed, detail=''):
+        print(f"{'ok  ' if passed else 'FAIL'} {name}{f' ({detail})' if detail else ''}")
+        if not passed:
+            failures.append(name)
+
+    files = [(io.BytesIO(invoice_png(number)), f'invoice-{number}.png') for number in range(args.files)]
+    response = client.post('/api/invoices/upload/batch', data={'invoices': files},
+                           content_type='multipart/form-data')
+    lines = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    errors = [line['message'] for line in lines if line.get('success') is False]
+    check(f'batch of {args.files} extracted in spawned workers', response.status_code == 200
+          and lines[-1].get('summary', {}).get('succeeded') == args.files, '; '.join(errors[:3]))
+
+    job_ids = []
+    for number in range(args.files):
+        # Different bytes from the batch, so the extraction cache does not answer
+        response = client.post('/api/invoices/upload?async=true', data={
+            'invoice': (io.BytesIO(invoice_png(args.files + number)), f'job-{number}.png')
+        }, content_type='multipart/form-data')
+        job_ids.append(response.get_json()['data']['jobId'])
+
+    deadline = time.monotonic() + args.timeout
+    while True:
+        jobs = [client.get(f'/api/invoices/jobs/{job_id}').get_json()['data'] for job_id in job_ids]
+        if all(job['status'] in ('completed', 'failed') for job in jobs) or time.monotonic() > deadline:
+            break
+        time.sleep(0.2)
+    errors = [job.get('error') or job['status'] for job in jobs if job['status'] != 'completed']
+    check(f'{args.files} background jobs extracted in spawned workers', not errors, '; '.join(errors[:3]))
+
+    job_queue.shutdown()
+    batch_processor.shutdown()
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+"""Check that the history and list endpoints run a constant number of SQL statements.
+
+On a seeded throwaway database with QUERY_COUNT_HEADER on and the response
+cache off, loads the first page and the page after it (by ``nextCursor``)
+of history, products and customers at limits 2, 20 and 200, and checks that
+each load runs 1-2 statements, however many rows it returns. Prints each
+count and exits non-zero if any is out of range.
+
+    python benchmarks/check_query_counts.py
+"""
+import argparse
+import os
+import sys
+import tempfile
+
+from synthetic_data import seed
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+LIMITS = (2, 20, 200)
+MAX_STATEMENTS = 2
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--orders', type=int, default=1000)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='check_query_counts_')
+    os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(workdir, 'check.db')}"
+    os.chdir(workdir)
+    sys.path.insert(0, BACKEND_DIR)
+    from app import create_app, db
+
+    app = create_app({'QUERY_COUNT_HEADER': True, 'RESPONSE_CACHE_SIZE': 0})
+    with app.app_context():
+        db.create_all()
+    seed(500, 500, args.orders, 3, log=lambda line: None, app=app)
+    client = app.test_client()
+    failures = []
+
+    endpoints = {'history': ('/api/invoices/history', 'orders'), 'products': ('/api/data/products', 'products'),
+                 'customers': ('/api/data/customers', 'customers')}
+    for name, (path, key) in endpoints.items():
+        client.get(f'{path}?limit=2')  # first use loads per-process state, such as the catalog
+        for limit in LIMITS:
+            url = f'{path}?limit={limit}'
+            for page in ('first page', 'next page'):
+                response = client.get(url)
+                data = response.get_json()['data']
+                count = int(response.headers['X-Query-Count'])
+                passed = response.status_code == 200 and len(data[key]) == limit and 1 <= count <= MAX_STATEMENTS
+                print(f"{'ok  ' if passed else 'FAIL'} {name} limit={limit} {page}: {count} statements")
+                if not passed:
+                    failures.append(url)
+                url = f"{path}?limit={limit}&cursor={data['pagination']['nextCursor']}"
+
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+"""Check the response cache of the stats, products, customers and territories endpoints.
+
+On a seeded throwaway database, checks that:
+
+* repeat loads run no SQL and a matching If-None-Match gets 304
+* a save or delete in this process shows up on the next load
+* a save by another process (another worker) shows up within
+  RESPONSE_CACHE_SYNC_SECONDS
+* error responses are not cached
+* a second app built in the same process keeps its own cache and config,
+  and leaves the first app's alone
+
+Prints each check and exits non-zero if any failed.
+
+    python benchmarks/check_response_cache.py
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from synthetic_data import seed
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SYNC_SECONDS = 0.5
+
+
+def save_elsewhere():
+    """Save one invoice from a separate process with its own app, like another server worker."""
+    sys.path.insert(0, BACKEND_DIR)
+    from app import create_app, simulate_invoice_extraction
+
+    response = create_app().test_client().post('/api/invoices/save', json=simulate_invoice_extraction('other.png'))
+    assert response.status_code == 201, response.get_json()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--orders', type=int, default=1000)
+    parser.add_argument('--other-worker', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.other_worker:
+        save_elsewhere()
+        return
+
+    workdir = tempfile.mkdtemp(prefix='check_response_cache_')
+    os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(workdir, 'check.db')}"
+    os.chdir(workdir)
+    sys.path.insert(0, BACKEND_DIR)
+    from app import create_app, db, simulate_invoice_extraction
+
+    app = create_app({'QUERY_COUNT_HEADER': True, 'RESPONSE_CACHE_SYNC_SECONDS': SYNC_SECONDS})
+    with app.app_context():
+        db.create_all()
+    seed(200, 200, args.orders, 3, log=lambda line: None, app=app)
+    client = app.test_client()
+    failures = []
+
+    def check(name, passed, detail=''):
+        print(f"{'ok  ' if passed else 'FAIL'} {name}{f' ({detail})' if detail else ''}")
+        if not passed:
+            failures.append(name)
+
+    def total_orders():
+        return client.get('/api/data/stats').get_json()['data']['totalOrders']
+
+    for path in ['/api/data/stats', '/api/data/products?limit=50', '/api/data/customers?limit=50&page=2',
+                 '/api/data/territories']:
+        first = client.get(path)
+        repeat = client.get(path)
+        conditional = client.get(path, headers={'If-None-Match': first.headers['ETag']})
+        check(f'{path}: repeat load runs no SQL', repeat.headers['X-Query-Count'] == '0'
+              and repeat.get_data() == first.get_data(), f"{first.headers['X-Query-Count']} statements at first")
+        check(f'{path}: If-None-Match gets 304', conditional.status_code == 304 and not conditional.get_data())
+
+    orders = total_orders()
+    saved = client.post('/api/invoices/save', json=simulate_invoice_extraction('invoice.png'))
+    check('save shows up on the next load', total_orders() == orders + 1)
+    client.delete(f"/api/invoices/{saved.get_json()['data']['salesOrderId']}")
+    check('delete shows up on the next load', total_orders() == orders)
+
+    subprocess.run([sys.executable, os.path.abspath(__file__), '--other-worker'], check=True)
+    time.sleep(SYNC_SECONDS)
+    check(f'another worker\'s save shows up within {SYNC_SECONDS}s', total_orders() == orders + 1)
+
+    bad = [client.get('/api/data/products?cursor=bad') for _ in range(2)]
+    check('errors are not cached', [response.status_code for response in bad] == [400, 400]
+          and 'ETag' not in bad[1].headers)
+
+    client.get('/api/data/stats')
+    other = create_app({'QUERY_COUNT_HEADER': True, 'RESPONSE_CACHE_SIZE': 0}).test_client()
+    counts = [other.get('/api/data/stats').headers['X-Query-Count'] for _ in range(2)]
+    check('a second app with the cache off runs SQL on every load', '0' not in counts, f'{counts} statements')
+    repeat = client.get('/api/data/stats')
+    check('the first app keeps its cache after a second app is built', repeat.headers['X-Query-Count'] == '0',
+          f"{repeat.headers['X-Query-Count']} statements")
+
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
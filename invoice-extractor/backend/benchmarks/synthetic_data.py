@@ -0,0 +1,186 @@
+"""Seed a database with synthetic products, customers, orders and order lines.
+
+Rows are generated from a fixed random seed (the same arguments always give
+the same data) and written the way ``load-csv`` writes master data: chunked
+DBAPI executemany in one transaction, with the tables' secondary indexes
+and search triggers dropped for the load and rebuilt at the end. The
+dashboard totals, analytics rollups and ID sequences are brought up to date
+afterwards, so the seeded database behaves like one filled through the API.
+
+Orders are spread over the last --days days (CreatedAt increasing with
+SalesOrderID) and get 1 to 2 * --lines - 1 lines each (--lines on average).
+
+    DATABASE_URL=sqlite:////tmp/load.db python benchmarks/synthetic_data.py --orders 1000000 --products 100000
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from contextlib import ExitStack
+from datetime import datetime, timedelta
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CHUNK_SIZE = 50000
+
+# Product names are "<adjective> <noun> <number>", so searches for a word match many products
+ADJECTIVES = ['Steel', 'Carbon', 'Alloy', 'Touring', 'Mountain', 'Road', 'Classic', 'Sport', 'Pro', 'Light',
+              'Heavy', 'Compact', 'Deluxe', 'Standard', 'Racing', 'Urban']
+NOUNS = ['Frame', 'Wheel', 'Chain', 'Pedal', 'Saddle', 'Helmet', 'Glove', 'Bottle', 'Brake', 'Crank',
+         'Fork', 'Tire', 'Tube', 'Jersey', 'Light', 'Lock', 'Pump', 'Rack', 'Bell', 'Bolt']
+COLORS = ['Black', 'Red', 'Silver', 'Blue', 'Yellow', 'White', None]
+TAX_RATE = 0.08
+
+
+def _insert(conn, table, columns, rows):
+    """Insert ``rows`` (tuples in ``columns`` order) in chunks; returns the number inserted."""
+    quote = conn.dialect.identifier_preparer.quote
+    statement = (f"INSERT INTO {quote(table.name)} ({', '.join(quote(name) for name in columns)}) "
+                 f"VALUES ({', '.join('?' for _ in columns)})")
+    count = 0
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= CHUNK_SIZE:
+            conn.exec_driver_sql(statement, chunk)
+            count += len(chunk)
+            chunk = []
+    if chunk:
+        conn.exec_driver_sql(statement, chunk)
+        count += len(chunk)
+    return count
+
+
+def product_name(product_id):
+    return f'{ADJECTIVES[product_id % len(ADJECTIVES)]} {NOUNS[product_id // len(ADJECTIVES) % len(NOUNS)]} ' \
+           f'{product_id}'
+
+
+def seed(products=1000, customers=1000, orders=10000, lines=3, days=730, random_seed=42, log=print, app=None):
+    """Append synthetic rows to the app's database (created if needed; the app is built if not given).
+
+    Returns ``{'products': (first id, last id), 'customers': ..., 'orders': ..., 'lines': count}``.
+    """
+    sys.path.insert(0, BACKEND_DIR)
+    from app import (create_app, db, init_db, Product, Customer, SalesOrderHeader, SalesOrderDetail, id_allocator,
+                     catalog_index, search_index, stats_counters, rollups, response_cache)
+    from bulk_loader import without_indexes
+
+    app = app or create_app()
+    rng = random.Random(random_seed)
+    with app.app_context():
+        init_db()
+        with db.engine.begin() as conn:
+            conn.exec_driver_sql('BEGIN IMMEDIATE')
+            first_product = id_allocator.first_free(conn, 'products')
+            first_customer = id_allocator.first_free(conn, 'customers')
+            first_order = (conn.execute(db.select(db.func.max(SalesOrderHeader.SalesOrderID))).scalar() or 0) + 1
+            first_detail = (conn.execute(
+                db.select(db.func.max(SalesOrderDetail.SalesOrderDetailID))).scalar() or 0) + 1
+            prices = [round(rng.uniform(2, 2000), 2) for _ in range(products)]
+            tables = [Product.__table__, Customer.__table__, SalesOrderHeader.__table__, SalesOrderDetail.__table__]
+
+            with ExitStack() as load:
+                load.enter_context(search_index.suspended(conn, 'products'))
+                load.enter_context(search_index.suspended(conn, 'customers'))
+                for table in tables:
+                    load.enter_context(without_indexes(conn, table))
+
+                started = time.perf_counter()
+                _insert(conn, Product.__table__,
+                        ['ProductID', 'Name', 'ProductNumber', 'MakeFlag', 'FinishedGoodsFlag', 'Color',
+                         'StandardCost', 'ListPrice'],
+                        ((first_product + offset, product_name(first_product + offset),
+                          f'PN-{first_product + offset:06d}', True, True, rng.choice(COLORS),
+                          round(price * 0.7, 2), price)
+                         for offset, price in enumerate(prices)))
+                _insert(conn, Customer.__table__,
+                        ['CustomerID', 'PersonID', 'StoreID', 'TerritoryID', 'AccountNumber'],
+                        ((customer_id, None, None, rng.randint(1, 10), f'AC{customer_id:06d}')
+                         for customer_id in range(first_customer, first_customer + customers)))
+                log(f"  {products} products, {customers} customers in {time.perf_counter() - started:.1f}s")
+
+                started = time.perf_counter()
+                detail_rows = []
+                end = datetime.utcnow()
+                step = timedelta(days=days) / max(orders, 1)
+
+                def header_rows():
+                    detail_id = first_detail
+                    for offset in range(orders):
+                        order_id = first_order + offset
+                        created = end - step * (orders - offset)
+                        order_date = (created - timedelta(days=rng.randint(0, 3))).date()
+                        subtotal = 0.0
+                        for _ in range(rng.randint(1, max(1, 2 * lines - 1))):
+                            product = rng.randrange(products)
+                            quantity = rng.randint(1, 20)
+                            line_total = round(quantity * prices[product], 2)
+                            subtotal += line_total
+                            detail_rows.append((detail_id, order_id, quantity, first_product + product, 1,
+                                                prices[product], 0.0, line_total))
+                            detail_id += 1
+                        subtotal = round(subtotal, 2)
+                        tax = round(subtotal * TAX_RATE, 2)
+                        freight = round(rng.uniform(0, 50), 2)
+                        yield (order_id, 1, order_date.isoformat(), (order_date + timedelta(days=30)).isoformat(),
+                               5, True, f'SO{order_id:08d}', first_customer + rng.randrange(customers), 1,
+                               subtotal, tax, freight, round(subtotal + tax + freight, 2), created.isoformat(' '))
+
+                header_columns = ['SalesOrderID', 'RevisionNumber', 'OrderDate', 'DueDate', 'Status',
+                                  'OnlineOrderFlag', 'SalesOrderNumber', 'CustomerID', 'ShipMethodID', 'SubTotal',
+                                  'TaxAmt', 'Freight', 'TotalDue', 'CreatedAt']
+                detail_columns = ['SalesOrderDetailID', 'SalesOrderID', 'OrderQty', 'ProductID', 'SpecialOfferID',
+                                  'UnitPrice', 'UnitPriceDiscount', 'LineTotal']
+                detail_count = 0
+                remaining = header_rows()
+                while True:
+                    # Headers and their lines go in alternating chunks so lines never pile up in memory
+                    chunk = [row for _, row in zip(range(CHUNK_SIZE), remaining)]
+                    if not chunk:
+                        break
+                    _insert(conn, SalesOrderHeader.__table__, header_columns, chunk)
+                    detail_count += _insert(conn, SalesOrderDetail.__table__, detail_columns, detail_rows)
+                    detail_rows.clear()
+                    log(f"  {chunk[-1][0] - first_order + 1} orders, {detail_count} lines "
+                        f"({time.perf_counter() - started:.1f}s)")
+                started = time.perf_counter()
+            log(f"  indexes and search index rebuilt in {time.perf_counter() - started:.1f}s")
+            catalog_index.invalidate(conn)
+            response_cache.invalidate(conn)
+
+        if products:
+            id_allocator.observe('products', first_product + products - 1)
+        if customers:
+            id_allocator.observe('customers', first_customer + customers - 1)
+        stats_counters.reconcile()
+        rollups.rebuild()
+
+    return {
+        'products': (first_product, first_product + products - 1),
+        'customers': (first_customer, first_customer + customers - 1),
+        'orders': (first_order, first_order + orders - 1),
+        'lines': detail_count,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--products', type=int, default=1000)
+    parser.add_argument('--customers', type=int, default=1000)
+    parser.add_argument('--orders', type=int, default=10000)
+    parser.add_argument('--lines', type=int, default=3, help='average lines per order')
+    parser.add_argument('--days', type=int, default=730, help='period the orders are spread over')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+    if args.products < 1 or args.customers < 1:
+        parser.error('orders need at least one product and one customer')
+
+    started = time.perf_counter()
+    seeded = seed(args.products, args.customers, args.orders, args.lines, args.days, args.seed)
+    print(f"✅ Seeded {args.products} products, {args.customers} customers, {args.orders} orders and "
+          f"{seeded['lines']} lines in {time.perf_counter() - started:.1f}s")
+
+
+if __name__ == '__main__':
+    main()
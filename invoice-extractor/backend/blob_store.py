@@ -0,0 +1,152 @@
+"""Content-addressed storage for uploaded files.
+
+Uploads are stored once per distinct content, named by their SHA-256 and
+sharded two levels deep by its leading hex digits::
+
+    uploads/blobs/3f/a9/3fa9...e1
+
+so uploading the same invoice again costs no extra disk or inode, and no
+directory grows past a few thousand entries. Files stream into
+``uploads/incoming/`` first and are renamed into place once complete;
+renaming over an existing blob is atomic and refreshes its modification
+time, which counts as the blob's last upload.
+
+Saved orders reference the blob they were extracted from in the
+``order_documents`` table (extraction results carry it as
+``documentHash``). Blobs are never deleted on the request path since other
+uploads may share them: ``collect_garbage`` (``flask --app app
+gc-uploads``) removes blobs that no order or unfinished extraction job
+references and that were last uploaded more than N days ago, along with
+stale partial uploads and files left from the old flat ``uuid_name``
+layout.
+"""
+import os
+import re
+import time
+
+BLOB_DIR = 'blobs'
+INCOMING_DIR = 'incoming'
+HASH_RE = re.compile(r'[0-9a-f]{64}')
+REFERENCE_BATCH = 500
+
+
+def blob_name(sha256):
+    """Path of the blob for ``sha256``, relative to the upload folder."""
+    return os.path.join(BLOB_DIR, sha256[:2], sha256[2:4], sha256)
+
+
+def blob_hash(name):
+    """The SHA-256 a stored name refers to, or None for names outside the blob layout."""
+    if not name:
+        return None
+    parts = os.path.normpath(name).split(os.sep)
+    if len(parts) == 4 and parts[0] == BLOB_DIR and HASH_RE.fullmatch(parts[3]):
+        return parts[3]
+    return None
+
+
+class BlobStore:
+    def __init__(self, db, reference_model, job_model, folder=None):
+        self.db = db
+        self.reference_model = reference_model
+        self.job_model = job_model
+        self.folder = folder
+
+    @staticmethod
+    def valid_hash(value):
+        return isinstance(value, str) and HASH_RE.fullmatch(value) is not None
+
+    def link(self, references):
+        """Record ``(SalesOrderID, ContentHash)`` pairs in the current transaction."""
+        rows = [{'SalesOrderID': order_id, 'ContentHash': content_hash}
+                for order_id, content_hash in references if self.valid_hash(content_hash)]
+        if rows:
+            self.db.session.execute(self.db.insert(self.reference_model), rows)
+
+    def unlink(self, order_id):
+        """Drop an order's references in the current transaction; the blobs are left for GC."""
+        self.db.session.execute(
+            self.db.delete(self.reference_model).where(self.reference_model.SalesOrderID == order_id)
+        )
+
+    def _in_use(self, conn):
+        """Stored names of extraction jobs that have not finished yet."""
+        job = self.job_model
+        return set(conn.execute(
+            self.db.select(job.StoredName).where(job.Status.in_(['queued', 'running']))
+        ).scalars())
+
+    def _referenced(self, conn, hashes):
+        reference = self.reference_model
+        return set(conn.execute(
+            self.db.select(reference.ContentHash).distinct().where(reference.ContentHash.in_(hashes))
+        ).scalars())
+
+    def _candidates(self, cutoff):
+        """Yield ``(path, stored name, size)`` for files last written before ``cutoff``."""
+        with os.scandir(self.folder) as entries:
+            for entry in entries:
+                if entry.is_file() and entry.stat().st_mtime < cutoff:
+                    # Flat files from before the blob layout
+                    yield entry.path, entry.name, entry.stat().st_size
+
+        for subfolder in (INCOMING_DIR, BLOB_DIR):
+            for root, _, files in os.walk(os.path.join(self.folder, subfolder)):
+                for name in files:
+                    path = os.path.join(root, name)
+                    stat = os.stat(path)
+                    if stat.st_mtime < cutoff:
+                        yield path, os.path.relpath(path, self.folder), stat.st_size
+
+    def collect_garbage(self, older_than_days, dry_run=False):
+        """Delete unreferenced files last uploaded more than ``older_than_days`` ago.
+
+        Returns counts of files and bytes removed and kept (kept = old
+        enough but still referenced).
+        """
+        cutoff = time.time() - older_than_days * 86400
+        report = {'removed': 0, 'removedBytes': 0, 'kept': 0, 'keptBytes': 0}
+        with self.db.engine.connect() as conn:
+            in_use = self._in_use(conn)
+            batch = []
+
+            def sweep(batch):
+                hashes = [blob_hash(name) for _, name, _ in batch]
+                referenced = self._referenced(conn, [value for value in hashes if value])
+                for (path, name, size), content_hash in zip(batch, hashes):
+                    if name in in_use or content_hash in referenced:
+                        report['kept'] += 1
+                        report['keptBytes'] += size
+                        continue
+                    if not dry_run:
+                        try:
+                            # Re-uploaded since it was listed: no longer old
+                            if os.stat(path).st_mtime >= cutoff:
+                                continue
+                            os.remove(path)
+                        except FileNotFoundError:
+                            continue
+                    report['removed'] += 1
+                    report['removedBytes'] += size
+
+            for candidate in self._candidates(cutoff):
+                batch.append(candidate)
+                if len(batch) >= REFERENCE_BATCH:
+                    sweep(batch)
+                    batch = []
+            if batch:
+                sweep(batch)
+
+        if not dry_run:
+            self._prune_directories()
+        return report
+
+    def _prune_directories(self):
+        """Remove shard directories left empty."""
+        top = os.path.join(self.folder, BLOB_DIR)
+        for root, _, _ in os.walk(top, topdown=False):
+            if root != top and not os.listdir(root):
+                try:
+                    os.rmdir(root)
+                except OSError:
+                    pass  # an upload just created a blob in it
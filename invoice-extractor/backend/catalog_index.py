@@ -0,0 +1,153 @@
+"""Process-local index of the product catalog for line-item resolution.
+
+Saving an invoice resolves every line item to a ProductID by name or
+product number. Instead of one query per line, each worker keeps the
+catalog's (normalized name, product number) -> ProductID maps in memory.
+
+Workers stay consistent through a generation counter in the ``generations``
+table: whoever inserts products bumps it in the same transaction and records
+the new ProductIDs under that generation in ``catalog_changes``. ``sync()``
+then loads just the products of the generations it has not seen. ProductIDs
+come from per-worker blocks and commit out of order, so the log, not the
+highest ID, says what is new. Products this worker inserts are added to its
+own maps after commit, so its index stays warm.
+
+Writes that bypass ``stage()`` (bulk loads) bump a separate reset counter
+instead and clear the log; every worker then reloads the whole catalog once.
+"""
+import threading
+
+from sqlalchemy import event
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+PENDING_KEY = 'catalog_index_pending'
+
+
+def normalize_name(name):
+    """Case- and whitespace-insensitive form of a product name."""
+    return ' '.join(name.split()).casefold() if name else ''
+
+
+class CatalogIndex:
+    def __init__(self, db, product_model, generation_model, change_model, key='products'):
+        self.db = db
+        self.product_model = product_model
+        self.generations = generation_model.__table__
+        self.changes = change_model.__table__
+        self.key = key
+        self.reset_key = f'{key}.reset'
+        self._lock = threading.Lock()
+        self._generation = None
+        self._reset = None
+        self._by_name = {}
+        self._by_number = {}
+        event.listen(Session, 'after_commit', self._after_commit)
+        event.listen(Session, 'after_rollback', self._after_rollback)
+
+    def _bump(self, name):
+        table = self.generations
+        return sqlite_insert(table).values(Name=name, Value=1).on_conflict_do_update(
+            index_elements=[table.c.Name], set_={'Value': table.c.Value + 1}
+        )
+
+    def invalidate(self, conn):
+        """Make every worker (this one included) reload, for products written without ``stage()``."""
+        conn.execute(self._bump(self.reset_key))
+        # Every worker reloads in full now, so the log of older generations is no longer needed
+        conn.execute(self.changes.delete())
+
+    def _read_generation(self):
+        table = self.generations
+        value = self.db.session.execute(
+            self.db.select(table.c.Value).where(table.c.Name == self.key)
+        ).scalar()
+        return value or 0
+
+    def _read_generations(self):
+        """``(generation, reset)`` counters, in one query."""
+        table = self.generations
+        values = dict(self.db.session.execute(
+            self.db.select(table.c.Name, table.c.Value).where(table.c.Name.in_([self.key, self.reset_key]))
+        ).all())
+        return values.get(self.key, 0), values.get(self.reset_key, 0)
+
+    def sync(self):
+        """Catch up with other workers' changes to the catalog (one small query when there are none)."""
+        generation, reset = self._read_generations()
+        with self._lock:
+            if reset != self._reset or self._generation is None:
+                self._reload(generation, reset)
+            elif generation > self._generation:
+                self._load_changes(generation)
+
+    def _reload(self, generation, reset):
+        model = self.product_model
+        self._by_name = {}
+        self._by_number = {}
+        self._add(self.db.session.execute(
+            self.db.select(model.ProductID, model.Name, model.ProductNumber)
+        ))
+        self._generation = generation
+        self._reset = reset
+
+    def _load_changes(self, generation):
+        """Add the products of the generations after ours, read in the same snapshot as ``generation``."""
+        model = self.product_model
+        changes = self.changes
+        self._add(self.db.session.execute(
+            self.db.select(model.ProductID, model.Name, model.ProductNumber)
+            .join(changes, changes.c.ProductID == model.ProductID)
+            .where(changes.c.Generation > self._generation)
+        ))
+        self._generation = generation
+
+    def _add(self, products):
+        for product_id, name, number in products:
+            # Lowest ProductID wins for duplicate names, like the first() lookup it
+            # replaces, whatever order the products arrive in
+            key = normalize_name(name)
+            current = self._by_name.get(key)
+            if current is None or product_id < current:
+                self._by_name[key] = product_id
+            if number:
+                self._by_number[number] = product_id
+
+    def lookup(self, name, number=None):
+        """ProductID for a product number or name, or None if the catalog has neither."""
+        with self._lock:
+            if number is not None and number in self._by_number:
+                return self._by_number[number]
+            return self._by_name.get(normalize_name(name))
+
+    def stage(self, products):
+        """Register products inserted in the current transaction.
+
+        ``products`` is an iterable of ``(ProductID, Name, ProductNumber)``.
+        The shared generation is bumped and the products logged under it
+        inside the transaction, so other workers load them on their next
+        ``sync()``; this worker adds them once it commits.
+        """
+        products = list(products)
+        session = self.db.session()
+        session.execute(self._bump(self.key))
+        generation = self._read_generation()
+        if products:
+            session.execute(self.db.insert(self.changes), [
+                {'Generation': generation, 'ProductID': product_id} for product_id, _, _ in products
+            ])
+        session.info.setdefault(PENDING_KEY, []).append((generation, products))
+
+    def _after_commit(self, session):
+        for generation, products in session.info.pop(PENDING_KEY, []):
+            with self._lock:
+                # Only apply our own change on top of the exact generation we
+                # have; anything else means another worker also wrote and the
+                # next sync() will load it
+                if self._generation != generation - 1:
+                    continue
+                self._add(products)
+                self._generation = generation
+
+    def _after_rollback(self, session):
+        session.info.pop(PENDING_KEY, None)
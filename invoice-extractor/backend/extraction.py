@@ -0,0 +1,451 @@
+"""Staged invoice extraction.
+
+Uploads go through a pipeline of stages from cheapest to most expensive,
+and the first stage that produces a result with enough confidence wins:
+
+1. ``SniffStage`` reads the file's magic bytes to decide what it is.
+2. ``PreprocessStage`` shrinks images (see ``images.py``) so the model
+   gets a smaller copy; the uploaded original is left untouched.
+3. ``TextLayerStage`` parses the text layer of digitally generated PDFs
+   with regex/layout heuristics, scoring its own result by how well the
+   line items and totals add up.
+4. ``ModelStage`` wraps the heavy extractor and always produces a result.
+   Multi-page PDFs are split into pages that are extracted concurrently
+   and merged (``merge_pages``), so latency follows the slowest page.
+
+Scanned PDFs and images have no text layer, so they go straight to the
+model. Every stage's timing and confidence is recorded in the result:
+``processingTime`` and ``confidence`` keep their meaning (total seconds and
+the confidence of the accepted result) and ``pipeline`` lists the stages,
+plus the preprocessing report for images and per-page timings for split
+PDFs.
+
+Stages are plain callables taking a ``Document`` and returning
+``(result, confidence)``, or ``(None, None)`` when they do not apply, so
+more can be slotted in without touching the pipeline.
+"""
+import os
+import re
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from images import preprocess_image
+from uploads import SNIFF_BYTES, sniff_file_type
+
+MAX_TEXT_PAGES = 20
+TEMP_PRODUCT_RE = re.compile(r'TEMP_\d+')
+IMAGE_EXTENSIONS = {'jpeg': '.jpg', 'png': '.png'}
+
+
+class Document:
+    """An uploaded file on its way through the pipeline; stages share what they learn here."""
+
+    def __init__(self, folder, filename):
+        self.folder = folder
+        self.filename = filename
+        self.path = os.path.join(folder, filename)
+        self.kind = None
+        self.text = None
+        # What the model stage reads (relative to folder), e.g. a preprocessed copy
+        self.model_filename = filename
+        self.preprocess = None
+        self.pages = None
+        self.reconciliation = None
+        self.temporary_files = []
+
+
+class SniffStage:
+    name = 'sniff'
+
+    def __call__(self, document):
+        with open(document.path, 'rb') as f:
+            document.kind = sniff_file_type(f.read(SNIFF_BYTES))
+        return None, 1.0 if document.kind else 0.0
+
+
+class PreprocessStage:
+    """Write a smaller copy of images for the model, in a bounded thread pool.
+
+    The pool caps how many full-size photos are decoded at once however
+    many requests are extracting; it is created on first use in each
+    process. Copies go to ``subfolder`` and are removed after the run.
+    """
+    name = 'preprocess'
+
+    def __init__(self, workers=None, subfolder='preprocessed', **options):
+        self.workers = workers or os.cpu_count() or 1
+        self.subfolder = subfolder
+        self.options = options  # passed on to preprocess_image
+        self._executor = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def _pool(self):
+        with self._lock:
+            if self._pid != os.getpid():
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='preprocess')
+                self._pid = os.getpid()
+            return self._executor
+
+    def __call__(self, document):
+        if document.kind not in IMAGE_EXTENSIONS:
+            return None, None
+        # Unique per run: identical uploads share a stored file and may be extracted at once
+        name = os.path.join(self.subfolder, uuid.uuid4().hex + IMAGE_EXTENSIONS[document.kind])
+        target = os.path.join(document.folder, name)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        try:
+            report = self._pool().submit(preprocess_image, document.path, target, **self.options).result()
+        except Exception:
+            # Pillow could not read it; the model gets the original
+            return None, 0.0
+        if report['bytesSaved'] > 0:
+            document.model_filename = name
+            document.temporary_files.append(target)
+        document.preprocess = report
+        return None, None
+
+
+def amount_pattern(name):
+    """Regex for amounts such as 1,234.56, $75.00 or 159.84, captured as group ``name``."""
+    return r'[$€£]?\s*(?P<' + name + r'>(?:\d{1,3}(?:,\d{3})+|\d+)\.\d{2})'
+
+
+DATE_FORMATS = ['%Y-%m-%d', '%m/%d/%Y', '%d.%m.%Y', '%B %d, %Y', '%b %d, %Y', '%d %B %Y', '%d %b %Y']
+DATE = r'(\d{4}-\d{2}-\d{2}|\d{1,2}/\d{1,2}/\d{4}|\d{1,2}\.\d{1,2}\.\d{4}|[A-Z][a-z]{2,8}\.? \d{1,2}, \d{4}|\d{1,2} [A-Z][a-z]{2,8} \d{4})'
+
+INVOICE_NUMBER_RE = re.compile(r'invoice\s*(?:no\.?|number|#)\s*[:#]?\s*([A-Z0-9][A-Z0-9-]*)', re.I)
+ORDER_DATE_RE = re.compile(r'(?:invoice\s+date|date\s+of\s+issue|(?<!due )date)\s*:?\s*' + DATE, re.I)
+DUE_DATE_RE = re.compile(r'(?:due\s+date|payment\s+due)\s*:?\s*' + DATE, re.I)
+TOTAL_RES = {
+    key: re.compile(r'^\s*(?:' + label + r')\b.*?' + amount_pattern('amount') + r'\s*$', re.I | re.M)
+    for key, label in [
+        ('subtotal', r'sub\s*-?total'),
+        ('taxAmount', r'(?:sales\s+)?(?:tax|vat)'),
+        ('freight', r'shipping|freight|delivery'),
+        ('total', r'total(?:\s+due)?|amount\s+due|balance\s+due'),
+    ]
+}
+# "<description> <qty> <unit price> <line total>" or "<qty> <description> <unit price> <line total>"
+LINE_ITEM_RES = [
+    re.compile(r'^\s*' + columns + r'\s+' + amount_pattern('price') + r'\s+' + amount_pattern('total') + r'\s*$')
+    for columns in [
+        r'(?P<description>\S.*?)\s+(?P<quantity>\d+(?:\.\d+)?)',
+        r'(?P<quantity>\d+(?:\.\d+)?)\s+(?P<description>\S.*?)',
+    ]
+]
+SUMMARY_LINE_RE = re.compile(r'^\s*(?:sub\s*-?total|total|tax|vat|shipping|freight|balance|amount)\b', re.I)
+
+
+def _amount(text):
+    return float(text.replace(',', ''))
+
+
+def _date(text):
+    text = text.replace('.', '') if re.match(r'[A-Za-z]', text) else text
+    for date_format in DATE_FORMATS:
+        try:
+            return datetime.strptime(text, date_format).date().isoformat()
+        except ValueError:
+            continue
+    return None
+
+
+def _close(a, b):
+    return abs(a - b) <= max(0.011, abs(b) * 0.0005)
+
+
+def parse_invoice_text(text):
+    """Extract invoice fields from plain text. Returns ``(data, confidence)``."""
+    order_match = ORDER_DATE_RE.search(text)
+    due_match = DUE_DATE_RE.search(text)
+    number_match = INVOICE_NUMBER_RE.search(text)
+    order_date = _date(order_match.group(1)) if order_match else None
+    due_date = _date(due_match.group(1)) if due_match else None
+
+    totals = {}
+    for key, pattern in TOTAL_RES.items():
+        matches = list(pattern.finditer(text))
+        if matches:
+            # The last match: "Total" lines near the bottom beat e.g. "Total items" headers
+            totals[key] = _amount(matches[-1].group('amount'))
+
+    line_items = []
+    for line in text.splitlines():
+        if SUMMARY_LINE_RE.match(line):
+            continue
+        for pattern in LINE_ITEM_RES:
+            match = pattern.match(line)
+            if not match:
+                continue
+            quantity = float(match.group('quantity'))
+            price = _amount(match.group('price'))
+            line_total = _amount(match.group('total'))
+            # Only keep rows whose arithmetic checks out; anything else is probably not a line item
+            if _close(quantity * price, line_total):
+                line_items.append({
+                    'productId': f'TEMP_{len(line_items) + 1}',
+                    'description': match.group('description').strip(),
+                    'quantity': int(quantity) if quantity.is_integer() else quantity,
+                    'unitPrice': price,
+                    'lineTotal': line_total
+                })
+                break
+
+    lines_sum = round(sum(item['lineTotal'] for item in line_items), 2)
+    subtotal = totals.get('subtotal', lines_sum)
+    tax_amount = totals.get('taxAmount', 0.0)
+    freight = totals.get('freight', 0.0)
+    total = totals.get('total')
+
+    if order_date and total is not None and line_items:
+        confidence = 0.6
+        confidence += 0.2 if _close(lines_sum, subtotal) else 0.0
+        confidence += 0.2 if _close(subtotal + tax_amount + freight, total) else 0.0
+    else:
+        found = [order_date is not None, total is not None, bool(line_items)]
+        confidence = 0.5 * sum(found) / len(found)
+
+    data = {
+        'orderDate': order_date,
+        'dueDate': due_date or order_date,
+        'invoiceNumber': number_match.group(1) if number_match else None,
+        'customerInfo': {'name': None, 'address': None, 'customerId': None},
+        'lineItems': line_items,
+        'totals': {
+            'subtotal': subtotal,
+            'taxRate': round(tax_amount / subtotal, 5) if subtotal else 0.0,
+            'taxAmount': tax_amount,
+            'freight': freight,
+            'total': total
+        }
+    }
+    return data, round(confidence, 2)
+
+
+class TextLayerStage:
+    """Parse the embedded text of digitally generated PDFs (needs pypdf)."""
+    name = 'text_layer'
+
+    def __call__(self, document):
+        if document.kind != 'pdf':
+            return None, None
+        try:
+            from pypdf import PdfReader
+        except ImportError:
+            return None, None
+        try:
+            reader = PdfReader(document.path)
+            document.text = '\n'.join(
+                page.extract_text() or '' for page in reader.pages[:MAX_TEXT_PAGES]
+            )
+        except Exception:
+            # Encrypted or malformed PDFs are left to the model
+            return None, 0.0
+        if not document.text.strip():
+            return None, 0.0  # scanned PDF without a text layer
+        return parse_invoice_text(document.text)
+
+
+def _first(values):
+    return next((value for value in values if value not in (None, '', {})), None)
+
+
+def merge_pages(pages):
+    """Combine per-page extraction results (in page order) into one invoice.
+
+    Header fields repeat on every page, so each is taken from the first
+    page that has it. Line items are concatenated, renumbering temporary
+    product IDs so pages do not collide. Totals come from the last page
+    that states a total and are reconciled with the line items: the
+    subtotal is the sum of the lines (the stated one is kept if it agrees),
+    tax follows the stated rate and the total is recomputed. Returns
+    ``(data, confidence, reconciliation)``, the confidence being the
+    weakest page's.
+    """
+    line_items = []
+    for page in pages:
+        for item in page.get('lineItems') or []:
+            item = dict(item)
+            if isinstance(item.get('productId'), str) and TEMP_PRODUCT_RE.fullmatch(item['productId']):
+                item['productId'] = f'TEMP_{len(line_items) + 1}'
+            line_items.append(item)
+
+    customers = [page.get('customerInfo') or {} for page in pages]
+    customer_info = {key: _first(customer.get(key) for customer in customers)
+                     for key in ('name', 'address', 'customerId')}
+
+    stated = _first(
+        page.get('totals') for page in reversed(pages) if (page.get('totals') or {}).get('total') is not None
+    ) or _first(page.get('totals') for page in reversed(pages)) or {}
+    lines_sum = round(sum(item.get('lineTotal') or 0.0 for item in line_items), 2)
+    stated_subtotal = stated.get('subtotal')
+    subtotal = stated_subtotal if stated_subtotal is not None and _close(stated_subtotal, lines_sum) else lines_sum
+    tax_amount = stated.get('taxAmount') or 0.0
+    tax_rate = stated.get('taxRate')
+    if tax_rate is None:
+        tax_rate = round(tax_amount / stated_subtotal, 5) if stated_subtotal else 0.0
+    if subtotal != stated_subtotal:
+        tax_amount = round(subtotal * tax_rate, 2)
+    freight = stated.get('freight') or 0.0
+    total = round(subtotal + tax_amount + freight, 2)
+
+    order_date = _first(page.get('orderDate') for page in pages)
+    data = {
+        'orderDate': order_date,
+        'dueDate': _first(page.get('dueDate') for page in pages) or order_date,
+        'invoiceNumber': _first(page.get('invoiceNumber') for page in pages),
+        'customerInfo': customer_info,
+        'lineItems': line_items,
+        'totals': {
+            'subtotal': subtotal,
+            'taxRate': tax_rate,
+            'taxAmount': tax_amount,
+            'freight': freight,
+            'total': total
+        }
+    }
+    confidences = [page.get('confidence') for page in pages if page.get('confidence') is not None]
+    reconciliation = {
+        'linesSubtotal': lines_sum,
+        'statedSubtotal': stated_subtotal,
+        'statedTotal': stated.get('total'),
+        'adjusted': stated.get('total') is None or not _close(stated['total'], total)
+    }
+    return data, min(confidences) if confidences else None, reconciliation
+
+
+class ModelStage:
+    """The heavy extractor, ``extract_fn(filename)``; its result is always accepted.
+
+    With ``page_workers``, PDFs of at least ``min_pages`` pages are split
+    into single-page PDFs (in ``subfolder``, removed after the run) that up
+    to ``page_workers`` threads extract at once; the results are merged
+    with ``merge_pages``. Threads suit a model behind an API, where each
+    page waits on the network. Only an ``extract_fn`` with ``per_page =
+    True`` is given pages: one that returns a whole invoice whatever file
+    it is given (like the simulated model) would repeat it for every page.
+    """
+    name = 'model'
+
+    def __init__(self, extract_fn, page_workers=0, min_pages=2, subfolder='pages'):
+        self.extract_fn = extract_fn
+        self.page_workers = page_workers
+        self.min_pages = min_pages
+        self.subfolder = subfolder
+        self._executor = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def _pool(self):
+        with self._lock:
+            if self._pid != os.getpid():
+                self._executor = ThreadPoolExecutor(max_workers=self.page_workers, thread_name_prefix='page')
+                self._pid = os.getpid()
+            return self._executor
+
+    def _split(self, document):
+        """Write each page of the PDF to its own file; returns their names, or None for short documents."""
+        from pypdf import PdfReader, PdfWriter
+
+        reader = PdfReader(document.path)
+        if len(reader.pages) < self.min_pages:
+            return None
+        stem = os.path.join(self.subfolder, uuid.uuid4().hex)
+        os.makedirs(os.path.join(document.folder, self.subfolder), exist_ok=True)
+        names = []
+        for number, page in enumerate(reader.pages, start=1):
+            writer = PdfWriter()
+            writer.add_page(page)
+            name = f'{stem}.page{number}.pdf'
+            path = os.path.join(document.folder, name)
+            document.temporary_files.append(path)
+            with open(path, 'wb') as f:
+                writer.write(f)
+            names.append(name)
+        return names
+
+    def _extract_page(self, name):
+        started = time.perf_counter()
+        result = self.extract_fn(name)
+        return result, time.perf_counter() - started
+
+    def __call__(self, document):
+        names = None
+        if self.page_workers and document.kind == 'pdf' and getattr(self.extract_fn, 'per_page', False):
+            try:
+                names = self._split(document)
+            except Exception:
+                # No pypdf, or a PDF it cannot split: extract it whole
+                names = None
+        if not names:
+            result = self.extract_fn(document.model_filename)
+            return result, result.get('confidence')
+
+        pages = list(self._pool().map(self._extract_page, names))
+        data, confidence, reconciliation = merge_pages([result for result, _ in pages])
+        document.pages = [
+            {
+                'page': number,
+                'seconds': round(seconds, 4),
+                'lineItems': len(result.get('lineItems') or []),
+                'confidence': result.get('confidence')
+            }
+            for number, (result, seconds) in enumerate(pages, start=1)
+        ]
+        document.reconciliation = reconciliation
+        usage = [result['llm'] for result, _ in pages if result.get('llm')]
+        if usage:
+            data['llm'] = {
+                'model': usage[0]['model'],
+                'latency': max(call['latency'] for call in usage),
+                'promptTokens': sum(call['promptTokens'] for call in usage),
+                'completionTokens': sum(call['completionTokens'] for call in usage),
+                'attempts': sum(call['attempts'] for call in usage)
+            }
+        return data, confidence
+
+
+class ExtractionPipeline:
+    def __init__(self, stages, folder, min_confidence=0.8):
+        self.stages = stages
+        self.folder = folder
+        self.min_confidence = min_confidence
+
+    def run(self, filename):
+        """Extract ``filename`` (in ``folder``) with the first stage confident enough, or the last one."""
+        document = Document(self.folder, filename)
+        started = time.perf_counter()
+        timings = []
+        result = None
+        try:
+            for position, stage in enumerate(self.stages):
+                stage_started = time.perf_counter()
+                data, confidence = stage(document)
+                final = position == len(self.stages) - 1
+                accepted = data is not None and (final or (confidence or 0) >= self.min_confidence)
+                timings.append({
+                    'stage': stage.name,
+                    'seconds': round(time.perf_counter() - stage_started, 4),
+                    'confidence': confidence,
+                    'accepted': accepted
+                })
+                if accepted:
+                    result = dict(data, confidence=confidence)
+                    break
+        finally:
+            for path in document.temporary_files:
+                if os.path.exists(path):
+                    os.remove(path)
+
+        result['processingTime'] = round(time.perf_counter() - started, 4)
+        result['pipeline'] = {'fileType': document.kind, 'extractor': timings[-1]['stage'], 'stages': timings}
+        if document.preprocess is not None:
+            result['pipeline']['preprocess'] = document.preprocess
+        if document.pages is not None:
+            result['pipeline']['pages'] = document.pages
+            result['pipeline']['reconciliation'] = document.reconciliation
+        return result
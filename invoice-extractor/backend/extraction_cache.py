@@ -0,0 +1,110 @@
+"""Content-hash cache for extraction results.
+
+Results are keyed by the SHA-256 of the uploaded bytes plus the extractor
+version, so re-uploading the same invoice skips extraction entirely while a
+new extractor release naturally misses. Lookups go through a small in-memory
+LRU first and then the ``extraction_cache`` table, which survives restarts and
+is trimmed to ``EXTRACTION_CACHE_DISK_BYTES`` by least-recent use.
+
+The extractor version and the in-memory tier belong to the app (in
+``app.extensions['extraction_cache']``), so apps with different extractors
+never answer from each other's results.
+"""
+import json
+import threading
+from collections import OrderedDict
+from datetime import datetime
+
+from flask import current_app
+
+
+class ExtractionCache:
+    def __init__(self, db, entry_model, app=None, extractor_version=None):
+        self.db = db
+        self.entry_model = entry_model
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app, extractor_version)
+
+    def init_app(self, app, extractor_version):
+        app.extensions['extraction_cache'] = {'version': extractor_version, 'memory': OrderedDict()}
+
+    @property
+    def extractor_version(self):
+        return current_app.extensions['extraction_cache']['version']
+
+    @property
+    def _memory(self):
+        return current_app.extensions['extraction_cache']['memory']
+
+    def key(self, content_hash):
+        return f"{self.extractor_version}:{content_hash}"
+
+    def get(self, content_hash):
+        """Return ``(result, tier)`` for a cached extraction, or ``(None, None)``."""
+        key = self.key(content_hash)
+
+        with self._lock:
+            payload = self._memory.get(key)
+            if payload is not None:
+                self._memory.move_to_end(key)
+                return json.loads(payload), 'memory'
+
+        entry = self.db.session.get(self.entry_model, key)
+        if entry is None:
+            return None, None
+
+        entry.LastAccessedAt = datetime.utcnow()
+        entry.HitCount = (entry.HitCount or 0) + 1
+        self.db.session.commit()
+        self._remember(key, entry.Result)
+        return json.loads(entry.Result), 'disk'
+
+    def set(self, content_hash, result):
+        key = self.key(content_hash)
+        payload = json.dumps(result)
+        self._remember(key, payload)
+
+        entry = self.db.session.get(self.entry_model, key)
+        if entry is None:
+            entry = self.entry_model(
+                CacheKey=key,
+                ContentHash=content_hash,
+                ExtractorVersion=self.extractor_version
+            )
+            self.db.session.add(entry)
+        entry.Result = payload
+        entry.Size = len(payload)
+        entry.LastAccessedAt = datetime.utcnow()
+        self.db.session.commit()
+        self._evict()
+
+    def _remember(self, key, payload):
+        with self._lock:
+            memory = self._memory
+            memory[key] = payload
+            memory.move_to_end(key)
+            while len(memory) > current_app.config['EXTRACTION_CACHE_SIZE']:
+                memory.popitem(last=False)
+
+    def _evict(self):
+        """Drop least-recently used disk entries until the tier fits its byte budget."""
+        model = self.entry_model
+        budget = current_app.config['EXTRACTION_CACHE_DISK_BYTES']
+        total = self.db.session.query(self.db.func.sum(model.Size)).scalar() or 0
+        if total <= budget:
+            return
+
+        excess = total - budget
+        victims = []
+        for key, size in self.db.session.query(model.CacheKey, model.Size).order_by(model.LastAccessedAt):
+            victims.append(key)
+            excess -= size or 0
+            if excess <= 0:
+                break
+
+        model.query.filter(model.CacheKey.in_(victims)).delete(synchronize_session=False)
+        self.db.session.commit()
+        with self._lock:
+            for key in victims:
+                self._memory.pop(key, None)
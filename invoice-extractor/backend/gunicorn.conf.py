@@ -0,0 +1,65 @@
+"""Gunicorn settings for ``gunicorn -c gunicorn.conf.py wsgi:app``.
+
+The master imports and builds the app once (``preload_app``) and forks
+workers from it, so a new worker, whether started at boot, after a crash or
+when scaling up, serves requests within milliseconds instead of importing
+everything again. Thread pools, process pools, LLM clients and database
+connections are all created on first use in each worker.
+"""
+import os
+
+bind = os.environ.get('BIND', '0.0.0.0:5001')
+workers = int(os.environ.get('WEB_CONCURRENCY', 2 * (os.cpu_count() or 1) + 1))
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+# Synchronous extraction of a long PDF can take a while
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 120))
+preload_app = os.environ.get('GUNICORN_PRELOAD', 'true').lower() == 'true'
+accesslog = '-'
+
+
+def post_fork(server, worker):
+    # Connections opened in the master (none normally) must not be shared by workers
+    if server.cfg.preload_app:
+        from wsgi import app
+        from app import db
+
+        with app.app_context():
+            for engine in db.engines.values():
+                engine.dispose(close=False)
+
+
+def _release_jobs(worker_pid=None):
+    from wsgi import app
+    from app import db, job_queue
+
+    with app.app_context():
+        released = job_queue.release(worker_pid)
+        # Workers forked from the master later must not inherit its connection
+        for engine in db.engines.values():
+            engine.dispose()
+    return released
+
+
+def when_ready(server):
+    # No worker runs yet, so jobs left by the last run belong to no one. A
+    # master re-executed for an upgrade (USR2) still has the old workers running theirs
+    if not server.master_pid:
+        server.log.info('Released %d extraction jobs left by the last run', _release_jobs())
+
+
+def child_exit(server, worker):
+    # Runs in the master for every worker that exits, crashed or not; its
+    # unfinished jobs go to the next worker that recovers, e.g. its replacement
+    released = _release_jobs(worker.pid)
+    if released:
+        server.log.info('Released %d extraction jobs of worker %s', released, worker.pid)
+
+
+def post_worker_init(worker):
+    # Every worker claims the jobs no live worker owns; each job goes to one of them
+    from app import job_queue
+
+    with worker.wsgi.app_context():
+        recovered = job_queue.recover()
+    if recovered:
+        worker.log.info('Recovered %d unfinished extraction jobs', recovered)
@@ -0,0 +1,113 @@
+"""Block-based primary key allocation for customers and products.
+
+``MAX(id) + 1`` is racy between concurrent saves and costs a query per new
+row. Instead each process reserves a block of IDs from the ``id_sequences``
+table in its own short transaction (an UPDATE, so the database serializes
+reservations across processes) and hands them out from memory.
+
+Reservations commit independently of the caller's transaction, on their own
+connection: ``allocate()`` every ID a save will need *before* it starts
+writing and keep them for the request, so a reservation never waits on the
+caller's own write lock. Blocks are shared by all threads of a process, so an
+ID is only the request's once ``allocate()`` has returned it. IDs from a
+rolled-back save are simply skipped.
+"""
+import threading
+
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+
+class IdAllocator:
+    def __init__(self, db, sequence_model, block_size=50):
+        self.db = db
+        self.table = sequence_model.__table__
+        self.block_size = block_size
+        self._columns = {}
+        self._blocks = {}  # name -> [next id, end (exclusive)]
+        self._lock = threading.Lock()
+
+    def register(self, name, column):
+        """Track a sequence seeded from ``MAX(column) + 1`` on first use."""
+        self._columns[name] = column
+        self._blocks[name] = [0, 0]
+
+    def available(self, name):
+        start, end = self._blocks[name]
+        return end - start
+
+    def next_id(self, name):
+        return self.allocate(name, 1)[0]
+
+    def allocate(self, name, count):
+        with self._lock:
+            if self.available(name) < count:
+                self._reserve_block(name, max(self.block_size, count))
+            block = self._blocks[name]
+            ids = list(range(block[0], block[0] + count))
+            block[0] += count
+            return ids
+
+    def observe(self, name, *used_ids):
+        """Record IDs chosen by the caller so the sequence never hands them out.
+
+        Only this process's block and the shared sequence are adjusted; a block
+        another worker already holds can still contain one of ``used_ids``.
+        """
+        if not used_ids:
+            return
+        highest = max(used_ids)
+        table = self.table
+        with self.db.engine.begin() as conn:
+            self._seed(conn, name)
+            conn.execute(
+                table.update()
+                .where(table.c.Name == name, table.c.NextValue <= highest)
+                .values(NextValue=highest + 1)
+            )
+        with self._lock:
+            block = self._blocks[name]
+            inside = [used_id for used_id in used_ids if block[0] <= used_id < block[1]]
+            if inside:
+                block[0] = max(inside) + 1
+
+    def first_free(self, conn, name):
+        """Lowest ID above every existing row and every block handed out so far.
+
+        For bulk loads that assign IDs themselves inside ``conn``'s
+        transaction; follow up with ``observe()`` once it has committed.
+        """
+        column = self._columns[name]
+        highest = conn.execute(self.db.select(self.db.func.max(column))).scalar() or 0
+        next_value = conn.execute(
+            self.db.select(self.table.c.NextValue).where(self.table.c.Name == name)
+        ).scalar() or 0
+        return max(highest + 1, next_value)
+
+    def _seed(self, conn, name):
+        # Start the sequence after any rows that already exist; a no-op once
+        # the sequence row is there (or another process created it first)
+        column = self._columns[name]
+        conn.execute(
+            sqlite_insert(self.table).from_select(
+                ['Name', 'NextValue'],
+                # WHERE true keeps SQLite from parsing ON CONFLICT as a join constraint
+                self.db.select(self.db.literal(name), self.db.func.coalesce(self.db.func.max(column), 0) + 1)
+                .where(self.db.true())
+            ).on_conflict_do_nothing()
+        )
+
+    def _reserve_block(self, name, size):
+        table = self.table
+        with self.db.engine.begin() as conn:
+            self._seed(conn, name)
+            # The UPDATE takes the write lock, so the read below sees our own
+            # increment and no other process can reserve the same range
+            conn.execute(
+                table.update()
+                .where(table.c.Name == name)
+                .values(NextValue=table.c.NextValue + size)
+            )
+            end = conn.execute(
+                self.db.select(table.c.NextValue).where(table.c.Name == name)
+            ).scalar()
+        self._blocks[name] = [end - size, end]
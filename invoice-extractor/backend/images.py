@@ -0,0 +1,63 @@
+"""Shrinking invoice photos before they are sent to the extractor.
+
+Phone photos arrive as multi-megapixel JPEGs, far more than a model needs
+to read an invoice. ``preprocess_image`` writes a smaller copy next to the
+original (which is kept as uploaded):
+
+* JPEGs are decoded in draft mode, letting the decoder scale down by 1/2,
+  1/4 or 1/8 instead of decoding every pixel and resizing afterwards
+* the EXIF orientation is applied, so sideways photos arrive upright
+* the image is converted to grayscale and resized to fit ``max_side``
+* the copy is re-encoded (JPEG stays JPEG, PNG stays PNG) with ``dpi``
+  recorded in the file
+
+Pillow releases the GIL while decoding, resizing and encoding, so a thread
+pool runs several images in parallel.
+"""
+import os
+
+DEFAULT_MAX_SIDE = 1600
+DEFAULT_DPI = 150
+DEFAULT_QUALITY = 80
+
+
+def preprocess_image(source, target, max_side=DEFAULT_MAX_SIDE, dpi=DEFAULT_DPI, quality=DEFAULT_QUALITY,
+                     grayscale=True):
+    """Write a downscaled copy of the image at ``source`` to ``target``.
+
+    Returns a dict with the original and new pixel sizes and byte counts.
+    If the copy would not be smaller, it is removed again and the sizes
+    reported are the original's.
+    """
+    from PIL import Image, ImageOps
+
+    mode = 'L' if grayscale else 'RGB'
+    with Image.open(source) as image:
+        image_format = image.format
+        original_size = image.size
+        if image_format == 'JPEG':
+            # Only picks a decoder scale; the exact size is set by thumbnail()
+            image.draft(mode, (max_side, max_side))
+        image = ImageOps.exif_transpose(image)
+        if image.mode != mode:
+            image = image.convert(mode)
+        image.thumbnail((max_side, max_side), Image.LANCZOS)
+
+        if image_format == 'JPEG':
+            image.save(target, 'JPEG', quality=quality, optimize=True, dpi=(dpi, dpi))
+        else:
+            image.save(target, 'PNG', optimize=True, dpi=(dpi, dpi))
+
+    original_bytes = os.path.getsize(source)
+    new_bytes = os.path.getsize(target)
+    size = image.size
+    if new_bytes >= original_bytes:
+        os.remove(target)
+        new_bytes, size = original_bytes, original_size
+    return {
+        'originalSize': list(original_size),
+        'size': list(size),
+        'originalBytes': original_bytes,
+        'bytes': new_bytes,
+        'bytesSaved': original_bytes - new_bytes,
+    }
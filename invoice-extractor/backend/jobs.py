@@ -0,0 +1,234 @@
+"""Background extraction jobs.
+
+Uploads submitted in async mode are recorded in the ``extraction_jobs`` table
+and handed to a bounded worker pool, so the request returns as soon as the
+file is on disk. Job rows are committed before they are dispatched, which
+means work that was accepted survives a restart and is picked up again by
+``JobQueue.recover()``.
+
+Every unfinished job is owned by the process that accepted or recovered it
+(``WorkerPID``). When a process exits, crashed or not, ``release()`` frees its
+jobs, and ``recover()`` in any live process claims free jobs in one UPDATE, so
+each job runs in exactly one process.
+
+Each app has its own pools, slots and backlog, in ``app.extensions['job_queue']``;
+worker threads are handed the app their job belongs to.
+"""
+import json
+import os
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from datetime import datetime
+
+from flask import current_app
+from sqlalchemy import inspect
+
+UNFINISHED = ('queued', 'running')
+
+class QueueFullError(Exception):
+    """Raised when the number of pending jobs has reached the configured limit."""
+
+
+class _State:
+    """One app's worker pools and the jobs waiting for a slot."""
+
+    def __init__(self):
+        self.dispatcher = None
+        self.processes = None
+        self.slots = None
+        self.pending = 0
+        self.backlog = deque()  # (job_id, stored_name) recovered beyond the queue's capacity
+
+
+class JobQueue:
+    def __init__(self, db, job_model, extract_fn, on_result=None, init_worker=None, app=None):
+        self.db = db
+        self.job_model = job_model
+        self.extract_fn = extract_fn
+        # Called as on_result(job, result) inside an app context once a job
+        # completes, e.g. to populate the extraction cache.
+        self.on_result = on_result
+        # Called as init_worker(config) in each process of the process
+        # executor, which may not have inherited the parent's state
+        self.init_worker = init_worker
+        self._lock = threading.Lock()
+        self._states = []  # every app's state, for shutdown()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        state = _State()
+        app.extensions['job_queue'] = state
+        with self._lock:
+            self._states.append(state)
+
+    def _start(self):
+        """Create the current app's worker pool on first use so importing the app stays cheap."""
+        config = current_app.config
+        state = current_app.extensions['job_queue']
+        with self._lock:
+            if state.dispatcher is not None:
+                return state
+            workers = config['EXTRACTION_WORKERS']
+            # Dispatcher threads own the job lifecycle (status updates, result
+            # persistence); in process mode they only wait on the process pool.
+            state.dispatcher = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='extract')
+            if config['EXTRACTION_EXECUTOR'] == 'process':
+                state.processes = ProcessPoolExecutor(
+                    max_workers=workers,
+                    initializer=self.init_worker,
+                    initargs=(dict(config),)
+                )
+            state.slots = threading.BoundedSemaphore(config['EXTRACTION_QUEUE_SIZE'])
+            return state
+
+    @property
+    def pending(self):
+        return current_app.extensions['job_queue'].pending
+
+    def submit(self, stored_name, original_name, file_size, content_hash=None):
+        """Persist a new job and dispatch it. Raises QueueFullError when saturated."""
+        state = self._start()
+        if not state.slots.acquire(blocking=False):
+            raise QueueFullError('Extraction queue is full, please retry later')
+
+        try:
+            job = self.job_model(
+                OriginalName=original_name,
+                StoredName=stored_name,
+                FileSize=file_size,
+                ContentHash=content_hash,
+                WorkerPID=os.getpid()
+            )
+            self.db.session.add(job)
+            self.db.session.commit()
+        except Exception:
+            state.slots.release()
+            raise
+
+        self._dispatch(current_app._get_current_object(), job.JobID, stored_name)
+        return job
+
+    def ensure(self):
+        """Add the WorkerPID column to an ``extraction_jobs`` table created before it existed."""
+        table = self.job_model.__table__
+        with self.db.engine.begin() as conn:
+            columns = {column['name'] for column in inspect(conn).get_columns(table.name)}
+            if 'WorkerPID' not in columns:
+                conn.exec_driver_sql(f'ALTER TABLE {table.name} ADD COLUMN WorkerPID INTEGER')
+                for index in table.indexes:
+                    index.create(conn, checkfirst=True)
+
+    def release(self, worker_pid=None):
+        """Free the unfinished jobs of a process that has exited, or of every process.
+
+        Called where no process can still be running them: for one worker
+        once it is gone, for all before any worker starts. Returns how many
+        jobs the next ``recover()`` can claim.
+        """
+        table = self.job_model.__table__
+        query = table.update().where(table.c.Status.in_(UNFINISHED))
+        if worker_pid is not None:
+            query = query.where(table.c.WorkerPID == worker_pid)
+        with self.db.engine.begin() as conn:
+            return conn.execute(query.values(WorkerPID=None, Status='queued', StartedAt=None)).rowcount
+
+    def recover(self):
+        """Claim and dispatch the unfinished jobs ``release()`` freed.
+
+        Jobs beyond the queue's capacity wait in a backlog and each takes the
+        slot of a job that finishes, ahead of new submissions.
+        """
+        app = current_app._get_current_object()
+        state = self._start()
+        table = self.job_model.__table__
+        claimed = self.db.session.execute(
+            table.update()
+            .where(table.c.WorkerPID.is_(None), table.c.Status.in_(UNFINISHED))
+            .values(WorkerPID=os.getpid(), Status='queued', StartedAt=None)
+            .returning(table.c.JobID, table.c.StoredName, table.c.CreatedAt)
+        ).all()
+        self.db.session.commit()
+        dispatch = [(job_id, stored_name) for job_id, stored_name, _ in sorted(claimed, key=lambda row: row[2])]
+
+        for job_id, stored_name in dispatch:
+            # Under the lock, so a job finishing meanwhile either frees the
+            # slot before this looks or finds the job in the backlog
+            with self._lock:
+                free = state.slots.acquire(blocking=False)
+                if not free:
+                    state.backlog.append((job_id, stored_name))
+            if free:
+                self._dispatch(app, job_id, stored_name)
+        return len(dispatch)
+
+    def _dispatch(self, app, job_id, stored_name):
+        state = app.extensions['job_queue']
+        with self._lock:
+            state.pending += 1
+        state.dispatcher.submit(self._run, app, job_id, stored_name)
+
+    def _update(self, app, job_id, result=None, **fields):
+        with app.app_context():
+            job = self.db.session.get(self.job_model, job_id)
+            if job is None:
+                return
+            for name, value in fields.items():
+                setattr(job, name, value)
+            self.db.session.commit()
+            if result is not None and self.on_result is not None:
+                self.on_result(job, result)
+
+    def _run(self, app, job_id, stored_name):
+        state = app.extensions['job_queue']
+        try:
+            self._update(app, job_id, Status='running', StartedAt=datetime.utcnow())
+            if state.processes is not None:
+                result = state.processes.submit(self.extract_fn, stored_name).result()
+            else:
+                result = self.extract_fn(stored_name)
+        except Exception as e:
+            self._update(app, job_id, Status='failed', Error=str(e), FinishedAt=datetime.utcnow())
+        else:
+            self._update(app, job_id, result=result, Status='completed', Result=json.dumps(result),
+                         FinishedAt=datetime.utcnow())
+        finally:
+            with self._lock:
+                state.pending -= 1
+                recovered = state.backlog.popleft() if state.backlog else None
+                if recovered is None:
+                    state.slots.release()
+            if recovered is not None:
+                # The finished job's slot passes to the next recovered one
+                self._dispatch(app, *recovered)
+
+    def shutdown(self, wait=True):
+        with self._lock:
+            states = list(self._states)
+        for state in states:
+            if state.dispatcher is not None:
+                state.dispatcher.shutdown(wait=wait)
+            if state.processes is not None:
+                state.processes.shutdown(wait=wait)
+
+
+def serialize_job(job):
+    data = {
+        'jobId': job.JobID,
+        'status': job.Status,
+        'fileInfo': {
+            'originalName': job.OriginalName,
+            'filename': job.StoredName,
+            'size': job.FileSize,
+            'sha256': job.ContentHash
+        },
+        'createdAt': job.CreatedAt.isoformat() if job.CreatedAt else None,
+        'startedAt': job.StartedAt.isoformat() if job.StartedAt else None,
+        'finishedAt': job.FinishedAt.isoformat() if job.FinishedAt else None
+    }
+    if job.Status == 'completed' and job.Result:
+        data['extractedData'] = json.loads(job.Result)
+    if job.Status == 'failed':
+        data['error'] = job.Error
+    return data
@@ -0,0 +1,336 @@
+"""Pooled, rate-limited client for the extraction model.
+
+``LLMClient`` talks to any OpenAI-compatible chat completions API (set
+``base_url`` for a proxy, another provider or a local stub server). Each
+process gets one ``httpx.Client`` whose connection pool is reused by every
+call, and a semaphore caps the requests in flight at ``max_concurrency``.
+
+Two token buckets keep the process under the provider's quota: one for
+requests per minute and one for tokens per minute. Token usage is not known
+until a response arrives, so a call reserves an estimate up front and the
+bucket is corrected with the reported usage afterwards.
+
+429 and 5xx responses (and connection errors and timeouts) are retried with
+full-jitter exponential backoff, honouring ``Retry-After``. A 429 also
+pauses the request bucket for every thread, so callers back off together
+instead of each hammering the API with its own retries.
+
+The limits are per process: with several worker processes, divide the quota
+between them.
+
+``InvoiceModel`` turns an uploaded file into the same result shape as
+``simulate_invoice_extraction`` using an ``LLMClient``.
+"""
+import base64
+import json
+import os
+import random
+import threading
+import time
+
+from uploads import SNIFF_BYTES, sniff_file_type
+
+RETRY_STATUSES = (408, 409, 429)
+CHARS_PER_TOKEN = 4
+IMAGE_TOKENS = 1000
+MAX_TEXT_CHARS = 40000
+
+
+class LLMError(Exception):
+    """A request that failed for good (non-retryable status or retries exhausted)."""
+
+    def __init__(self, message, status=None, attempts=1):
+        super().__init__(message)
+        self.status = status
+        self.attempts = attempts
+
+
+class TokenBucket:
+    """Thread-safe token bucket refilled at ``rate`` tokens per second up to ``capacity``.
+
+    ``acquire`` reserves tokens immediately, letting the balance go
+    negative (also for amounts above ``capacity``), and sleeps until the
+    reservation is covered, so waiting callers are served in order without
+    polling.
+    """
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        # Nothing accrues while paused
+        start = max(self.updated, self.paused_until)
+        if now > start:
+            self.tokens = min(self.capacity, self.tokens + (now - start) * self.rate)
+        self.updated = max(self.updated, now)
+
+    def reserve(self, amount=1):
+        """Take ``amount`` tokens and return how many seconds to wait before using them."""
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            self.tokens -= amount
+            ready = max(now, self.paused_until)
+            if self.tokens < 0:
+                ready += -self.tokens / self.rate
+            return ready - now
+
+    def acquire(self, amount=1):
+        wait = self.reserve(amount)
+        if wait > 0:
+            time.sleep(wait)
+
+    def adjust(self, amount):
+        """Give back (positive) or take (negative) tokens once the real cost is known."""
+        with self._lock:
+            self._refill(time.monotonic())
+            self.tokens = min(self.capacity, self.tokens + amount)
+
+    def pause(self, seconds):
+        """Stop refilling and serving for ``seconds``; outstanding reservations are kept."""
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            self.paused_until = max(self.paused_until, now + seconds)
+            self.tokens = min(self.tokens, 0)
+
+
+class LLMClient:
+    def __init__(self, api_key, model, base_url=None, max_concurrency=8, requests_per_minute=None,
+                 tokens_per_minute=None, max_retries=5, backoff_base=0.5, backoff_max=30.0, timeout=60.0,
+                 burst_seconds=0.1):
+        self.api_key = api_key
+        self.model = model
+        self.base_url = base_url
+        self.max_concurrency = max_concurrency
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.timeout = timeout
+        self.burst_seconds = burst_seconds
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def _setup(self):
+        """Per-process state: the pooled client, the semaphore, the buckets and the counters.
+
+        Rebuilt after a fork so a worker process never shares the parent's
+        sockets or locks.
+        """
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            import httpx
+            from openai import OpenAI
+
+            http_client = httpx.Client(
+                limits=httpx.Limits(max_connections=self.max_concurrency,
+                                    max_keepalive_connections=self.max_concurrency),
+                timeout=self.timeout
+            )
+            # Retries are done here, where they can respect the buckets
+            self._client = OpenAI(api_key=self.api_key, base_url=self.base_url,
+                                  http_client=http_client, max_retries=0)
+            self._slots = threading.BoundedSemaphore(self.max_concurrency)
+            self._requests = self._bucket(self.requests_per_minute)
+            self._tokens = self._bucket(self.tokens_per_minute)
+            self._stats_lock = threading.Lock()
+            self._stats = {'calls': 0, 'failures': 0, 'attempts': 0, 'rateLimited': 0, 'serverErrors': 0,
+                           'promptTokens': 0, 'completionTokens': 0, 'latencySeconds': 0.0}
+            self._pid = os.getpid()
+
+    def _bucket(self, per_minute):
+        if not per_minute:
+            return None
+        rate = per_minute / 60.0
+        # Small bursts only: a full bucket on top of the steady rate would
+        # overrun quotas that are enforced over short windows
+        return TokenBucket(rate, max(1.0, rate * self.burst_seconds))
+
+    def _count(self, **deltas):
+        with self._stats_lock:
+            for key, delta in deltas.items():
+                self._stats[key] += delta
+
+    def stats(self):
+        """Totals for this process since it started."""
+        self._setup()
+        with self._stats_lock:
+            return dict(self._stats)
+
+    @staticmethod
+    def estimate_tokens(messages, max_tokens):
+        tokens = max_tokens
+        for message in messages:
+            content = message['content']
+            parts = content if isinstance(content, list) else [{'type': 'text', 'text': content}]
+            for part in parts:
+                tokens += len(part['text']) // CHARS_PER_TOKEN if part['type'] == 'text' else IMAGE_TOKENS
+        return tokens
+
+    def _backoff(self, attempt, retry_after=None):
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+        if retry_after is not None:
+            # Spread callers out after the server's delay rather than all at once
+            delay = min(self.backoff_max, retry_after) + random.uniform(0, self.backoff_base)
+        return delay
+
+    @staticmethod
+    def _retry_after(response):
+        try:
+            return float(response.headers.get('retry-after'))
+        except (TypeError, ValueError):
+            return None
+
+    def complete(self, messages, max_tokens=1024, **options):
+        """Run one chat completion, waiting for quota and retrying transient failures.
+
+        Returns a dict with ``content``, ``latency`` (seconds for the
+        successful attempt), ``promptTokens``, ``completionTokens`` and
+        ``attempts``. Raises ``LLMError``.
+        """
+        import openai
+
+        self._setup()
+        estimate = self.estimate_tokens(messages, max_tokens)
+        for attempt in range(self.max_retries + 1):
+            if self._requests:
+                self._requests.acquire()
+            if self._tokens:
+                self._tokens.acquire(estimate)
+
+            retry_after = None
+            with self._slots:
+                started = time.perf_counter()
+                try:
+                    response = self._client.chat.completions.create(
+                        model=self.model, messages=messages, max_tokens=max_tokens, **options
+                    )
+                    error = None
+                except openai.APIStatusError as e:
+                    error = e
+                    retryable = e.status_code in RETRY_STATUSES or e.status_code >= 500
+                    retry_after = self._retry_after(e.response)
+                except (openai.APIConnectionError, openai.APITimeoutError) as e:
+                    error = e
+                    retryable = True
+                latency = time.perf_counter() - started
+            self._count(attempts=1)
+
+            if error is None:
+                usage = response.usage
+                prompt_tokens = usage.prompt_tokens if usage else 0
+                completion_tokens = usage.completion_tokens if usage else 0
+                if self._tokens and usage:
+                    self._tokens.adjust(estimate - prompt_tokens - completion_tokens)
+                self._count(calls=1, promptTokens=prompt_tokens, completionTokens=completion_tokens,
+                            latencySeconds=latency)
+                return {
+                    'content': response.choices[0].message.content,
+                    'latency': round(latency, 4),
+                    'promptTokens': prompt_tokens,
+                    'completionTokens': completion_tokens,
+                    'attempts': attempt + 1
+                }
+
+            status = getattr(error, 'status_code', None)
+            if status == 429:
+                self._count(rateLimited=1)
+            elif status is not None and status >= 500:
+                self._count(serverErrors=1)
+            if self._tokens:
+                self._tokens.adjust(estimate)  # nothing was used
+            if not retryable or attempt == self.max_retries:
+                self._count(calls=1, failures=1)
+                raise LLMError(str(error), status=status, attempts=attempt + 1) from error
+
+            delay = self._backoff(attempt, retry_after)
+            if status == 429 and self._requests:
+                # Everyone waits, not just this caller
+                self._requests.pause(delay)
+            else:
+                time.sleep(delay)
+
+
+EXTRACTION_PROMPT = """You extract data from invoices. Reply with one JSON object and nothing else:
+{"orderDate": "YYYY-MM-DD", "dueDate": "YYYY-MM-DD", "invoiceNumber": string,
+ "customerInfo": {"name": string, "address": string, "customerId": integer or null},
+ "lineItems": [{"description": string, "quantity": number, "unitPrice": number, "lineTotal": number}],
+ "totals": {"subtotal": number, "taxRate": number, "taxAmount": number, "freight": number, "total": number},
+ "confidence": number between 0 and 1}
+Use null for anything that is not on the invoice. taxRate is a fraction (0.0625 for 6.25%)."""
+
+IMAGE_MIME_TYPES = {'png': 'image/png', 'jpeg': 'image/jpeg'}
+
+
+class InvoiceModel:
+    """Extract an uploaded file with an ``LLMClient``: ``InvoiceModel(client, folder)(filename)``.
+
+    Images are sent inline; PDFs are sent as their text layer, so scanned
+    PDFs without one are rejected.
+    """
+    per_page = True  # extracts only what is in the file, so ModelStage may hand it single pages
+
+    def __init__(self, client, folder, max_tokens=1500, default_confidence=0.9):
+        self.client = client
+        self.folder = folder
+        self.max_tokens = max_tokens
+        self.default_confidence = default_confidence
+
+    def _content(self, path):
+        with open(path, 'rb') as f:
+            data = f.read()
+        kind = sniff_file_type(data[:SNIFF_BYTES])
+        if kind in IMAGE_MIME_TYPES:
+            url = f'data:{IMAGE_MIME_TYPES[kind]};base64,{base64.b64encode(data).decode()}'
+            return [{'type': 'image_url', 'image_url': {'url': url}}]
+        if kind == 'pdf':
+            from pypdf import PdfReader
+            text = '\n'.join(page.extract_text() or '' for page in PdfReader(path).pages)
+            if not text.strip():
+                raise ValueError('PDF has no text layer')
+            return [{'type': 'text', 'text': text[:MAX_TEXT_CHARS]}]
+        raise ValueError(f'Unsupported file type: {kind}')
+
+    def __call__(self, filename):
+        messages = [
+            {'role': 'system', 'content': EXTRACTION_PROMPT},
+            {'role': 'user', 'content': self._content(os.path.join(self.folder, filename))},
+        ]
+        reply = self.client.complete(messages, max_tokens=self.max_tokens, temperature=0,
+                                     response_format={'type': 'json_object'})
+        data = json.loads(reply['content'])
+
+        line_items = [
+            dict(item, productId=f'TEMP_{position}')
+            for position, item in enumerate(data.get('lineItems') or [], start=1)
+        ]
+        confidence = data.get('confidence')
+        if not isinstance(confidence, (int, float)):
+            confidence = self.default_confidence
+        return {
+            'orderDate': data.get('orderDate'),
+            'dueDate': data.get('dueDate') or data.get('orderDate'),
+            'invoiceNumber': data.get('invoiceNumber'),
+            'customerInfo': data.get('customerInfo') or {'name': None, 'address': None, 'customerId': None},
+            'lineItems': line_items,
+            'totals': data.get('totals') or {},
+            'confidence': max(0.0, min(1.0, float(confidence))),
+            'processingTime': reply['latency'],
+            'llm': {
+                'model': self.client.model,
+                'latency': reply['latency'],
+                'promptTokens': reply['promptTokens'],
+                'completionTokens': reply['completionTokens'],
+                'attempts': reply['attempts']
+            }
+        }
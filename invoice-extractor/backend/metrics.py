@@ -0,0 +1,222 @@
+"""In-process metrics in the Prometheus text format.
+
+A small registry of counters, gauges and histograms (with labels) that
+``/metrics`` renders as Prometheus text. Hot paths only do a dict lookup
+and a few additions under a lock, so instrumenting every request costs a
+few microseconds.
+
+``init_metrics`` hooks the app:
+
+* every request is timed and counted per route template, method and status
+* SQL statements and the time spent in them are summed per request from
+  SQLAlchemy engine events (the count comes from ``query_counter``)
+* ``timing(name, seconds)`` records named phases such as upload I/O and
+  extraction stages, both in a histogram and in the current request's
+  breakdown
+* with ``SERVER_TIMING_HEADER`` (or a request header ``X-Server-Timing:
+  1``) the response carries that breakdown as a ``Server-Timing`` header
+
+Metrics are per process; under a preforking server every worker exposes
+its own, which Prometheus aggregates by instance.
+"""
+import bisect
+import threading
+import time
+
+from flask import g, has_app_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from query_counter import query_count
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def _escape(value):
+    return str(value).replace('\\', r'\\').replace('\n', r'\n').replace('"', r'\"')
+
+
+def _labels(names, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    pairs.extend(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _number(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    kind = 'counter'
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            values = list(self._values.items())
+        for labels, value in sorted(values):
+            yield self.name + _labels(self.label_names, labels), value
+
+
+class Gauge:
+    """A value read at scrape time from ``callback()`` (a number or ``{labels: number}``).
+
+    ``kind='counter'`` exposes totals kept elsewhere, such as the LLM
+    client's, as a counter.
+    """
+
+    def __init__(self, name, documentation, callback, labels=(), kind='gauge'):
+        self.name = name
+        self.documentation = documentation
+        self.callback = callback
+        self.label_names = tuple(labels)
+        self.kind = kind
+
+    def samples(self):
+        value = self.callback()
+        if isinstance(value, dict):
+            for labels, number in sorted(value.items()):
+                yield self.name + _labels(self.label_names, labels), number
+        else:
+            yield self.name, value
+
+
+class Histogram:
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labels=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        self.buckets = tuple(buckets)
+        self._series = {}  # labels -> [count per bucket (+Inf last), sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        position = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][position] += 1
+            series[1] += value
+
+    def samples(self):
+        with self._lock:
+            series = [(labels, list(counts), total) for labels, (counts, total) in self._series.items()]
+        for labels, counts, total in sorted(series):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                yield self.name + '_bucket' + _labels(self.label_names, labels, [f'le="{_number(bound)}"']), \
+                    cumulative
+            yield self.name + '_sum' + _labels(self.label_names, labels), total
+            yield self.name + '_count' + _labels(self.label_names, labels), cumulative
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, documentation, labels=()):
+        return self.register(Counter(name, documentation, labels))
+
+    def gauge(self, name, documentation, callback, labels=(), kind='gauge'):
+        return self.register(Gauge(name, documentation, callback, labels, kind))
+
+    def histogram(self, name, documentation, labels=(), buckets=DEFAULT_BUCKETS):
+        return self.register(Histogram(name, documentation, labels, buckets))
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.append(f'# HELP {metric.name} {metric.documentation}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            for sample, value in metric.samples():
+                lines.append(f'{sample} {_number(value)}')
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+REQUEST_SECONDS = registry.histogram(
+    'http_request_duration_seconds', 'Request latency by route template', ('route', 'method'))
+REQUESTS = registry.counter('http_requests_total', 'Requests by route template and status', ('route', 'method', 'status'))
+SQL_STATEMENTS = registry.counter('http_request_sql_statements_total', 'SQL statements run by requests', ('route',))
+SQL_SECONDS = registry.counter('http_request_sql_seconds_total', 'Time spent in SQL statements by requests', ('route',))
+PHASE_SECONDS = registry.histogram(
+    'phase_duration_seconds', 'Time spent in named phases (upload I/O, extraction stages)', ('phase',))
+
+
+def timing(name, seconds):
+    """Record a phase: in the phase histogram and, inside a request, in its Server-Timing breakdown."""
+    PHASE_SECONDS.observe(seconds, name)
+    if has_app_context():
+        timings = getattr(g._get_current_object(), 'phase_timings', None)
+        if timings is not None:
+            timings[name] = timings.get(name, 0.0) + seconds
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info['query_started'] = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info.pop('query_started', None)
+    if started is not None and has_app_context():
+        # One proxy lookup; this runs for every statement
+        state = g._get_current_object()
+        state.sql_seconds = getattr(state, 'sql_seconds', 0.0) + time.perf_counter() - started
+
+
+def init_metrics(app):
+    """Instrument ``app``'s requests and SQL; requires ``init_query_counter`` for SQL counts."""
+    if not event.contains(Engine, 'before_cursor_execute', _before_cursor_execute):
+        event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+
+    @app.before_request
+    def start_request_timer():
+        state = g._get_current_object()
+        state.request_started = time.perf_counter()
+        state.phase_timings = {}
+
+    @app.after_request
+    def record_request(response):
+        state = g._get_current_object()
+        started = getattr(state, 'request_started', None)
+        if started is None:
+            return response
+        elapsed = time.perf_counter() - started
+        current = request._get_current_object()
+        route = current.url_rule.rule if current.url_rule is not None else 'unmatched'
+        REQUEST_SECONDS.observe(elapsed, route, current.method)
+        REQUESTS.inc(route, current.method, str(response.status_code))
+        statements = query_count()
+        sql_seconds = getattr(state, 'sql_seconds', 0.0)
+        if statements:
+            SQL_STATEMENTS.inc(route, amount=statements)
+            SQL_SECONDS.inc(route, amount=sql_seconds)
+
+        if app.config['SERVER_TIMING_HEADER'] or current.environ.get('HTTP_X_SERVER_TIMING') == '1':
+            entries = [f'app;dur={elapsed * 1000:.2f}',
+                       f'sql;dur={sql_seconds * 1000:.2f};desc="{statements} statements"']
+            entries.extend(f'{name};dur={seconds * 1000:.2f}' for name, seconds in state.phase_timings.items())
+            # Streamed responses are still being produced; this covers the setup only
+            response.headers['Server-Timing'] = ', '.join(entries)
+        return response
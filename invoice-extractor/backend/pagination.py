@@ -0,0 +1,57 @@
+"""Keyset (cursor) pagination helpers.
+
+A cursor is an opaque, URL-safe token holding the sort key of the last row a
+client has seen. Pages are fetched with ``WHERE key < cursor`` (or ``>``)
+instead of ``OFFSET``, so deep pages cost the same as the first one, and one
+extra row is fetched to know exactly whether another page exists.
+"""
+import base64
+import json
+from datetime import datetime
+
+MAX_LIMIT = 1000
+
+
+def encode_cursor(*values):
+    key = [value.isoformat() if isinstance(value, datetime) else value for value in values]
+    return base64.urlsafe_b64encode(json.dumps(key).encode()).decode().rstrip('=')
+
+
+def decode_cursor(token, *types):
+    """Decode a cursor into a list of values converted with ``types``. Raises ValueError."""
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        key = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (ValueError, TypeError) as e:
+        raise ValueError('Invalid cursor') from e
+
+    if not isinstance(key, list) or len(key) != len(types):
+        raise ValueError('Invalid cursor')
+    try:
+        return [datetime.fromisoformat(value) if kind is datetime else kind(value)
+                for kind, value in zip(types, key)]
+    except (ValueError, TypeError) as e:
+        raise ValueError('Invalid cursor') from e
+
+
+def page_args(args, default_limit):
+    """``(page, limit)`` from query ``args``, clamped to page >= 1 and a limit of 1..MAX_LIMIT."""
+    page = args.get('page', 1, type=int)
+    limit = args.get('limit', default_limit, type=int)
+    return max(page, 1), min(max(limit, 1), MAX_LIMIT)
+
+
+def fetch_page(query, limit, offset=0):
+    """Return ``(rows, has_more)`` by fetching one row past ``limit``."""
+    rows = query.offset(offset).limit(limit + 1).all()
+    return rows[:limit], len(rows) > limit
+
+
+def fetch_rows(session, statement, limit, offset=0):
+    """``fetch_page`` for a column select, run on the session's connection.
+
+    Rows come back as plain tuples: no ORM entities, identity map or per-row
+    ORM processing, just the selected columns.
+    """
+    rows = session.connection().execute(statement.offset(offset).limit(limit + 1)).all()
+    return rows[:limit], len(rows) > limit
@@ -0,0 +1,31 @@
+"""Per-request SQL statement counter.
+
+Every statement executed through any SQLAlchemy engine is counted against
+the current app context, so a request can report how many queries it ran.
+With ``QUERY_COUNT_HEADER`` enabled the count is returned in the
+``X-Query-Count`` response header, which lets tests assert that an endpoint
+runs a constant number of statements.
+"""
+from flask import g, has_app_context
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+def _count_statement(conn, cursor, statement, parameters, context, executemany):
+    if has_app_context():
+        g.query_count = g.get('query_count', 0) + 1
+
+
+def query_count():
+    return g.get('query_count', 0)
+
+
+def init_query_counter(app):
+    if not event.contains(Engine, 'before_cursor_execute', _count_statement):
+        event.listen(Engine, 'before_cursor_execute', _count_statement)
+
+    @app.after_request
+    def add_query_count_header(response):
+        if app.config.get('QUERY_COUNT_HEADER'):
+            response.headers['X-Query-Count'] = str(query_count())
+        return response
@@ -0,0 +1,202 @@
+"""Cache of rendered responses for read endpoints that only change on writes.
+
+The data and history pages fetch stats, products and customers on every
+navigation, but those only change when an invoice is saved or an order is
+deleted. ``cached`` views keep their rendered JSON per path and query string
+in an LRU bounded by ``RESPONSE_CACHE_SIZE`` entries and
+``RESPONSE_CACHE_BYTES``, for at most ``RESPONSE_CACHE_TTL`` seconds. Every
+response carries an ETag, and a matching ``If-None-Match`` gets 304 Not
+Modified with no body.
+
+Entries belong to a generation counter in the ``generations`` table, which
+every write that changes these responses bumps in its own transaction
+(``stage()``, or ``invalidate()`` for bulk loads). The writing worker
+switches to the new generation as soon as it commits. Other workers re-read
+the counter at most every ``RESPONSE_CACHE_SYNC_SECONDS``, so a repeat load
+runs no SQL in between and a single primary-key lookup after.
+
+The entries, the generation and the request counts are kept per app, in
+``app.extensions['response_cache']``.
+"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from functools import wraps
+
+from flask import current_app, request
+from sqlalchemy import event
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+PENDING_KEY = 'response_cache_pending'
+
+Entry = namedtuple('Entry', 'generation expires etag body mimetype')
+
+
+class _State:
+    """One app's cached responses and the generation they belong to."""
+
+    def __init__(self):
+        self.entries = OrderedDict()  # (path, query string) -> Entry
+        self.bytes = 0
+        self.generation = None
+        self.synced_at = None
+        self.counts = {'hit': 0, 'miss': 0, 'not_modified': 0}
+        self.rendered = {}  # immutable view -> (etag, body, mimetype)
+
+
+def _etag(body):
+    return hashlib.blake2b(body, digest_size=16).hexdigest()
+
+
+class ResponseCache:
+    def __init__(self, db, generation_model, read_session=None, key='responses', app=None):
+        self.db = db
+        self.generations = generation_model.__table__
+        self.read_session = read_session if read_session is not None else db.session
+        self.key = key
+        self._lock = threading.Lock()
+        event.listen(Session, 'after_commit', self._after_commit)
+        event.listen(Session, 'after_rollback', self._after_rollback)
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.extensions['response_cache'] = _State()
+
+    @staticmethod
+    def _state():
+        return current_app.extensions['response_cache']
+
+    def _bump(self):
+        table = self.generations
+        return sqlite_insert(table).values(Name=self.key, Value=1).on_conflict_do_update(
+            index_elements=[table.c.Name], set_={'Value': table.c.Value + 1}
+        )
+
+    def _read_generation(self, session):
+        table = self.generations
+        value = session.execute(
+            self.db.select(table.c.Value).where(table.c.Name == self.key)
+        ).scalar()
+        return value or 0
+
+    def stage(self):
+        """Drop every worker's cached responses once the current transaction commits."""
+        session = self.db.session()
+        session.execute(self._bump())
+        session.info[PENDING_KEY] = self._read_generation(session)
+
+    def invalidate(self, conn):
+        """Drop every worker's cached responses, for writes made without ``stage()``."""
+        conn.execute(self._bump())
+        with self._lock:
+            self._state().synced_at = None  # this worker re-reads the counter on its next request
+
+    def _after_commit(self, session):
+        generation = session.info.pop(PENDING_KEY, None)
+        if generation is not None:
+            self._advance(generation)
+
+    def _after_rollback(self, session):
+        session.info.pop(PENDING_KEY, None)
+
+    def _advance(self, generation):
+        state = self._state()
+        with self._lock:
+            # Counters only grow; a slower commit or an older snapshot never moves it back
+            if state.generation is None or generation > state.generation:
+                state.generation = generation
+                state.entries.clear()
+                state.bytes = 0
+            state.synced_at = time.monotonic()
+
+    def _current_generation(self):
+        state = self._state()
+        with self._lock:
+            if state.synced_at is not None and \
+                    time.monotonic() - state.synced_at < current_app.config['RESPONSE_CACHE_SYNC_SECONDS']:
+                return state.generation
+        self._advance(self._read_generation(self.read_session))
+        return state.generation
+
+    def _lookup(self, key, generation):
+        state = self._state()
+        with self._lock:
+            entry = state.entries.get(key)
+            if entry is None or entry.generation != generation or entry.expires <= time.monotonic():
+                return None
+            state.entries.move_to_end(key)
+            return entry
+
+    def _store(self, key, entry):
+        config = current_app.config
+        state = self._state()
+        with self._lock:
+            if entry.generation != state.generation or len(entry.body) > config['RESPONSE_CACHE_BYTES']:
+                return
+            previous = state.entries.pop(key, None)
+            if previous is not None:
+                state.bytes -= len(previous.body)
+            state.entries[key] = entry
+            state.bytes += len(entry.body)
+            while len(state.entries) > config['RESPONSE_CACHE_SIZE'] or state.bytes > config['RESPONSE_CACHE_BYTES']:
+                _, evicted = state.entries.popitem(last=False)
+                state.bytes -= len(evicted.body)
+
+    def _count(self, result):
+        with self._lock:
+            self._state().counts[result] += 1
+
+    def stats(self):
+        """Requests served by ``cached`` views, by result (hit, miss, not_modified)."""
+        with self._lock:
+            return dict(self._state().counts)
+
+    @property
+    def size_bytes(self):
+        return self._state().bytes
+
+    def _respond(self, etag, body, mimetype, cache_control):
+        response = current_app.response_class(body, mimetype=mimetype)
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = cache_control
+        return response.make_conditional(request)
+
+    def cached(self, view):
+        """Serve a GET ``view`` from the cache; only its 200 responses are kept."""
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if not current_app.config['RESPONSE_CACHE_SIZE']:
+                return view(*args, **kwargs)
+            key = (request.path, request.query_string)
+            generation = self._current_generation()
+            entry = self._lookup(key, generation)
+            self._count('miss' if entry is None else 'hit')
+            if entry is None:
+                response = current_app.make_response(view(*args, **kwargs))
+                if response.status_code != 200 or response.is_streamed:
+                    return response
+                body = response.get_data()
+                entry = Entry(generation, time.monotonic() + current_app.config['RESPONSE_CACHE_TTL'],
+                              _etag(body), body, response.mimetype)
+                self._store(key, entry)
+            # Clients keep the body but revalidate it with If-None-Match every time
+            response = self._respond(entry.etag, entry.body, entry.mimetype, 'no-cache')
+            if response.status_code == 304:
+                self._count('not_modified')
+            return response
+        return wrapper
+
+    def immutable(self, view, max_age=86400):
+        """Serve a constant GET ``view``: rendered once per app, cacheable by clients for ``max_age``."""
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            rendered = self._state().rendered
+            if view not in rendered:
+                response = current_app.make_response(view(*args, **kwargs))
+                body = response.get_data()
+                rendered[view] = (_etag(body), body, response.mimetype)
+            return self._respond(*rendered[view], f'public, max-age={max_age}')
+        return wrapper
@@ -0,0 +1,222 @@
+"""Daily and monthly revenue rollups by customer and by product.
+
+Two pre-aggregated tables back ``/api/data/analytics``:
+
+* ``order_rollups``: orders and revenue (TotalDue) per period and customer
+* ``product_rollups``: line items, quantity and revenue (LineTotal) per
+  period and product
+
+Each holds one row per day and one per month (``Period`` is ``'day'`` or
+``'month'``, ``PeriodStart`` the first date of the period), keyed by
+OrderDate. Saves and deletes adjust the affected rows with upserts in their
+own transaction; ``rebuild()`` recomputes both tables from the order tables
+with pandas, reading in chunks so memory stays bounded.
+
+Queries read the monthly rows when the requested range covers whole months
+and the daily rows otherwise, so a report over years of orders touches a
+few thousand rollup rows rather than every order line.
+"""
+import calendar
+from collections import defaultdict
+from datetime import date
+
+from sqlalchemy import bindparam
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+PERIODS = ('day', 'month')
+GROUP_BY = ('period', 'customer', 'product')
+REBUILD_CHUNK_SIZE = 100000
+
+
+def period_start(period, day):
+    return day.replace(day=1) if period == 'month' else day
+
+
+class Rollups:
+    def __init__(self, db, order_rollup_model, product_rollup_model, header_model, detail_model,
+                 read_session=None):
+        self.db = db
+        self.orders = order_rollup_model.__table__
+        self.products = product_rollup_model.__table__
+        self.header_model = header_model
+        self.detail_model = detail_model
+        self.read_session = read_session if read_session is not None else db.session
+
+    def _upsert(self, session, table, key, measures, deltas):
+        if not deltas:
+            return
+        rows = [dict(zip(('Period', 'PeriodStart', key), row_key), **dict(zip(measures, values)))
+                for row_key, values in deltas.items()]
+        statement = sqlite_insert(table)
+        session.execute(
+            statement.on_conflict_do_update(
+                index_elements=[table.c.Period, table.c.PeriodStart, table.c[key]],
+                set_={name: table.c[name] + statement.excluded[name] for name in measures}
+            ),
+            rows
+        )
+
+    def _prune(self, session, table, key, count, deltas):
+        """Delete the rows among ``deltas``' keys that no longer count anything (one PK lookup each)."""
+        if not deltas:
+            return
+        statement = table.delete().where(
+            table.c.Period == bindparam('period'),
+            table.c.PeriodStart == bindparam('period_start'),
+            table.c[key] == bindparam('key'),
+            table.c[count] <= 0
+        )
+        session.execute(statement, [dict(zip(('period', 'period_start', 'key'), row_key)) for row_key in deltas])
+
+    def _record(self, orders, lines, sign):
+        order_deltas = defaultdict(lambda: [0, 0.0])
+        for order_date, customer_id, total_due in orders:
+            if order_date is None or customer_id is None:
+                continue
+            for period in PERIODS:
+                delta = order_deltas[period, period_start(period, order_date), customer_id]
+                delta[0] += sign
+                delta[1] += sign * (total_due or 0.0)
+
+        product_deltas = defaultdict(lambda: [0, 0, 0.0])
+        for order_date, product_id, quantity, line_total in lines:
+            if order_date is None or product_id is None:
+                continue
+            for period in PERIODS:
+                delta = product_deltas[period, period_start(period, order_date), product_id]
+                delta[0] += sign
+                delta[1] += sign * (quantity or 0)
+                delta[2] += sign * (line_total or 0.0)
+
+        session = self.db.session()
+        self._upsert(session, self.orders, 'CustomerID', ('Orders', 'Revenue'), order_deltas)
+        self._upsert(session, self.products, 'ProductID', ('Lines', 'Quantity', 'Revenue'), product_deltas)
+        if sign < 0:
+            self._prune(session, self.orders, 'CustomerID', 'Orders', order_deltas)
+            self._prune(session, self.products, 'ProductID', 'Lines', product_deltas)
+
+    def record_save(self, orders, lines):
+        """Add saved orders in the current transaction.
+
+        ``orders`` holds ``(OrderDate, CustomerID, TotalDue)`` and ``lines``
+        ``(OrderDate, ProductID, OrderQty, LineTotal)`` tuples.
+        """
+        self._record(orders, lines, 1)
+
+    def record_delete(self, orders, lines):
+        """Subtract deleted orders (same tuples as ``record_save``) in the current transaction."""
+        self._record(orders, lines, -1)
+
+    def _aggregate(self, conn, query, key, measures):
+        """Sum ``measures`` per (Period, PeriodStart, key) over ``query``, one chunk at a time."""
+        import pandas as pd  # only rebuilds need it; importing it costs every worker half a second
+
+        partials = []
+        for chunk in pd.read_sql(query, conn, chunksize=REBUILD_CHUNK_SIZE):
+            chunk = chunk.dropna(subset=['OrderDate', key])
+            if chunk.empty:
+                continue
+            order_dates = pd.to_datetime(chunk['OrderDate'])
+            for period, starts in (('day', order_dates.dt.normalize()),
+                                   ('month', order_dates.dt.to_period('M').dt.to_timestamp())):
+                partials.append(
+                    chunk.assign(Period=period, PeriodStart=starts)
+                    .groupby(['Period', 'PeriodStart', key], as_index=False)[list(measures)].sum()
+                )
+        if not partials:
+            return []
+        totals = pd.concat(partials).groupby(['Period', 'PeriodStart', key], as_index=False)[list(measures)].sum()
+        totals['PeriodStart'] = totals['PeriodStart'].dt.date
+        totals[key] = totals[key].astype(int)
+        return totals.to_dict('records')
+
+    def rebuild(self):
+        """Recompute both rollup tables from the order tables in one transaction.
+
+        Returns the number of (order rollup, product rollup) rows written.
+        """
+        db = self.db
+        header = self.header_model
+        detail = self.detail_model
+        order_query = db.select(
+            header.OrderDate, header.CustomerID,
+            db.literal(1).label('Orders'), db.func.coalesce(header.TotalDue, 0.0).label('Revenue')
+        )
+        line_query = db.select(
+            header.OrderDate, detail.ProductID, db.literal(1).label('Lines'),
+            db.func.coalesce(detail.OrderQty, 0).label('Quantity'),
+            db.func.coalesce(detail.LineTotal, 0.0).label('Revenue')
+        ).join(header, detail.SalesOrderID == header.SalesOrderID)
+
+        with db.engine.begin() as conn:
+            order_rows = self._aggregate(conn, order_query, 'CustomerID', ('Orders', 'Revenue'))
+            product_rows = self._aggregate(conn, line_query, 'ProductID', ('Lines', 'Quantity', 'Revenue'))
+            conn.execute(self.orders.delete())
+            conn.execute(self.products.delete())
+            if order_rows:
+                conn.execute(self.orders.insert(), order_rows)
+            if product_rows:
+                conn.execute(self.products.insert(), product_rows)
+        return len(order_rows), len(product_rows)
+
+    def ensure(self):
+        """Build the rollups if there are orders but no rollup rows (e.g. an existing database)."""
+        with self.db.engine.connect() as conn:
+            has_rollups = conn.execute(self.db.select(self.orders.c.Period).limit(1)).first()
+            has_orders = conn.execute(self.db.select(self.header_model.SalesOrderID).limit(1)).first()
+        if has_orders and not has_rollups:
+            self.rebuild()
+
+    @staticmethod
+    def _whole_months(start, end):
+        return (start is None or start.day == 1) and \
+            (end is None or end.day == calendar.monthrange(end.year, end.month)[1])
+
+    def query(self, granularity='month', group_by=('period',), start=None, end=None):
+        """Aggregate the rollups for ``start``..``end`` (inclusive dates, either may be None).
+
+        ``group_by`` is a subset of ``GROUP_BY``; customer and product cannot
+        be combined since they live in different tables. Returns dict rows
+        with the group columns plus the measures of the table used.
+        """
+        db = self.db
+        if 'customer' in group_by and 'product' in group_by:
+            raise ValueError('Cannot group by customer and product together')
+        if 'product' in group_by:
+            table, measures = self.products, ('Lines', 'Quantity', 'Revenue')
+            key_column = self.products.c.ProductID.label('productId')
+        else:
+            table, measures = self.orders, ('Orders', 'Revenue')
+            key_column = self.orders.c.CustomerID.label('customerId')
+
+        # Month totals can come from the month rows only when no partial month is requested
+        source = 'month' if granularity == 'month' and self._whole_months(start, end) else 'day'
+        if granularity == source:
+            period_column = table.c.PeriodStart.label('period')
+        else:
+            period_column = db.func.strftime('%Y-%m-01', table.c.PeriodStart).label('period')
+
+        groups = []
+        if 'period' in group_by:
+            groups.append(period_column)
+        if 'customer' in group_by or 'product' in group_by:
+            groups.append(key_column)
+        statement = db.select(*groups, *[
+            db.func.coalesce(db.func.sum(table.c[name]), 0).label(name[0].lower() + name[1:])
+            for name in measures
+        ]).where(table.c.Period == source)
+        if start is not None:
+            statement = statement.where(table.c.PeriodStart >= start)
+        if end is not None:
+            statement = statement.where(table.c.PeriodStart <= end)
+        if groups:
+            statement = statement.group_by(*groups).order_by(*groups)
+
+        rows = []
+        for row in self.read_session.execute(statement).mappings():
+            row = dict(row)
+            if isinstance(row.get('period'), date):
+                row['period'] = row['period'].isoformat()
+            row['revenue'] = round(row['revenue'], 2)
+            rows.append(row)
+        return rows
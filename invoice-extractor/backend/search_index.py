@@ -0,0 +1,145 @@
+"""SQLite FTS5 search over products and customers.
+
+``LIKE '%term%'`` cannot use an index, so every keystroke in the data page's
+search box scanned the whole table. Each searchable table gets an external
+content FTS5 table (the text is not stored twice) with prefix indexes, kept
+in sync by insert/update/delete triggers. Searches match every word of the
+input as a prefix and come back ranked by bm25.
+
+Ranking has to score every match before the first page can be returned,
+which is fine for a few thousand rows but not for a one-letter prefix over a
+large catalog. Past ``RANKED_MATCH_LIMIT`` matches the results are returned in
+rowid order instead (with a constant rank, so cursors keep the same shape)
+and the keyset bound and page size are pushed into the FTS query itself.
+
+If the SQLite build has no FTS5, ``install()`` leaves things as they are and
+callers fall back to ``LIKE``.
+"""
+import re
+import threading
+from contextlib import contextmanager
+
+from sqlalchemy.exc import OperationalError
+
+# FTS table -> (content table, rowid column, indexed columns)
+SEARCH_INDEXES = {
+    'products_fts': ('products', 'ProductID', ['Name', 'ProductNumber']),
+    'customers_fts': ('customers', 'CustomerID', ['AccountNumber']),
+}
+
+RANKED_MATCH_LIMIT = 2000
+
+
+def fts_query(search):
+    """Turn free text into an FTS5 query matching every word as a prefix, or None."""
+    terms = re.findall(r'\w+', search)
+    if not terms:
+        return None
+    return ' '.join(f'"{term}"*' for term in terms)
+
+
+class SearchIndex:
+    def __init__(self, db, session=None):
+        self.db = db
+        self.session = session if session is not None else db.session  # used for searches and the availability check
+        self._lock = threading.Lock()
+        self._available = None
+
+    def _table_ddl(self, name):
+        table, rowid, columns = SEARCH_INDEXES[name]
+        return (f"CREATE VIRTUAL TABLE IF NOT EXISTS {name} USING fts5("
+                f"{', '.join(columns)}, content='{table}', content_rowid='{rowid}', prefix='2 3 4')")
+
+    def _trigger_ddl(self, name):
+        table, rowid, columns = SEARCH_INDEXES[name]
+        column_list = ', '.join(columns)
+        new_values = ', '.join(f'new.{column}' for column in columns)
+        old_values = ', '.join(f'old.{column}' for column in columns)
+        delete_old = (f"INSERT INTO {name}({name}, rowid, {column_list}) "
+                      f"VALUES ('delete', old.{rowid}, {old_values});")
+        insert_new = f"INSERT INTO {name}(rowid, {column_list}) VALUES (new.{rowid}, {new_values});"
+        return [
+            f"CREATE TRIGGER IF NOT EXISTS {name}_ai AFTER INSERT ON {table} BEGIN {insert_new} END",
+            f"CREATE TRIGGER IF NOT EXISTS {name}_ad AFTER DELETE ON {table} BEGIN {delete_old} END",
+            f"CREATE TRIGGER IF NOT EXISTS {name}_au AFTER UPDATE ON {table} BEGIN {delete_old} {insert_new} END",
+        ]
+
+    def install(self):
+        """Create the FTS tables and triggers, indexing existing rows. Returns False without FTS5."""
+        try:
+            with self.db.engine.begin() as conn:
+                existing = set(conn.exec_driver_sql(
+                    "SELECT name FROM sqlite_master WHERE type = 'table'"
+                ).scalars())
+                for name in SEARCH_INDEXES:
+                    for statement in [self._table_ddl(name), *self._trigger_ddl(name)]:
+                        conn.exec_driver_sql(statement)
+                    if name not in existing:
+                        conn.exec_driver_sql(f"INSERT INTO {name}({name}) VALUES ('rebuild')")
+        except OperationalError:
+            # No FTS5 in this SQLite build; searches keep using LIKE
+            self._available = False
+            return False
+        self._available = True
+        return True
+
+    def rebuild(self):
+        """Re-index every row from the content tables."""
+        with self.db.engine.begin() as conn:
+            for name in SEARCH_INDEXES:
+                conn.exec_driver_sql(f"INSERT INTO {name}({name}) VALUES ('rebuild')")
+
+    @contextmanager
+    def suspended(self, conn, table):
+        """Drop the sync triggers on ``table`` for a bulk load on ``conn``, then re-index it and restore them.
+
+        Re-indexing once is much faster than firing a trigger per inserted row.
+        """
+        names = [name for name, (content, _, _) in SEARCH_INDEXES.items() if content == table] \
+            if self.available else []
+        for name in names:
+            for suffix in ('ai', 'ad', 'au'):
+                conn.exec_driver_sql(f"DROP TRIGGER IF EXISTS {name}_{suffix}")
+        yield
+        for name in names:
+            conn.exec_driver_sql(f"INSERT INTO {name}({name}) VALUES ('rebuild')")
+            for statement in self._trigger_ddl(name):
+                conn.exec_driver_sql(statement)
+
+    @property
+    def available(self):
+        with self._lock:
+            if self._available is None:
+                names = set(self.session.execute(self.db.text(
+                    "SELECT name FROM sqlite_master WHERE type = 'table'"
+                )).scalars())
+                self._available = all(name in names for name in SEARCH_INDEXES)
+            return self._available
+
+    def handles(self, search):
+        """Whether ``search`` will go through the FTS index rather than ``LIKE``."""
+        return bool(search) and fts_query(search) is not None and self.available
+
+    def matches(self, name, search, after=None, limit=None):
+        """Subquery of (rowid, rank) for rows matching ``search`` (lower rank is better), or None.
+
+        ``after`` (the last rowid already returned) and ``limit`` only apply
+        to broad searches, which skip ranking and page by rowid.
+        """
+        if not self.handles(search):
+            return None
+        query = fts_query(search)
+        fts = self.db.table(name, self.db.column('rowid'), self.db.column('rank'))
+        match = self.db.text(f"{name} MATCH :fts_query").bindparams(fts_query=query)
+
+        broad = self.session.execute(
+            self.db.select(self.db.literal(1)).select_from(fts).where(match)
+            .limit(1).offset(RANKED_MATCH_LIMIT)
+        ).first() is not None
+        if not broad:
+            return self.db.select(fts.c.rowid, fts.c.rank).where(match).subquery()
+
+        matches = self.db.select(fts.c.rowid, self.db.literal(0.0).label('rank')).where(match)
+        if after is not None:
+            matches = matches.where(fts.c.rowid > after)
+        return matches.order_by(fts.c.rowid).limit(limit).subquery()
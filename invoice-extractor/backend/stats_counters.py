@@ -0,0 +1,95 @@
+"""Running totals behind ``/api/data/stats``.
+
+The dashboard used to count and sum every table on each poll. Instead a
+single ``database_stats`` row holds the product, customer and order counts
+and the revenue total, and every write adjusts it with an UPDATE in the
+same transaction, so the totals commit or roll back together with the rows
+they describe and concurrent writers serialize on SQLite's write lock.
+
+``reconcile()`` rebuilds the row from the tables (``flask --app app
+reconcile-stats``); use it after loading data outside the API.
+"""
+
+
+class StatsCounters:
+    ROW_ID = 1
+
+    def __init__(self, db, stats_model, product_model, customer_model, order_model, read_session=None):
+        self.db = db
+        self.table = stats_model.__table__
+        self.product_model = product_model
+        self.customer_model = customer_model
+        self.order_model = order_model
+        self.read_session = read_session if read_session is not None else db.session
+
+    def _totals_query(self):
+        db = self.db
+        orders = self.order_model
+        return db.select(
+            db.literal(self.ROW_ID).label('StatsID'),
+            db.select(db.func.count()).select_from(self.product_model).scalar_subquery().label('Products'),
+            db.select(db.func.count()).select_from(self.customer_model).scalar_subquery().label('Customers'),
+            db.select(db.func.count()).select_from(orders).scalar_subquery().label('Orders'),
+            # AVG ignores orders without a total, so they are counted separately
+            db.select(db.func.count(orders.TotalDue)).scalar_subquery().label('PricedOrders'),
+            db.select(db.func.coalesce(db.func.sum(orders.TotalDue), 0.0)).scalar_subquery().label('Revenue'),
+        )
+
+    def _write_totals(self, session):
+        session.execute(self.table.delete())
+        session.execute(self.table.insert().from_select(
+            ['StatsID', 'Products', 'Customers', 'Orders', 'PricedOrders', 'Revenue'],
+            self._totals_query()
+        ))
+
+    def _apply(self, products=0, customers=0, orders=0, priced_orders=0, revenue=0.0):
+        table = self.table
+        session = self.db.session()
+        result = session.execute(
+            table.update().where(table.c.StatsID == self.ROW_ID).values(
+                Products=table.c.Products + products,
+                Customers=table.c.Customers + customers,
+                Orders=table.c.Orders + orders,
+                PricedOrders=table.c.PricedOrders + priced_orders,
+                Revenue=table.c.Revenue + revenue,
+            )
+        )
+        if result.rowcount == 0:
+            # No row yet (e.g. a database from before this table existed):
+            # build it from the tables, which then include this transaction
+            session.flush()
+            self._write_totals(session)
+
+    def record_save(self, order_totals, products=0, customers=0):
+        """Count newly saved orders (by their TotalDue) and created rows in the current transaction."""
+        priced = [total for total in order_totals if total is not None]
+        self._apply(products=products, customers=customers, orders=len(order_totals),
+                    priced_orders=len(priced), revenue=sum(priced))
+
+    def record_delete(self, order_totals):
+        """Remove deleted orders (by their TotalDue) in the current transaction."""
+        priced = [total for total in order_totals if total is not None]
+        self._apply(orders=-len(order_totals), priced_orders=-len(priced), revenue=-sum(priced))
+
+    def reconcile(self):
+        """Rebuild the totals from scratch in one transaction."""
+        with self.db.engine.begin() as conn:
+            self._write_totals(conn)
+
+    def ensure(self):
+        """Create the totals row if it is missing."""
+        with self.db.engine.begin() as conn:
+            exists = conn.execute(
+                self.db.select(self.table.c.StatsID).where(self.table.c.StatsID == self.ROW_ID)
+            ).first()
+            if exists is None:
+                self._write_totals(conn)
+
+    def read(self):
+        """The totals row as a mapping (computed on the fly if it does not exist yet)."""
+        row = self.read_session.execute(
+            self.db.select(self.table).where(self.table.c.StatsID == self.ROW_ID)
+        ).mappings().first()
+        if row is None:
+            row = self.read_session.execute(self._totals_query()).mappings().first()
+        return row
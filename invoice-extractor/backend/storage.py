@@ -0,0 +1,84 @@
+"""SQLite storage profile and read/write engine split.
+
+Every pooled SQLite connection is configured when it is opened: WAL
+journaling so readers and the writer stop blocking each other,
+``synchronous=NORMAL`` (safe with WAL, fsyncs only at checkpoints), a busy
+timeout so concurrent writers wait for the lock instead of failing with
+"database is locked", and larger mmap and page caches.
+
+Read-only endpoints go through a separate engine (the ``read`` bind) and
+session, so a burst of history or search traffic cannot take the connections
+saves and deletes need. Read connections are ``query_only``. In-memory
+databases cannot be shared between engines, so there reads use the default
+engine.
+"""
+from flask.globals import app_ctx
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from sqlalchemy.orm import scoped_session, sessionmaker
+
+READ_BIND = 'read'
+
+
+def _is_memory_database(url):
+    url = make_url(url)
+    return url.get_backend_name() == 'sqlite' and url.database in (None, '', ':memory:')
+
+
+def read_binds(config):
+    """``SQLALCHEMY_BINDS`` entry for the read engine (empty when reads must share the default one)."""
+    url = config['DATABASE_READ_URL']
+    if _is_memory_database(url):
+        return {}
+    return {READ_BIND: {'url': url, 'pool_size': config['READ_POOL_SIZE']}}
+
+
+def sqlite_pragmas(config, read_only=False):
+    """PRAGMA (name, value) pairs applied to each new connection."""
+    pragmas = [
+        ('busy_timeout', config['SQLITE_BUSY_TIMEOUT_MS']),
+        ('synchronous', config['SQLITE_SYNCHRONOUS']),
+        ('mmap_size', config['SQLITE_MMAP_SIZE']),
+        ('cache_size', -config['SQLITE_CACHE_SIZE_KB']),  # negative means KiB rather than pages
+    ]
+    if read_only:
+        pragmas.append(('query_only', 'ON'))
+    else:
+        # The journal mode is stored in the database file; only writers set it
+        pragmas.insert(0, ('journal_mode', config['SQLITE_JOURNAL_MODE']))
+    return pragmas
+
+
+def _pragma_listener(pragmas):
+    def apply_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for name, value in pragmas:
+                cursor.execute(f'PRAGMA {name} = {value}')
+        finally:
+            cursor.close()
+    return apply_pragmas
+
+
+def _app_ctx_id():
+    return id(app_ctx._get_current_object())
+
+
+def create_read_session():
+    """The read-only scoped session, one per app context; ``init_storage`` binds it to the read engine."""
+    return scoped_session(sessionmaker(), scopefunc=_app_ctx_id)
+
+
+def init_storage(app, db, read_session):
+    """Apply the SQLite profile to every engine and bind ``read_session`` to the read engine."""
+    with app.app_context():
+        engines = dict(db.engines)
+        read_session.configure(bind=engines.get(READ_BIND, engines[None]))
+    for key, engine in engines.items():
+        if engine.dialect.name == 'sqlite':
+            pragmas = sqlite_pragmas(app.config, read_only=key == READ_BIND)
+            event.listen(engine, 'connect', _pragma_listener(pragmas))
+
+    @app.teardown_appcontext
+    def remove_read_session(exception=None):
+        read_session.remove()
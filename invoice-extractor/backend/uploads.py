@@ -0,0 +1,205 @@
+"""Single-pass streaming of uploaded files.
+
+Werkzeug's multipart parser asks the request for a file object to write each
+uploaded part into. ``StreamingRequest`` hands it an ``UploadWriter`` that
+writes the chunks straight into the uploads folder while counting bytes,
+hashing and sniffing the magic bytes, so a route gets the size, SHA-256 and
+real file type without saving or re-reading the file, and an oversized body
+is rejected as soon as it crosses ``MAX_CONTENT_LENGTH``. Completed uploads
+are stored under their hash (see ``blob_store.py``).
+
+Batch uploads are limited per request by ``BATCH_MAX_CONTENT_LENGTH``, which
+also caps a ZIP archive part. Any other part over ``MAX_CONTENT_LENGTH`` is
+dropped and marked ``too_large`` instead of failing the rest of the batch.
+A part whose sniffed type is not in ``ALLOWED_FILE_TYPES`` (plus ZIP for a
+batch) is dropped the same way before it becomes a blob, so rejected uploads
+never take up space in the blob store.
+"""
+import hashlib
+import io
+import os
+import uuid
+
+from flask import Request, current_app
+from werkzeug.exceptions import RequestEntityTooLarge
+from werkzeug.utils import secure_filename
+
+from blob_store import INCOMING_DIR, blob_name
+
+CHUNK_SIZE = 64 * 1024
+
+FILE_SIGNATURES = [
+    (b'%PDF-', 'pdf'),
+    (b'\x89PNG\r\n\x1a\n', 'png'),
+    (b'\xff\xd8\xff', 'jpeg'),
+    (b'PK\x03\x04', 'zip'),
+]
+SNIFF_BYTES = max(len(signature) for signature, _ in FILE_SIGNATURES)
+
+
+def sniff_file_type(head):
+    """Return the file type for the leading bytes of a file, or None if unknown."""
+    for signature, kind in FILE_SIGNATURES:
+        if head.startswith(signature):
+            return kind
+    return None
+
+
+class UploadWriter(io.RawIOBase):
+    """Writable (and, once complete, readable) sink for one uploaded file.
+
+    A file over ``max_size`` (``archive_max_size`` for a ZIP, if given) raises
+    RequestEntityTooLarge, or with ``drop_too_large`` is deleted and the rest
+    of it skipped, leaving ``too_large`` set. A file whose type is not in
+    ``allowed_types`` is deleted instead of being stored; ``kind`` still says
+    what it was.
+    """
+
+    def __init__(self, folder, filename, max_size, archive_max_size=None, drop_too_large=False,
+                 allowed_types=None):
+        self.original_name = secure_filename(filename or '')
+        self.folder = folder
+        # Both are set once the upload is complete and stored under its hash
+        self.stored_name = None
+        self.path = None
+        self.max_size = max_size
+        self.archive_max_size = archive_max_size
+        self.drop_too_large = drop_too_large
+        self.too_large = False
+        self.allowed_types = allowed_types
+        self.size = 0
+        self.kind = None
+        self._head = b''
+        self._digest = hashlib.sha256()
+        incoming = os.path.join(folder, INCOMING_DIR)
+        os.makedirs(incoming, exist_ok=True)
+        self._partial_path = os.path.join(incoming, f'{uuid.uuid4()}.part')
+        self._file = open(self._partial_path, 'wb')
+        self._reader = None
+        self._complete = False
+        self._dropped = False  # too large or not an allowed type: nothing was stored
+        self._created_blob = False
+
+    @property
+    def sha256(self):
+        return self._digest.hexdigest()
+
+    def writable(self):
+        return not self._complete
+
+    def write(self, data):
+        self.size += len(data)
+        if self._dropped:
+            return len(data)
+
+        if len(self._head) < SNIFF_BYTES:
+            self._head += data[:SNIFF_BYTES - len(self._head)]
+            self.kind = sniff_file_type(self._head)
+
+        max_size = self.max_size
+        if self.kind == 'zip' and self.archive_max_size is not None:
+            max_size = self.archive_max_size
+        if max_size is not None and self.size > max_size:
+            self.discard()
+            if not self.drop_too_large:
+                raise RequestEntityTooLarge()
+            self.too_large = self._dropped = True
+            return len(data)
+
+        self._digest.update(data)
+        self._file.write(data)
+        return len(data)
+
+    def finish(self):
+        """Close the partial file and move it into place as the blob for its content."""
+        if self._dropped:
+            return
+        if self.allowed_types is not None and self.kind not in self.allowed_types:
+            self.discard()
+            self._dropped = True
+            return
+        if not self._complete:
+            self._file.close()
+            self.stored_name = blob_name(self.sha256)
+            self.path = os.path.join(self.folder, self.stored_name)
+            self._created_blob = not os.path.exists(self.path)
+            # Identical content replaces the existing blob, which keeps one copy
+            for attempt in range(2):
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+                try:
+                    os.replace(self._partial_path, self.path)
+                    break
+                except FileNotFoundError:
+                    if attempt:
+                        raise  # the shard directory was pruned by GC in between
+            self._complete = True
+
+    def readable(self):
+        return self._complete and not self._dropped
+
+    def seekable(self):
+        return True
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        # The multipart parser seeks to 0 once the part has been fully written
+        self.finish()
+        if self._dropped:
+            return 0
+        if self._reader is None:
+            self._reader = open(self.path, 'rb')
+        return self._reader.seek(offset, whence)
+
+    def readinto(self, buffer):
+        if self._reader is None:
+            self.seek(0)
+        if self._dropped:
+            return 0
+        return self._reader.readinto(buffer)
+
+    def discard(self):
+        """Close and delete the partial file, and the blob if this upload created it.
+
+        A blob that was already there may be shared with other uploads, so it
+        is left for ``gc-uploads`` to remove once nothing references it.
+        """
+        self.close()
+        if os.path.exists(self._partial_path):
+            os.remove(self._partial_path)
+        if self._created_blob:
+            self._created_blob = False
+            if os.path.exists(self.path):
+                os.remove(self.path)
+
+    def close(self):
+        if self._reader is not None:
+            self._reader.close()
+        if not self._file.closed:
+            self._file.close()
+            # A part that never finished streaming is not a usable upload
+            if not self._complete and os.path.exists(self._partial_path):
+                os.remove(self._partial_path)
+        super().close()
+
+
+class StreamingRequest(Request):
+    @property
+    def is_batch(self):
+        return self.endpoint == 'api.upload_invoice_batch'
+
+    @property
+    def max_content_length(self):
+        # A batch carries many files, so its body limit is separate from the
+        # per-file MAX_CONTENT_LENGTH that UploadWriter enforces
+        if self.is_batch:
+            return current_app.config['BATCH_MAX_CONTENT_LENGTH']
+        return current_app.config['MAX_CONTENT_LENGTH']
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        config = current_app.config
+        if self.is_batch:
+            # An archive holds many files; expand_zip enforces the per-file limit on its members
+            return UploadWriter(config['UPLOAD_FOLDER'], filename, config['MAX_CONTENT_LENGTH'],
+                                archive_max_size=config['BATCH_MAX_CONTENT_LENGTH'], drop_too_large=True,
+                                allowed_types=config['ALLOWED_FILE_TYPES'] | {'zip'})
+        return UploadWriter(config['UPLOAD_FOLDER'], filename, config['MAX_CONTENT_LENGTH'],
+                            allowed_types=config['ALLOWED_FILE_TYPES'])
@@ -0,0 +1,15 @@
+"""WSGI entry point for production servers.
+
+    flask --app app init-db                  # once per deployment
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+Workers never create the schema themselves. The Swagger UI is left out
+unless SWAGGER_ENABLED=true is set explicitly.
+"""
+import os
+
+os.environ.setdefault('SWAGGER_ENABLED', 'false')
+
+from app import create_app  # noqa: E402  (after the default above)
+
+app = create_app()